@@ -5,33 +5,63 @@
 from __future__ import absolute_import
 
 import collections
+import contextlib
 import dis
+import io
 import itertools
+import logging
+import os
 import sys
+import threading
+import time
 import warnings
 
 from werkzeug.contrib.sessions import SessionStore
 from werkzeug.datastructures import ImmutableDict
-from werkzeug.exceptions import HTTPException, NotFound
-from werkzeug.routing import Map, RequestRedirect, Rule
+from werkzeug.exceptions import HTTPException, InternalServerError, NotFound
+from werkzeug.routing import Map, Rule
 from werkzeug.serving import run_simple
+from werkzeug.urls import url_unquote
 from werkzeug.utils import cached_property
+from werkzeug.wrappers import Request as WerkzeugRequest
 
+from .batch import BatchView, SubRequest
+from .cache import Cache
+from .compression import Compression
 from .config import Config, config_property, import_instance
 from .exceptions import RenderError
+from .executor import RenderExecutor
+from .instrumentation import Instrument
 from .message import Request, Response
+from .profiling import startup_phase
 from .resourcedir import ResourceDirectory
+from .routing import Router
+from .server import PreforkServer
+from .static import StaticFiles
 from .warnings import AppWarning
 
-__all__ = 'DEFAULT_CONFIG', 'BaseApp'
+__all__ = 'DEFAULT_CONFIG', 'BaseApp', 'TemplateIndex'
 
 
 #: (:class:`collections.Mapping`) The default configuration mapping.
 DEFAULT_CONFIG = ImmutableDict(
     session_store='werkzeug.contrib.sessions:FilesystemSessionStore'
-                  '(filename_template="plastic_%s.sess")'
+                  '(filename_template="plastic_%s.sess")',
+    template_auto_reload=False,
+    template_cache='plastic.cache:LRUCache(256)',
+    negotiation_cache='plastic.cache:LRUCache(128)',
+    url_cache='plastic.cache:LRUCache(1024)',
+    render_executor='plastic.executor:RenderExecutor()',
+    instruments=(),
+    compression=None,
+    response_cache='plastic.cache:LRUCache(1024)',
+    warmup=False
 )
 
+#: (:class:`collections.Iterator`) The sequence of unique version numbers
+#: to stamp :attr:`BaseApp.mimetype_mapping_version`.
+mimetype_mapping_versions = itertools.count(1)
+
 
 class BaseApp(object):
     """The application base class.  In order to make an application
@@ -66,14 +96,32 @@ class BaseApp(object):
     #: module.  It can be overridden.  Default is :file:`templates/`.
     template_path = 'templates/'
 
+    #: (:class:`type`) The router class to make :attr:`router`.
+    #: It can be overridden e.g. :class:`~plastic.routing.RadixTreeRouter`.
+    #: Default is :class:`~plastic.routing.Router`.
+    router_class = Router
+
     #: (:class:`~werkzeug.datastructures.ImmutableDict`) The immutable
     #: dictionary of suffix to registered templating functions.
     template_engines = ImmutableDict()
 
+    #: (:class:`~werkzeug.datastructures.ImmutableDict`) The immutable
+    #: dictionary of suffix to registered template compiling functions.
+    template_compilers = ImmutableDict()
+
+    #: (:class:`frozenset`) The set of suffixes of template engines and
+    #: mimetypes of serializers which are blocking, and run by
+    #: :attr:`render_executor`.
+    blocking_renderers = frozenset()
+
     #: (:class:`~werkzeug.datastructures.ImmutableDict`) The immutable
     #: dictionary of mimetype to registered renderers.
     mimetype_mapping = ImmutableDict()
 
+    #: (:class:`numbers.Integral`) The version number of
+    #: :attr:`mimetype_mapping`.  It changes whenever the mapping changes.
+    mimetype_mapping_version = 0
+
     @classmethod
     def clone(cls, __module__=None, __name__=None, **values):
         """Subclasses the application class.  It is a just shorthand of
@@ -82,36 +130,38 @@ class BaseApp(object):
         using :keyword:`class` keyword instead.
 
         """
-        try:
-            getframe = sys._getframe
-        except AttributeError:
-            pass
-        else:
-            frame = getframe(1)
-            if __module__ is None:
-                __module__ = frame.f_globals.get('__name__')
+        with startup_phase('clone', cls.__name__):
+            try:
+                getframe = sys._getframe
+            except AttributeError:
+                pass
+            else:
+                frame = getframe(1)
+                if __module__ is None:
+                    __module__ = frame.f_globals.get('__name__')
+                if __name__ is None:
+                    code = frame.f_code.co_code[frame.f_lasti:]
+                    skip = 3 if ord(code[0]) >= dis.HAVE_ARGUMENT else 1
+                    code = code[skip:]
+                    stores = (dis.opmap['STORE_NAME'],
+                              dis.opmap['STORE_GLOBAL'],
+                              dis.opmap['STORE_FAST'])
+                    opcode = ord(code[0])
+                    if opcode in stores:
+                        name_pos = ord(code[1])
+                        if opcode == dis.opmap['STORE_FAST']:
+                            index = frame.f_code.co_varnames
+                        else:
+                            index = frame.f_code.co_names
+                        try:
+                            __name__ = index[name_pos]
+                        except IndexError:
+                            pass
             if __name__ is None:
-                code = frame.f_code.co_code[frame.f_lasti:]
-                code = code[3 if ord(code[0]) >= dis.HAVE_ARGUMENT else 1:]
-                stores = (dis.opmap['STORE_NAME'],
-                          dis.opmap['STORE_GLOBAL'],
-                          dis.opmap['STORE_FAST'])
-                opcode = ord(code[0])
-                if opcode in stores:
-                    name_pos = ord(code[1])
-                    if opcode == dis.opmap['STORE_FAST']:
-                        index = frame.f_code.co_varnames
-                    else:
-                        index = frame.f_code.co_names
-                    try:
-                        __name__ = index[name_pos]
-                    except IndexError:
-                        pass
-        if __name__ is None:
-            __name__ = 'App'
-        subclass = type(__name__, (cls,), values)
-        subclass.__module__ = __module__
-        return subclass
+                __name__ = 'App'
+            subclass = type(__name__, (cls,), values)
+            subclass.__module__ = __module__
+            return subclass
 
     @classmethod
     def add_rule(cls, rule, function):
@@ -136,9 +186,41 @@ class BaseApp(object):
             cls.initialized_app_class = cls
         cls.rules.append(rule)
         cls.endpoints[rule.endpoint] = function
+        cls.compiled_routing = None
 
     @classmethod
-    def add_template_engine(cls, suffix, function):
+    def compile_routing(cls):
+        """Compiles :attr:`rules` into the routing map and the router
+        of :attr:`router_class`.  Compiled results are cached in
+        the application class and shared by its instances, so making
+        instances doesn't depend on the number of rules.  The cache is
+        invalidated when :attr:`rules` or :attr:`router_class` change.
+
+        Instances can replace their own :attr:`routing_map` and
+        :attr:`router` without affecting other instances, but shouldn't
+        mutate the shared ones in place.
+
+        :returns: a pair of the routing map and the router
+        :rtype: :class:`tuple`
+
+        """
+        rules = cls.rules
+        router_class = cls.router_class
+        compiled = cls.__dict__.get('compiled_routing')
+        if (compiled is None or compiled[0] is not rules or
+            compiled[1] != len(rules) or compiled[2] is not router_class):
+            label = cls.__module__ + '.' + cls.__name__
+            with startup_phase('compile_routing', label):
+                routing_map = Map((rule.empty() for rule in rules),
+                                  strict_slashes=True)
+                router = router_class(routing_map)
+            compiled = rules, len(rules), router_class, routing_map, router
+            cls.compiled_routing = compiled
+        return compiled[3], compiled[4]
+
+    @classmethod
+    def add_template_engine(cls, suffix, function, compiler=None,
+                            blocking=False):
         """Registers a templating ``function`` to the given ``suffix``.
         The ``function`` has to take three arguments and
         return its rendering result:
@@ -149,12 +231,31 @@ class BaseApp(object):
            :type request: :class:`~plastic.message.Request`
            :param path: the path of the template file.  it can be a key
                         of :attr:`~BaseApp.template_directory` mapping
-                        object
+                        object.  if ``compiler`` is present the compiled
+                        template object is passed instead
            :type path: :class:`basestring`
            :param values: the values to be passed to the template
            :type values: :class:`collections.Mapping`
-           :returns: the rendering result
-           :rtype: :class:`basestring`
+           :returns: the rendering result.  it can be an iterable of
+                     strings as well e.g. a generator, to stream
+                     the response instead of buffering it
+           :rtype: :class:`basestring`, :class:`collections.Iterable`
+
+        If the optional ``compiler`` function is present, compiled
+        templates are cached by the application's ``'template_cache'``
+        (see :class:`~plastic.cache.Cache`) so that each template file
+        is read and compiled only once.  It has to take three arguments
+        and return a template object:
+
+        .. function:: add_template_engine.compiler(app, path, source)
+
+           :param app: the application instance
+           :type app: :class:`BaseApp`
+           :param path: the path of the template file
+           :type path: :class:`basestring`
+           :param source: the content of the template file
+           :type source: :class:`str`
+           :returns: the compiled template object
 
         :param suffix: the filename suffix (without period character)
                        to register the template engine e.g. ``'mako'``
@@ -162,19 +263,37 @@ class BaseApp(object):
         :param function: templating function.  see also :func:`function()`
                          for its signature
         :type function: :class:`collections.Callable`
+        :param compiler: optional template compiling function.
+                         see also :func:`compiler()` for its signature
+        :type compiler: :class:`collections.Callable`
+        :param blocking: whether the ``function`` is CPU-bound or
+                         blocking, so that it's run by
+                         :attr:`render_executor` instead of the request
+                         thread.  default is ``False``
+        :type blocking: :class:`bool`
 
         """
         if not callable(function):
             raise TypeError('function must be callable, but ' +
                             repr(function) + ' seems not')
+        if not (compiler is None or callable(compiler)):
+            raise TypeError('compiler must be callable, but ' +
+                            repr(compiler) + ' seems not')
         if suffix in cls.template_engines:
             raise ValueError('suffix ' + repr(suffix) + ' already exists')
         copy = cls.template_engines.iteritems()
         rest = [(suffix, function)]
         cls.template_engines = ImmutableDict(itertools.chain(copy, rest))
+        if compiler is not None:
+            copy = cls.template_compilers.iteritems()
+            rest = [(suffix, compiler)]
+            cls.template_compilers = ImmutableDict(itertools.chain(copy,
+                                                                   rest))
+        if blocking:
+            cls.blocking_renderers = cls.blocking_renderers | set([suffix])
 
     @classmethod
-    def add_serializer(cls, mimetype, function):
+    def add_serializer(cls, mimetype, function, blocking=False):
         """Registers a ``function`` which serializes a value into
         a string.  The ``funtion`` has to take two arguments and
         return its serialized result.
@@ -184,8 +303,10 @@ class BaseApp(object):
            :param request: the current request object
            :type request: :class:`~plastic.message.Request`
            :param value: a value to serialize into a string
-           :returns: a serialized result
-           :rtype: :class:`basestring`
+           :returns: a serialized result.  it can be an iterable of
+                     strings as well e.g. a generator, to stream
+                     the response instead of buffering it
+           :rtype: :class:`basestring`, :class:`collections.Iterable`
 
         :param mimetype: a mimetype to assiciate the ``function`` with
                          e.g. ``'application/json'``
@@ -193,6 +314,11 @@ class BaseApp(object):
         :param function: serializer function.  see also :func:`function()`
                          for its signature
         :type function: :class:`collections.Callable`
+        :param blocking: whether the ``function`` is CPU-bound or
+                         blocking, so that it's run by
+                         :attr:`render_executor` instead of the request
+                         thread.  default is ``False``
+        :type blocking: :class:`bool`
 
         """
         if not callable(function):
@@ -203,6 +329,9 @@ class BaseApp(object):
         copy = cls.mimetype_mapping.iteritems()
         rest = [(mimetype, function)]
         cls.mimetype_mapping = ImmutableDict(itertools.chain(copy, rest))
+        cls.mimetype_mapping_version = next(mimetype_mapping_versions)
+        if blocking:
+            cls.blocking_renderers = cls.blocking_renderers | set([mimetype])
 
     @classmethod
     def associate_mimetypes(cls, mimetypes={}, **suffixes):
@@ -260,6 +389,7 @@ class BaseApp(object):
         suffix_items = ((mime, suffix) for suffix, mime in suffixes.iteritems())
         chained = itertools.chain(copy, mimetypes, suffix_items)
         cls.mimetype_mapping = ImmutableDict(chained)
+        cls.mimetype_mapping_version = next(mimetype_mapping_versions)
 
     @classmethod
     def route(cls, *rule_args, **rule_kwargs):
@@ -290,7 +420,64 @@ class BaseApp(object):
         return decorate
 
     @classmethod
-    def template_engine(cls, suffix):
+    def add_static_files(cls, prefix, directory='static/', endpoint='static',
+                         **options):
+        """Serves static files in the ``directory`` of the application's
+        package under the URL ``prefix``::
+
+            App.add_static_files('/static', 'static/')
+
+        The URLs of static files can be built by the ``endpoint`` with
+        ``path`` parameter::
+
+            request.build_url('static', path='css/main.css')
+
+        :param prefix: the URL prefix of static files e.g. ``'/static'``
+        :type prefix: :class:`basestring`
+        :param directory: the path of the directory in the package.
+                          default is ``'static/'``
+        :type directory: :class:`basestring`
+        :param endpoint: the endpoint name.  default is ``'static'``
+        :type endpoint: :class:`basestring`
+        :param \*\*options: other options to be passed to
+                            :class:`~plastic.static.StaticFiles`
+        :returns: the view function
+        :rtype: :class:`~plastic.static.StaticFiles`
+
+        """
+        static_files = StaticFiles(cls.__module__, directory, **options)
+        rule = Rule(prefix.rstrip('/') + '/<path:path>', endpoint=endpoint,
+                    methods=('GET', 'HEAD'))
+        cls.add_rule(rule, static_files)
+        return static_files
+
+    @classmethod
+    def add_batch_endpoint(cls, rule='/_batch', endpoint='batch', **options):
+        """Adds the endpoint which takes many sub-requests in a JSON
+        body and responds all of their responses at once, using
+        :meth:`dispatch_batch()`::
+
+            App.add_batch_endpoint('/_batch')
+
+        See :mod:`plastic.batch` for its format.
+
+        :param rule: the URL rule of the endpoint.  default is
+                     ``'/_batch'``
+        :type rule: :class:`basestring`
+        :param endpoint: the endpoint name.  default is ``'batch'``
+        :type endpoint: :class:`basestring`
+        :param \*\*options: other options to be passed to
+                            :class:`~plastic.batch.BatchView`
+        :returns: the view function
+        :rtype: :class:`~plastic.batch.BatchView`
+
+        """
+        view = BatchView(**options)
+        cls.add_rule(Rule(rule, endpoint=endpoint, methods=('POST',)), view)
+        return view
+
+    @classmethod
+    def template_engine(cls, suffix, compiler=None, blocking=False):
         """The function decorator which makes the given ``function``
         the template engine of the ``suffix``.
         ::
@@ -305,18 +492,34 @@ class BaseApp(object):
                     template = Template(f.read())
                 return template.render(**values)
 
+        The above example reads and compiles the template for every
+        request.  Pass the ``compiler`` to cache compiled templates::
+
+            def compile_mako(app, path, source):
+                return Template(source)
+
+            @App.template_engine(suffix='mako', compiler=compile_mako)
+            def render_mako(request, template, values):
+                return template.render(**values)
+
         :param suffix: the filename suffix (without period character)
                        to register the template engine e.g. ``'mako'``
         :type suffix: :class:`basestring`
+        :param compiler: optional template compiling function.
+                         see also :meth:`add_template_engine()`
+        :type compiler: :class:`collections.Callable`
+        :param blocking: whether the function is CPU-bound or blocking.
+                         see also :meth:`add_template_engine()`
+        :type blocking: :class:`bool`
 
         """
         def decorate(function):
-            cls.add_template_engine(suffix, function)
+            cls.add_template_engine(suffix, function, compiler, blocking)
             return function
         return decorate
 
     @classmethod
-    def serializer(cls, mimetypes):
+    def serializer(cls, mimetypes, blocking=False):
         """The function decorator which associate the given serializer
         ``function`` with ``mimetypes``.
         ::
@@ -326,7 +529,7 @@ class BaseApp(object):
 
             @App.serializer('application/json')
             def serialize_json(request, value):
-                return json.dumps(value)
+                return json.JSONEncoder().iterencode(value)
 
             @App.serializer(['application/x-plist', 'text/xml'])
             def serialize_plist(request, value):
@@ -338,6 +541,9 @@ class BaseApp(object):
                           an iterable e.g. ``'application/json'``,
                           ``['application/xml', 'text/xml']``
         :type mimetypes: :class:`basestring`, :class:`collections.Iterable`
+        :param blocking: whether the function is CPU-bound or blocking.
+                         see also :meth:`add_serializer()`
+        :type blocking: :class:`bool`
 
         """
         if not isinstance(mimetypes, collections.Iterable):
@@ -347,7 +553,7 @@ class BaseApp(object):
             mimetypes = mimetypes,
         def decorate(function):
             for mimetype in mimetypes:
-                cls.add_serializer(mimetype, function)
+                cls.add_serializer(mimetype, function, blocking)
             return function
         return decorate
 
@@ -355,6 +561,16 @@ class BaseApp(object):
     #: configuration.
     config = None
 
+    #: (:class:`werkzeug.routing.Map`) The routing map compiled from
+    #: :attr:`rules`.  It's shared by instances of the same application
+    #: class.  See also :meth:`compile_routing()`.
+    routing_map = None
+
+    #: (:class:`~plastic.routing.Router`) The router which matches
+    #: requests to endpoints.  It's an instance of :attr:`router_class`
+    #: and shared by instances of the same application class.
+    router = None
+
     #: (:class:`werkzeug.contrib.sessions.SessionStore`) The session store
     #: instance an application uses.  It's a proxy to ``'session_store'``
     #: value of :attr:`config`.
@@ -376,6 +592,69 @@ class BaseApp(object):
     #:       Sets a cookie.
     session_cookie = config_property('session_cookie')
 
+    #: (:class:`~plastic.cache.Cache`) The cache of compiled templates.
+    #: It's a proxy to ``'template_cache'`` value of :attr:`config`.
+    #:
+    #: .. seealso::
+    #:
+    #:    Method :meth:`add_template_engine()`
+    #:       Registers a templating function.
+    template_cache = config_property('template_cache')
+
+    #: (:class:`~plastic.cache.Cache`) The cache of content negotiation
+    #: results.  It's a proxy to ``'negotiation_cache'`` value of
+    #: :attr:`config`.
+    #:
+    #: .. seealso::
+    #:
+    #:    Method :meth:`negotiate_mimetype()`
+    #:       Chooses the mimetype to render.
+    negotiation_cache = config_property('negotiation_cache')
+
+    #: (:class:`~plastic.cache.Cache`) The cache of built urls.
+    #: It's a proxy to ``'url_cache'`` value of :attr:`config`.
+    #:
+    #: .. seealso::
+    #:
+    #:    Method :meth:`Request.build_url() \
+    #:    <plastic.message.Request.build_url>`
+    #:       Builds an url for the given endpoint.
+    url_cache = config_property('url_cache')
+
+    #: (:class:`~plastic.executor.RenderExecutor`) The thread pool which
+    #: runs :attr:`blocking_renderers`.  It's a proxy to
+    #: ``'render_executor'`` value of :attr:`config`.  If it's ``None``
+    #: blocking renderers run inline.
+    render_executor = config_property('render_executor')
+
+    #: (:class:`~plastic.cache.Cache`) The cache of whole responses of
+    #: views decorated by :func:`~plastic.cache.cache_response()`.
+    #: It's a proxy to ``'response_cache'`` value of :attr:`config`.
+    response_cache = config_property('response_cache')
+
+    #: (:class:`collections.Sequence`) The list of
+    #: :class:`~plastic.instrumentation.Instrument` objects which are
+    #: notified how long each stage of handling requests takes.
+    #: It's a proxy to ``'instruments'`` value of :attr:`config`.
+    #: It's empty by default, and then nothing is timed.
+    #:
+    #: .. seealso::
+    #:
+    #:    Module :mod:`plastic.instrumentation`
+    #:       Request instrumentation.
+    instruments = config_property('instruments')
+
+    #: (:class:`~plastic.compression.Compression`) The stage which
+    #: compresses response bodies.  It's a proxy to ``'compression'``
+    #: value of :attr:`config`.  It's ``None`` by default, and then
+    #: responses are not compressed.
+    #:
+    #: .. seealso::
+    #:
+    #:    Module :mod:`plastic.compression`
+    #:       Response compression.
+    compression = config_property('compression')
+
     def __init__(self, config={}):
         if not isinstance(config, collections.Mapping):
             raise TypeError('config must be a mapping object, not ' +
@@ -385,14 +664,36 @@ class BaseApp(object):
             warnings.warn('you probably wanted to call BaseApp.clone() '
                           'instead of making an instance of BaseApp',
                           category=AppWarning, stacklevel=2)
-        self.endpoints = dict(self.endpoints)
-        rules = (rule.empty() for rule in self.rules)
-        self.routing_map = Map(rules, strict_slashes=True)
-        self.config = Config(DEFAULT_CONFIG)
-        self.config.update(config)
-        self.session_store = import_instance(self.session_store, SessionStore)
-        self.config.setdefault('session_cookie', {}) \
-                   .setdefault('key', 'sessionid')
+        label = cls.__module__ + '.' + cls.__name__
+        with startup_phase('init', label):
+            self.endpoints = dict(self.endpoints)
+            self.routing_map, self.router = cls.compile_routing()
+            self.config = Config(DEFAULT_CONFIG)
+            self.config.update(config)
+            with startup_phase('import_session_store', label):
+                self.session_store = import_instance(self.session_store,
+                                                     SessionStore)
+            with startup_phase('import_caches', label):
+                self.template_cache = import_instance(self.template_cache,
+                                                      Cache)
+                self.negotiation_cache = import_instance(
+                    self.negotiation_cache, Cache
+                )
+                self.url_cache = import_instance(self.url_cache, Cache)
+                self.response_cache = import_instance(self.response_cache,
+                                                      Cache)
+            self.instruments = [import_instance(instrument, Instrument)
+                                for instrument in self.instruments]
+            if self.compression is not None:
+                self.compression = import_instance(self.compression,
+                                                   Compression)
+            if self.render_executor is not None:
+                self.render_executor = import_instance(self.render_executor,
+                                                       RenderExecutor)
+            self.config.setdefault('session_cookie', {}) \
+                       .setdefault('key', 'sessionid')
+        if self.config.get('warmup'):
+            self.warmup()
 
     def __call__(self, environ, start_response):
         return self.wsgi_app(environ, start_response)
@@ -405,40 +706,282 @@ class BaseApp(object):
             app.wsgi_app = Middleware(app.wsgi_app)
 
         """
+        if self.instruments:
+            return self.instrumented_wsgi_app(environ, start_response)
         request = None
+        try:
+            request = Request(environ, app=self)
+            result = self.dispatch_request(request)
+        except HTTPException as result:
+            pass
+        response = Response.force_type(result, environ)
+        self.save_session(request, response)
+        if self.compression is not None:
+            self.compression.compress(environ, response)
+        return response(environ, start_response)
+
+    def instrumented_wsgi_app(self, environ, start_response):
+        """The same to :meth:`wsgi_app()` except it times each stage
+        and notifies :attr:`instruments`.  :meth:`wsgi_app()` calls it
+        instead when there are any :attr:`instruments`.
+
+        """
+        request = endpoint = None
+        started = time.time()
         try:
             try:
                 request = Request(environ, app=self)
-            except RequestRedirect as result:
-                pass
-            else:
-                try:
-                    view_func = self.endpoints[request.endpoint]
-                except KeyError:
-                    result = NotFound()
-                else:
-                    result = view_func(request, **request.endpoint_values)
-                    if isinstance(result, basestring):
-                        result = Response(result)
+            finally:
+                routed = time.time()
+                if request is not None:
+                    endpoint = request.endpoint
+                self.record_stage('routing', endpoint, routed - started)
+            try:
+                result = self.dispatch_request(request)
+            finally:
+                self.record_stage('view', endpoint, time.time() - routed)
         except HTTPException as result:
             pass
+        responding = time.time()
         response = Response.force_type(result, environ)
-        if request is not None:
+        if request is not None and 'session' in request.__dict__:
+            saving = time.time()
+            self.save_session(request, response)
+            saved = time.time()
+            self.record_stage('session', endpoint, saved - saving)
+            responding += saved - saving
+        if self.compression is not None:
+            self.compression.compress(environ, response)
+        app_iter = response(environ, start_response)
+        finished = time.time()
+        self.record_stage('response', endpoint, finished - responding)
+        self.record_stage('total', endpoint, finished - started)
+        return app_iter
+
+    def dispatch_request(self, request):
+        """Calls the view function of the ``request``'s endpoint.
+
+        :param request: the routed request
+        :type request: :class:`~plastic.message.Request`
+        :returns: the result of the view function.  strings and
+                  iterators are wrapped by
+                  :class:`~plastic.message.Response`
+        :raises werkzeug.exceptions.HTTPException:
+           :exc:`~werkzeug.exceptions.NotFound` when there's no view
+           function of the endpoint, or what the view function raised
+
+        """
+        try:
+            view_func = self.endpoints[request.endpoint]
+        except KeyError:
+            raise NotFound()
+        result = view_func(request, **request.endpoint_values)
+        if (isinstance(result, basestring) or
+            isinstance(result, collections.Iterator) and
+            not callable(result)):
+            result = Response(result)
+        return result
+
+    def dispatch_batch(self, requests, parent=None, max_workers=4):
+        """Dispatches many sub-requests to the application's own
+        :attr:`endpoints` in the process, and returns their responses.
+        It's for composing a page from internal endpoints::
+
+            profile, posts = app.dispatch_batch([
+                ('GET', '/users/1'),
+                ('GET', '/users/1/posts?limit=10')
+            ], request)
+
+        Unlike calling the application through WSGI, sub-requests'
+        environs are made directly from tuples, and responses are
+        returned as they are without being serialized.  Sub-requests
+        are dispatched concurrently by up to ``max_workers`` threads
+        including the calling thread.  Errors don't affect other
+        sub-requests; these become 500 responses.
+
+        If the ``parent`` request is given, sub-requests share its
+        :attr:`~plastic.message.Request.session` (see
+        :class:`~plastic.batch.SubRequest`), so changes of the session
+        are saved once with the parent's response.  Since sub-requests
+        run concurrently, the last one which sets the same key of
+        the session wins.  Without the ``parent`` each sub-request has
+        its own session, and its response sets the session cookie.
+
+        :param requests: the sequence of tuples of ``(method, path,
+                         headers, body)``.  ``path`` may contain
+                         the query string.  ``headers`` (a mapping or
+                         pairs) and ``body`` (a string) can be omitted
+        :type requests: :class:`collections.Iterable`
+        :param parent: the optional parent request.  sub-requests
+                       inherit its server and headers
+                       (e.g. :mailheader:`Cookie`) unless they override,
+                       and share its session
+        :type parent: :class:`~plastic.message.Request`
+        :param max_workers: the maximum number of threads to dispatch
+                            sub-requests.  default is 4
+        :type max_workers: :class:`numbers.Integral`
+        :returns: the list of responses in the order of ``requests``
+        :rtype: :class:`list`
+
+        """
+        environ = None if parent is None else parent.environ
+        environs = [self._make_batch_environ(environ, *subrequest)
+                    for subrequest in requests]
+        responses = [None] * len(environs)
+        indices = iter(xrange(len(environs)))
+        lock = threading.Lock()
+        session_lock = threading.Lock()
+        def work():
+            while True:
+                with lock:
+                    i = next(indices, None)
+                if i is None:
+                    return
+                responses[i] = self._dispatch_subrequest(environs[i], parent,
+                                                         session_lock)
+        threads = [threading.Thread(target=work)
+                   for _ in xrange(min(max_workers, len(environs)) - 1)]
+        for thread in threads:
+            thread.start()
+        work()
+        for thread in threads:
+            thread.join()
+        return responses
+
+    def _make_batch_environ(self, parent, method, path, headers=(), body=''):
+        if parent is None:
+            environ = {
+                'SERVER_NAME': 'localhost',
+                'SERVER_PORT': '80',
+                'SERVER_PROTOCOL': 'HTTP/1.1',
+                'SCRIPT_NAME': '',
+                'wsgi.version': (1, 0),
+                'wsgi.url_scheme': 'http',
+                'wsgi.errors': sys.stderr,
+                'wsgi.multithread': True,
+                'wsgi.multiprocess': False,
+                'wsgi.run_once': False
+            }
+        else:
+            environ = dict((key, value) for key, value in parent.iteritems()
+                           if key not in ('CONTENT_TYPE', 'CONTENT_LENGTH') and
+                              not key.startswith('werkzeug.'))
+        path, _, query_string = path.partition('?')
+        if isinstance(path, unicode):
+            path = path.encode('utf-8')
+        if isinstance(query_string, unicode):
+            query_string = query_string.encode('utf-8')
+        if isinstance(headers, collections.Mapping):
+            headers = headers.items()
+        for name, value in headers:
+            key = name.upper().replace('-', '_')
+            if key not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+                key = 'HTTP_' + key
+            environ[key] = value
+        environ.update({
+            'REQUEST_METHOD': method.upper(),
+            'PATH_INFO': url_unquote(path, charset=None),
+            'QUERY_STRING': query_string,
+            'CONTENT_LENGTH': str(len(body)),
+            'wsgi.input': io.BytesIO(body),
+            'plastic.batch': True
+        })
+        return environ
+
+    def _dispatch_subrequest(self, environ, parent, session_lock):
+        try:
+            request = None
+            try:
+                if parent is None:
+                    request = Request(environ, app=self)
+                else:
+                    request = SubRequest(environ, self, parent, session_lock)
+                result = self.dispatch_request(request)
+            except HTTPException as e:
+                result = e.get_response(environ)
+            response = Response.force_type(result, environ)
+            self.save_session(request, response)
+            return response
+        except Exception:
+            logger = logging.getLogger(__name__ + '.' + type(self).__name__)
+            logger.exception('failed to dispatch the sub-request %s %s',
+                             environ['REQUEST_METHOD'], environ['PATH_INFO'])
+            error = InternalServerError().get_response(environ)
+            return Response.force_type(error, environ)
+
+    def save_session(self, request, response):
+        """Saves the ``request``'s session if it has been changed, and
+        sets the session cookie to the ``response``.
+
+        :param request: the request.  it can be ``None`` if the request
+                        failed to be made
+        :type request: :class:`~plastic.message.Request`
+        :param response: the response to set the cookie
+        :type response: :class:`~plastic.message.Response`
+
+        """
+        # Request.session is a cached_property, so if it's not in __dict__
+        # the view never touched the session and it needs not be loaded.
+        if request is not None and 'session' in request.__dict__:
             session = request.session
             if session.should_save:
                 self.session_store.save(session)
                 cookie_settings = dict(self.session_cookie)
                 cookie_key = cookie_settings.pop('key')
                 response.set_cookie(cookie_key, session.sid, **cookie_settings)
-        return response(environ, start_response)
+
+    def record_stage(self, stage, endpoint, seconds):
+        """Notifies all :attr:`instruments` that the ``stage`` has
+        finished.  See also :meth:`Instrument.record()
+        <plastic.instrumentation.Instrument.record>`.
+
+        :param stage: the name of the stage e.g. ``'view'``
+        :type stage: :class:`str`
+        :param endpoint: the endpoint of the request
+        :type endpoint: :class:`basestring`
+        :param seconds: how long the stage took in seconds
+        :type seconds: :class:`numbers.Real`
+
+        """
+        for instrument in self.instruments:
+            instrument.record(stage, endpoint, seconds)
+
+    def negotiate_mimetype(self, request):
+        """Chooses the best mimetype of :attr:`mimetype_mapping` for
+        the given ``request``'s :mailheader:`Accept` header.
+
+        Results are cached by :attr:`negotiation_cache` with the raw
+        :mailheader:`Accept` header and :attr:`mimetype_mapping_version`,
+        so the header is parsed only once for each distinct value
+        and cached results are invalidated when :meth:`add_serializer()`
+        or :meth:`associate_mimetypes()` changes the mapping.
+
+        :param request: the request to negotiate
+        :type request: :class:`~plastic.message.Request`
+        :returns: the chosen mimetype, or ``None`` if there's no
+                  acceptable mimetype
+        :rtype: :class:`basestring`
+
+        """
+        key = (request.environ.get('HTTP_ACCEPT', ''),
+               self.mimetype_mapping_version)
+        mapping = self.mimetype_mapping
+        best_match = lambda: request.accept_mimetypes.best_match(mapping)
+        return self.negotiation_cache.get_or_set(key, best_match)
 
     @cached_property
     def template_directory(self):
         """(:class:`~plastic.resourcedir.ResourceDirectory`) The mapping
-        object of the template directory.
+        object of the template directory.  Unless
+        ``'template_auto_reload'`` configuration is ``True`` it's
+        a snapshot, so looking templates up doesn't touch the filesystem.
 
         """
-        return ResourceDirectory(type(self).__module__, self.template_path)
+        cls = type(self)
+        with startup_phase('template_directory', cls.__module__):
+            snapshot = not self.config.get('template_auto_reload')
+            return ResourceDirectory(cls.__module__, self.template_path,
+                                     snapshot=snapshot)
 
     def render_template(self, request, path, values={}, **keywords):
         """Renders the response using registered :attr:`template_engines`.
@@ -465,12 +1008,170 @@ class BaseApp(object):
         :type values: :class:`collections.Mapping`
         :param \*\*keywords: the same to ``values`` except these are passed
                              by keywords
-        :returns: a rendered result
-        :rtype: :class:`basestring`
+        :returns: a rendered result.  it may be an iterable of strings
+                  if the template engine streams its result.  view
+                  functions can return it as it is
+        :rtype: :class:`basestring`, :class:`collections.Iterable`
         :raises plastic.exceptions.RenderError:
            when there are no matched template files
 
         """
+        if self.instruments:
+            started = time.time()
+            try:
+                return self._render_template(request, path, values, keywords)
+            finally:
+                self.record_stage('render', request.endpoint,
+                                  time.time() - started)
+        return self._render_template(request, path, values, keywords)
+
+    def _render_template(self, request, path, values, keywords):
+        resolved, suffix = self.resolve_template(path)
+        render = self.template_engines[suffix]
+        values = values.copy()
+        values.update(keywords)
+        if suffix in self.template_compilers:
+            template = self.get_template(resolved, suffix)
+        else:
+            template = resolved
+        if suffix in self.blocking_renderers:
+            return self.run_blocking(render, request, template, values)
+        return render(request, template, values)
+
+    def run_blocking(self, function, *args):
+        """Calls the blocking renderer ``function`` by
+        :attr:`render_executor`, or inline if there's no executor.
+
+        :param function: the renderer to call
+        :type function: :class:`collections.Callable`
+        :returns: the result of the ``function``
+
+        """
+        executor = self.render_executor
+        if executor is None:
+            return function(*args)
+        return executor.run(function, *args)
+
+    def get_template(self, path, suffix):
+        """Gets the compiled template object of the given template file
+        ``path`` from :attr:`template_cache`.  If it's not cached yet
+        the template file is read and compiled by the compiler registered
+        to the ``suffix``.
+
+        The cache key consists of the ``suffix``, the ``path`` and
+        the modification time of the template file, but the modification
+        time is checked only if ``'template_auto_reload'`` configuration
+        is ``True``.
+
+        :param path: the path of the template file with its suffix.
+                     it has to be a key of :attr:`template_directory`
+        :type path: :class:`basestring`
+        :param suffix: the suffix of the template engine
+        :type suffix: :class:`basestring`
+        :returns: the compiled template object
+
+        """
+        if self.config.get('template_auto_reload'):
+            filename = self.template_directory.get_filename(path)
+            try:
+                mtime = filename and os.stat(filename).st_mtime
+            except OSError:
+                mtime = None
+        else:
+            mtime = None
+        def compile_():
+            compiler = self.template_compilers[suffix]
+            with self.template_directory[path] as f:
+                source = f.read()
+            return compiler(self, path, source)
+        return self.template_cache.get_or_set((suffix, path, mtime), compile_)
+
+    def resolve_template(self, path):
+        """Finds the template file of the given ``path`` (*without specific
+        suffix*) and the suffix of the template engine to render it.
+
+        Resolutions are remembered in the application's template index,
+        so the template directory is looked up only once for each
+        ``path``.  If ``'template_auto_reload'`` configuration is ``True``
+        the index entry is invalidated whenever the modification time of
+        the directory containing the template changes, which is useful
+        during development.
+
+        :param path: a path to template files without specific suffix
+        :type path: :class:`basestring`
+        :returns: a pair of the path of the resolved template file
+                  (which is a key of :attr:`template_directory`) and
+                  the suffix of :attr:`template_engines`
+        :rtype: :class:`tuple`
+        :raises plastic.exceptions.RenderError:
+           when there are no matched template files
+
+        """
+        index = self._get_template_index()
+        auto_reload = self.config.get('template_auto_reload')
+        if auto_reload:
+            mtime = self._get_template_mtime(path)
+            if path in index and index[path][1] != mtime:
+                del index[path]
+        else:
+            mtime = None
+        if path in index:
+            resolved = index[path][0]
+        else:
+            resolved = self._find_template(path)
+            index[path] = resolved, mtime
+        if resolved is None:
+            raise RenderError('no matched template files: ' + path)
+        return resolved
+
+    def build_template_index(self):
+        """Walks the whole :attr:`template_directory` at once and fills
+        the template index used by :meth:`resolve_template()`.  After it's
+        built even unmatched paths are determined without touching
+        the filesystem.  It's optional; the index is lazily filled
+        on demand anyway.
+
+        :returns: the number of indexed templates
+        :rtype: :class:`numbers.Integral`
+
+        """
+        engines = self.template_engines
+        priorities = dict((suffix, i) for i, suffix in enumerate(engines))
+        found = {}
+        with startup_phase('build_template_index', type(self).__module__):
+            for name in self.template_directory:
+                basename, _, suffix = name.rpartition('.')
+                if not basename or suffix not in priorities:
+                    continue
+                if (basename not in found or
+                    priorities[suffix] < priorities[found[basename][1]]):
+                    found[basename] = name, suffix
+        auto_reload = self.config.get('template_auto_reload')
+        index = TemplateIndex(engines, complete=not auto_reload)
+        for basename, resolved in found.iteritems():
+            mtime = self._get_template_mtime(basename) if auto_reload else None
+            index[basename] = resolved, mtime
+        self._template_index = index
+        return len(found)
+
+    def _get_template_index(self):
+        index = self.__dict__.get('_template_index')
+        if index is None or index.engines is not self.template_engines:
+            index = TemplateIndex(self.template_engines)
+            self._template_index = index
+        return index
+
+    def _get_template_mtime(self, path):
+        dirname = path.rsplit('/', 1)[0] + '/' if '/' in path else ''
+        filename = self.template_directory.get_filename(dirname)
+        if filename is None:
+            return None
+        try:
+            return os.stat(filename).st_mtime
+        except OSError:
+            return None
+
+    def _find_template(self, path):
         directory = self.template_directory
         try:
             dirname, basename = path.rsplit('/', 1)
@@ -479,20 +1180,83 @@ class BaseApp(object):
             basename = path
         else:
             dirname += '/'
-            directory = directory[dirname]
+            try:
+                directory = directory[dirname]
+            except KeyError:
+                return None
         apply_name = (basename + '.').__add__
-        for suffix, render in self.template_engines.iteritems():
+        for suffix in self.template_engines:
             applied_name = apply_name(suffix)
             if applied_name in directory:
-                break
-        else:
-            raise RenderError('no matched template files: ' + path)
-        values = values.copy()
-        values.update(keywords)
-        return render(request, dirname + applied_name, values)
+                return dirname + applied_name, suffix
+
+    def warmup(self):
+        """Eagerly initializes what is otherwise lazily initialized on
+        first requests, so that they aren't slower than others.
+        It's run automatically at the end of making the application if
+        ``'warmup'`` configuration is ``True``, and before forking
+        workers by :class:`~plastic.server.PreforkServer`.  Steps are:
+
+        ``'routing'``
+           Sorting the routing map and touching its rules and converters
+           by matching a request.
+
+        ``'templates'``
+           Indexing the :attr:`template_directory`
+           (see :meth:`build_template_index()`), and compiling every
+           template of engines having compilers into
+           :attr:`template_cache`.
+
+        ``'negotiation'``
+           Filling :attr:`negotiation_cache` for the empty and ``*/*``
+           :mailheader:`Accept` headers and each serializable mimetype.
+
+        ``'static_files'``
+           Indexing the directories of
+           :class:`~plastic.static.StaticFiles` views.
+
+        :returns: the ordered mapping of the names of steps to seconds
+                  each step took
+        :rtype: :class:`collections.OrderedDict`
+        :raises Exception: what template compilers raised
 
-    def run(self, host='127.0.0.1', port=5555, debug=True, **options):
-        """Starts serving the application.
+        """
+        label = type(self).__module__ + '.' + type(self).__name__
+        steps = collections.OrderedDict()
+        @contextlib.contextmanager
+        def step(name):
+            started = time.time()
+            with startup_phase('warmup_' + name, label):
+                yield
+            steps[name] = time.time() - started
+        with step('routing'):
+            self.routing_map.update()
+            try:
+                self.routing_map.bind('localhost').match('/')
+            except HTTPException:
+                pass
+        with step('templates'):
+            self.build_template_index()
+            compilers = self.template_compilers
+            for resolved, _ in self._get_template_index().itervalues():
+                if resolved is not None and resolved[1] in compilers:
+                    self.get_template(*resolved)
+        with step('negotiation'):
+            for accept in ['', '*/*'] + list(self.mimetype_mapping):
+                environ = {'HTTP_ACCEPT': accept} if accept else {}
+                self.negotiate_mimetype(WerkzeugRequest(environ))
+        with step('static_files'):
+            for function in self.endpoints.itervalues():
+                if isinstance(function, StaticFiles):
+                    function.directory.index
+        return steps
+
+    def run(self, host='127.0.0.1', port=5555, debug=None, workers=None,
+            **options):
+        """Starts serving the application.  By default it's served by
+        the development server of Werkzeug.  If ``workers`` is given
+        it's served by :class:`~plastic.server.PreforkServer` instead,
+        which forks that number of worker processes.
 
         :param host: the hostname to listen.  default is ``'127.0.0.1'``
                      (localhost)
@@ -500,13 +1264,57 @@ class BaseApp(object):
         :param port: the port number to listen.  default is 5555
         :type port: :class:`int`
         :param debug: use debugger and reloader.  default is ``True``
+                      unless ``workers`` is given.  it cannot be used
+                      with ``workers``
         :type debug: :class:`bool`
+        :param workers: the number of worker processes to fork
+        :type workers: :class:`numbers.Integral`
         :param \*\*options: other options to be passed to
-                            :func:`werkzeug.routing.run_simple()` function
+                            :func:`werkzeug.routing.run_simple()` function,
+                            or :class:`~plastic.server.PreforkServer` if
+                            ``workers`` is given
 
         """
+        if workers is not None:
+            if debug:
+                raise ValueError('debug mode cannot be used with workers')
+            server = PreforkServer(self, host, port, workers, **options)
+            server.serve_forever()
+            return
+        if debug is None:
+            debug = True
         options.setdefault('use_reloader', debug)
         options.setdefault('use_debugger', debug)
         options.setdefault('use_evalex', debug)
         run_simple(hostname=host, port=port, application=self, **options)
 
+
+class TemplateIndex(dict):
+    """The mapping of suffix-less template paths to pairs of resolution
+    results and modification times, used by
+    :meth:`BaseApp.resolve_template()`.  Resolution results are pairs of
+    resolved template path and template engine suffix, or ``None`` for
+    unmatched paths.
+
+    :param engines: the :attr:`BaseApp.template_engines` mapping
+                    the index was made for
+    :type engines: :class:`collections.Mapping`
+    :param complete: whether the index contains every template file.
+                     if it's ``True`` missing keys are treated as
+                     unmatched paths
+    :type complete: :class:`bool`
+
+    """
+
+    def __init__(self, engines, complete=False):
+        super(TemplateIndex, self).__init__()
+        self.engines = engines
+        self.complete = complete
+
+    def __missing__(self, key):
+        if self.complete:
+            return None, None
+        raise KeyError(key)
+
+    def __contains__(self, key):
+        return self.complete or dict.__contains__(self, key)
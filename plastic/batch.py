@@ -0,0 +1,204 @@
+""":mod:`plastic.batch` --- Batch requests
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+This module provides the view which dispatches many sub-requests to
+the application's own endpoints at once, using
+:meth:`BaseApp.dispatch_batch() <plastic.app.BaseApp.dispatch_batch>`.
+In most cases you don't need to use it directly, but
+:meth:`BaseApp.add_batch_endpoint()
+<plastic.app.BaseApp.add_batch_endpoint>` method::
+
+    App.add_batch_endpoint('/_batch')
+
+Clients ``POST`` a JSON array of sub-requests with the
+:mailheader:`Content-Type` ``application/json``.  Each one is
+an object which has ``"path"`` (which may contain the query string),
+and optionally ``"method"`` (default is ``"GET"``), ``"headers"``
+(an object) and ``"body"`` (a string)::
+
+    [{"path": "/users/1"},
+     {"path": "/users/1/posts?limit=10"},
+     {"method": "POST", "path": "/hits",
+      "headers": {"Content-Type": "application/json"}, "body": "{}"}]
+
+The response is a JSON array of sub-responses in the same order.  Each
+one has ``"status"`` (an integer), ``"headers"`` (an array of
+name-value pairs) and ``"body"``.  Bodies which aren't UTF-8 are
+encoded in Base64, and then they have ``"encoding": "base64"``.
+
+Sub-requests inherit the headers of the batch request (e.g.
+:mailheader:`Cookie`) unless they override them, and cannot be batch
+requests again.  Sub-requests which fail or whose responses can't be
+read result in status 500 instead of failing the whole batch.
+
+Sub-requests share the session of the batch request, and it's saved
+with the batch response.  :mailheader:`Set-Cookie` headers of
+sub-responses are removed, so sub-requests cannot set cookies to
+the client.
+
+The batch endpoint accepts only ``application/json`` bodies.  Browsers
+cannot send them cross-site without a CORS preflight, so other sites
+cannot make users' browsers send batch requests with their cookies
+by forms.
+
+"""
+import base64
+import json
+import logging
+
+from werkzeug.exceptions import BadRequest, UnsupportedMediaType
+
+from .message import Request, Response
+
+__all__ = 'BatchView', 'SubRequest'
+
+
+class SubRequest(Request):
+    """The sub-request dispatched by :meth:`BaseApp.dispatch_batch()
+    <plastic.app.BaseApp.dispatch_batch>` on behalf of the ``parent``
+    request.  Its :attr:`session` is the parent's.
+
+    :param environ: the wsgi environ of the sub-request
+    :type environ: :class:`collections.Mapping`
+    :param app: the request app instance
+    :type app: :class:`~plastic.app.BaseApp`
+    :param parent: the parent request
+    :type parent: :class:`~plastic.message.Request`
+    :param session_lock: the lock shared by sub-requests of the same
+                         parent to load the parent's session only once
+    :type session_lock: :class:`threading.Lock`
+
+    """
+
+    def __init__(self, environ, app, parent, session_lock):
+        super(SubRequest, self).__init__(environ, app)
+        #: (:class:`~plastic.message.Request`) The parent request.
+        self.parent = parent
+        self.session_lock = session_lock
+        #: (:class:`bool`) Whether the :attr:`session` has been used.
+        #: Unlike :class:`~plastic.message.Request` the session isn't
+        #: cached in the sub-request's ``__dict__``, so it's the way to
+        #: know whether the sub-response depends on the session
+        #: (e.g. :func:`~plastic.cache.cache_response()` checks it).
+        self.session_used = False
+
+    @property
+    def session(self):
+        """(:class:`collections.MutableMapping`) The session of
+        the :attr:`parent` request.  It's saved with the parent's
+        response, not the sub-response.
+
+        """
+        self.session_used = True
+        with self.session_lock:
+            return self.parent.session
+
+
+class BatchView(object):
+    """The view function which dispatches sub-requests in the JSON
+    request body::
+
+        App.add_rule(Rule('/_batch', endpoint='batch', methods=['POST']),
+                     BatchView())
+
+    :param max_requests: the maximum number of sub-requests in a batch.
+                         default is 20
+    :type max_requests: :class:`numbers.Integral`
+    :param max_workers: the maximum number of threads to dispatch
+                        sub-requests concurrently.  default is 4
+    :type max_workers: :class:`numbers.Integral`
+
+    """
+
+    def __init__(self, max_requests=20, max_workers=4):
+        self.max_requests = max_requests
+        self.max_workers = max_workers
+
+    def parse(self, request):
+        """Parses the JSON body of the batch ``request``.
+
+        :param request: the batch request
+        :type request: :class:`~plastic.message.Request`
+        :returns: the list of sub-requests which can be passed to
+                  :meth:`BaseApp.dispatch_batch()
+                  <plastic.app.BaseApp.dispatch_batch>`
+        :rtype: :class:`list`
+        :raises werkzeug.exceptions.BadRequest:
+           when the body is invalid or has too many sub-requests
+        :raises werkzeug.exceptions.UnsupportedMediaType:
+           when the body isn't ``application/json``
+
+        """
+        if request.mimetype != 'application/json':
+            raise UnsupportedMediaType('the body must be application/json')
+        try:
+            items = json.loads(request.get_data())
+        except ValueError:
+            raise BadRequest('the body must be a JSON array')
+        if not isinstance(items, list):
+            raise BadRequest('the body must be a JSON array')
+        elif len(items) > self.max_requests:
+            raise BadRequest('too many requests; the maximum is {0}'.format(
+                self.max_requests
+            ))
+        subrequests = []
+        for item in items:
+            if not isinstance(item, dict) or \
+               not isinstance(item.get('path'), basestring):
+                raise BadRequest('every request must be an object which '
+                                 'has "path"')
+            method = item.get('method', 'GET')
+            headers = item.get('headers', {})
+            body = item.get('body', '')
+            if not isinstance(method, basestring) or \
+               not isinstance(headers, dict) or \
+               not isinstance(body, basestring):
+                raise BadRequest('"method" and "body" must be strings, and '
+                                 '"headers" must be an object')
+            if isinstance(body, unicode):
+                body = body.encode('utf-8')
+            subrequests.append((method, item['path'], headers, body))
+        return subrequests
+
+    def __call__(self, request):
+        if request.environ.get('plastic.batch'):
+            raise BadRequest('batch requests cannot be nested')
+        subrequests = self.parse(request)
+        responses = request.app.dispatch_batch(subrequests, request,
+                                               max_workers=self.max_workers)
+        results = [self.serialize(response) for response in responses]
+        return Response(json.dumps(results), mimetype='application/json')
+
+    def serialize(self, response):
+        """Makes the JSON-serializable result of the sub-``response``.
+        Its :mailheader:`Set-Cookie` headers are removed.
+
+        :param response: the sub-response
+        :type response: :class:`~plastic.message.Response`
+        :returns: the mapping which has ``'status'``, ``'headers'``,
+                  ``'body'`` and optionally ``'encoding'``
+        :rtype: :class:`dict`
+
+        """
+        try:
+            try:
+                # iter_encoded() also reads bodies in direct passthrough
+                # mode e.g. files sent by StaticFiles.
+                body = ''.join(response.iter_encoded())
+            finally:
+                response.close()
+            headers = [(name, value)
+                       for name, value in response.headers.to_wsgi_list()
+                       if name.lower() != 'set-cookie']
+            result = {'status': response.status_code, 'headers': headers}
+            try:
+                result['body'] = body.decode('utf-8')
+            except UnicodeDecodeError:
+                result['body'] = base64.b64encode(body)
+                result['encoding'] = 'base64'
+            return result
+        except Exception:
+            logger = logging.getLogger(__name__ + '.' + type(self).__name__)
+            logger.exception('failed to read the sub-response')
+            return {'status': 500, 'headers': [],
+                    'body': u'Internal Server Error'}
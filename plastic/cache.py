@@ -0,0 +1,302 @@
+""":mod:`plastic.cache` --- Caches
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+This module provides the common interface of caches Plastic internally
+uses e.g. compiled templates (see :meth:`BaseApp.add_template_engine()
+<plastic.app.BaseApp.add_template_engine>`), and its default in-process
+implementation.  You can plug your own eviction policy by subclassing
+:class:`Cache`, and configure it using the import expression syntax
+(see :func:`~plastic.config.import_instance()`)::
+
+    app = App({'template_cache': 'myapp.caches:LFUCache(size=512)'})
+
+It also provides :func:`cache_response()` decorator which caches whole
+responses of views.
+
+"""
+import functools
+import threading
+import time
+
+from werkzeug.wrappers import BaseResponse
+
+from .message import Response
+
+__all__ = 'Cache', 'LRUCache', 'cache_response'
+
+
+class Cache(object):
+    """The abstract base class of caches.  Subclasses have to implement
+    :meth:`get()`, :meth:`set()`, :meth:`delete()` and :meth:`clear()`
+    methods, and should count :attr:`hits` and :attr:`misses`.
+
+    """
+
+    #: (:class:`numbers.Integral`) The number of lookups that found
+    #: the cached value.
+    hits = 0
+
+    #: (:class:`numbers.Integral`) The number of lookups that failed
+    #: to find the cached value.
+    misses = 0
+
+    def get(self, key, default=None):
+        """Finds the cached value of the ``key``.
+
+        :param key: the hashable key to find
+        :param default: the value to return when there's no such ``key``.
+                        ``None`` by default
+        :returns: the cached value, or ``default``
+
+        """
+        raise NotImplementedError('get() method has to be implemented')
+
+    def set(self, key, value):
+        """Stores the ``value`` to the ``key``.  It may evict other
+        values.
+
+        :param key: the hashable key to store
+        :param value: the value to store
+
+        """
+        raise NotImplementedError('set() method has to be implemented')
+
+    def delete(self, key):
+        """Evicts the value of the ``key`` if it exists.
+
+        :param key: the hashable key to evict
+
+        """
+        raise NotImplementedError('delete() method has to be implemented')
+
+    def clear(self):
+        """Evicts all cached values."""
+        raise NotImplementedError('clear() method has to be implemented')
+
+    def get_or_set(self, key, function):
+        """Finds the cached value of the ``key``, or calls the ``function``
+        and then stores its result if there's no such ``key``.
+
+        :param key: the hashable key to find
+        :param function: the function to make the value to store.
+                         it takes no arguments
+        :type function: :class:`collections.Callable`
+        :returns: the cached or newly made value
+
+        """
+        missing = []
+        value = self.get(key, missing)
+        if value is missing:
+            value = function()
+            self.set(key, value)
+        return value
+
+
+class LRUCache(Cache):
+    """The thread-safe in-process cache which evicts the least recently
+    used value when it's full.
+
+    :param size: the maximum number of values to store.  default is 128
+    :type size: :class:`numbers.Integral`
+    :param ttl: the optional time to live in seconds.  values older
+                than this are treated as missing.  values never
+                expire by default
+    :type ttl: :class:`numbers.Real`
+
+    """
+
+    #: (:class:`numbers.Integral`) The number of values evicted to
+    #: make room for new values.
+    evictions = 0
+
+    def __init__(self, size=128, ttl=None):
+        if size < 1:
+            raise ValueError('size must be greater than 0, not ' + repr(size))
+        if ttl is not None and ttl <= 0:
+            raise ValueError('ttl must be greater than 0, not ' + repr(ttl))
+        self.size = size
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.mapping = {}
+        # Circular doubly linked list of [prev, next, key, value, expires]
+        # links; root.next is the least recently used one.
+        root = []
+        root[:] = [root, root, None, None, None]
+        self.root = root
+
+    def get(self, key, default=None):
+        with self.lock:
+            link = self.mapping.get(key)
+            if link is None:
+                self.misses += 1
+                return default
+            self._unlink(link)
+            if link[4] is not None and link[4] <= time.time():
+                del self.mapping[key]
+                self.misses += 1
+                return default
+            self._append(link)
+            self.hits += 1
+            return link[3]
+
+    def set(self, key, value):
+        with self.lock:
+            link = self.mapping.get(key)
+            if link is None:
+                if len(self.mapping) >= self.size:
+                    oldest = self.root[1]
+                    self._unlink(oldest)
+                    del self.mapping[oldest[2]]
+                    self.evictions += 1
+                link = [None, None, key, value, None]
+                self.mapping[key] = link
+            else:
+                self._unlink(link)
+                link[3] = value
+            if self.ttl is not None:
+                link[4] = time.time() + self.ttl
+            self._append(link)
+
+    def delete(self, key):
+        with self.lock:
+            link = self.mapping.pop(key, None)
+            if link is not None:
+                self._unlink(link)
+
+    def clear(self):
+        with self.lock:
+            self.mapping.clear()
+            root = self.root
+            root[:] = [root, root, None, None, None]
+
+    def _unlink(self, link):
+        prev, next_ = link[0], link[1]
+        prev[1] = next_
+        next_[0] = prev
+
+    def _append(self, link):
+        root = self.root
+        last = root[0]
+        link[0] = last
+        link[1] = root
+        last[1] = root[0] = link
+
+    def __contains__(self, key):
+        link = self.mapping.get(key)
+        return link is not None and (link[4] is None or
+                                     link[4] > time.time())
+
+    def __len__(self):
+        return len(self.mapping)
+
+    def __repr__(self):
+        cls = type(self)
+        return '<{0}.{1} {2}/{3} (hits: {4}, misses: {5})>'.format(
+            cls.__module__, cls.__name__, len(self), self.size,
+            self.hits, self.misses
+        )
+
+
+def cache_response(ttl=None, headers=()):
+    """The decorator which caches whole responses of the decorated view
+    function in :attr:`BaseApp.response_cache
+    <plastic.app.BaseApp.response_cache>`.  It's for views which are
+    pure functions of their parameters and the requested mimetype::
+
+        @App.route('/people/<name>')
+        @cache_response(ttl=60)
+        def person(request, name):
+            return render(request, find_person(name), 'person')
+
+    Responses are cached by the endpoint, the parameter values,
+    the query string, the negotiated mimetype (see :meth:`BaseApp.negotiate_mimetype()
+    <plastic.app.BaseApp.negotiate_mimetype>`) and the values of
+    request ``headers`` the response depends on.  Headers listed in
+    the :mailheader:`Vary` header of responses are also taken into
+    account.  Cache hits are served without calling the view function,
+    so nothing is rendered and the session is never loaded.
+
+    Only successful responses of ``GET`` and ``HEAD`` requests with
+    buffered bodies are cached.
+    Responses which set cookies, have :mailheader:`Vary` ``*`` or
+    ``private``/``no-store`` :mailheader:`Cache-Control`, or made by
+    views which used the session are not cached.
+
+    Cached values are plain tuples of strings, so caches can be stored
+    out of the process e.g. memcached.
+
+    :param ttl: seconds to keep responses.  they never expire
+                by default
+    :type ttl: :class:`numbers.Real`
+    :param headers: the names of request headers the response depends on
+    :type headers: :class:`collections.Iterable`
+    :returns: the decorator
+    :rtype: :class:`collections.Callable`
+
+    """
+    if ttl is not None and ttl <= 0:
+        raise ValueError('ttl must be greater than 0, not ' + repr(ttl))
+    headers = tuple(sorted(frozenset(h.lower() for h in headers)))
+    def decorate(function):
+        @functools.wraps(function)
+        def view(request, **values):
+            if request.method not in ('GET', 'HEAD'):
+                return function(request, **values)
+            cache = request.app.response_cache
+            try:
+                base_key = ('response', request.endpoint,
+                            frozenset(values.iteritems()),
+                            request.environ.get('QUERY_STRING', ''),
+                            request.app.negotiate_mimetype(request))
+                hash(base_key)
+            except TypeError:  # unhashable values
+                return function(request, **values)
+            # The entry of header names the response varies on must not
+            # share the key with responses that vary on no headers.
+            vary_key = ('response_vary',) + base_key[1:]
+            vary = cache.get(vary_key, headers)
+            key = base_key + get_header_values(request.environ, vary)
+            entry = cache.get(key)
+            now = time.time()
+            if entry is not None and (entry[0] is None or entry[0] > now):
+                return Response(entry[3], status=entry[1], headers=entry[2])
+            response = function(request, **values)
+            if isinstance(response, basestring):
+                response = Response(response)
+            elif not isinstance(response, BaseResponse):
+                return response  # e.g. streams, WSGI applications
+            vary = get_response_vary(request, response, headers)
+            if vary is not None:
+                cache.set(vary_key, vary)
+                key = base_key + get_header_values(request.environ, vary)
+                expires = None if ttl is None else now + ttl
+                cache.set(key, (expires, response.status,
+                                response.headers.to_wsgi_list(),
+                                response.get_data()))
+            return response
+        return view
+    return decorate
+
+
+def get_header_values(environ, names):
+    return tuple(environ.get('HTTP_' + name.upper().replace('-', '_'))
+                 for name in names)
+
+
+def get_response_vary(request, response, headers):
+    if (response.status_code != 200 or not response.is_sequence or
+        response.direct_passthrough or 'Set-Cookie' in response.headers or
+        'session' in request.__dict__ or
+        getattr(request, 'session_used', False)):  # batch.SubRequest
+        return None
+    cache_control = response.cache_control
+    if cache_control.private or cache_control.no_store:
+        return None
+    vary = set(headers)
+    for name in response.vary:
+        name = name.lower()
+        if name == '*':
+            return None
+        elif name != 'accept':  # the negotiated mimetype is in the key
+            vary.add(name)
+    return tuple(sorted(vary))
@@ -0,0 +1,297 @@
+""":mod:`plastic.compression` --- Response compression
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+This module provides the opt-in stage of :meth:`BaseApp.wsgi_app()
+<plastic.app.BaseApp.wsgi_app>` which compresses response bodies
+according to requests' :mailheader:`Accept-Encoding` header.  It's
+enabled by ``'compression'`` configuration::
+
+    app = App({'compression': 'plastic.compression:Compression(level=6)'})
+
+Buffered bodies smaller than :attr:`Compression.min_size` are left
+as they are, and bodies of compressed formats (e.g. images) or of
+responses which already have :mailheader:`Content-Encoding` are never
+compressed.  Streamed bodies are compressed chunk by chunk, so they
+are still streamed.  Small chunks (e.g. ones of
+:meth:`json.JSONEncoder.iterencode()`) are buffered up to
+:attr:`Compression.buffer_size` bytes and compressed together, since
+flushing every tiny chunk makes the body even larger than
+the uncompressed one.
+
+Responses to ``HEAD`` requests have the same headers as ones to
+``GET`` requests (:mailheader:`Content-Encoding`,
+:mailheader:`Vary` and :mailheader:`ETag`), but their bodies are not
+compressed.  Their :mailheader:`Content-Length` is omitted instead.
+
+Compressed buffered bodies can be cached by the hash of their content,
+so identical responses (e.g. the same rendered template) are not
+compressed again::
+
+    app = App({
+        'compression': 'plastic.compression:Compression('
+                       'cache="plastic.cache:LRUCache(256)")'
+    })
+
+Brotli (``br``) is available only if the :mod:`brotli` module is
+installed; gzip and deflate are always available.
+
+"""
+import hashlib
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+from werkzeug.http import parse_accept_header
+
+from .cache import Cache
+from .config import import_instance
+
+__all__ = ('Compression', 'CompressedIterator', 'DEFAULT_MIMETYPES',
+           'ENCODERS')
+
+
+#: (:class:`tuple`) The mimetypes to compress by default.  Ones ending
+#: with ``/`` are prefixes and ones starting with ``+`` are suffixes.
+DEFAULT_MIMETYPES = ('text/', 'application/json', 'application/javascript',
+                     'application/x-javascript', 'application/xml',
+                     'image/svg+xml', '+json', '+xml')
+
+
+class ZlibEncoder(object):
+
+    def __init__(self, level, wbits):
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, wbits)
+
+    def compress(self, data):
+        compressor = self.compressor
+        return compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self.compressor.flush()
+
+
+class BrotliEncoder(object):
+
+    def __init__(self, level):
+        self.compressor = brotli.Compressor(quality=min(level, 11))
+
+    def compress(self, data):
+        compressor = self.compressor
+        return compressor.process(data) + compressor.flush()
+
+    def finish(self):
+        return self.compressor.finish()
+
+
+#: (:class:`dict`) The mapping of content codings to factories of
+#: encoders.  Each factory takes the compression level.
+ENCODERS = {
+    'gzip': lambda level: ZlibEncoder(level, 16 + zlib.MAX_WBITS),
+    'deflate': lambda level: ZlibEncoder(level, zlib.MAX_WBITS)
+}
+
+if brotli is not None:
+    ENCODERS['br'] = BrotliEncoder
+
+
+class Compression(object):
+    """The compression stage.
+
+    :param level: the compression level from 1 (fastest) to 9 (smallest).
+                  default is 6
+    :type level: :class:`numbers.Integral`
+    :param min_size: the minimum bytes of buffered bodies to compress.
+                     default is 500
+    :type min_size: :class:`numbers.Integral`
+    :param mimetypes: the mimetypes to compress.
+                      default is :const:`DEFAULT_MIMETYPES`
+    :type mimetypes: :class:`collections.Iterable`
+    :param cache: the optional cache of compressed bodies, or its import
+                  expression (see :func:`~plastic.config.import_instance`)
+    :type cache: :class:`~plastic.cache.Cache`, :class:`basestring`
+    :param encodings: the content codings to use in the order of
+                      preference.  default is all available ones
+                      (``br``, ``gzip`` and ``deflate``)
+    :type encodings: :class:`collections.Sequence`
+    :param buffer_size: the bytes of streamed chunks to buffer before
+                        compressing and flushing them.  0 means to flush
+                        every chunk.  default is 8192
+    :type buffer_size: :class:`numbers.Integral`
+
+    """
+
+    def __init__(self, level=6, min_size=500, mimetypes=DEFAULT_MIMETYPES,
+                 cache=None, encodings=None, buffer_size=8192):
+        if not 1 <= level <= 9:
+            raise ValueError('level must be between 1 and 9, not ' +
+                             repr(level))
+        self.level = level
+        self.min_size = min_size
+        self.buffer_size = buffer_size
+        self.mimetypes = frozenset(m for m in mimetypes
+                                   if not m.endswith('/') and m[0] != '+')
+        self.mimetype_prefixes = tuple(m for m in mimetypes
+                                       if m.endswith('/'))
+        self.mimetype_suffixes = tuple(m for m in mimetypes if m[0] == '+')
+        if cache is not None:
+            cache = import_instance(cache, Cache)
+        #: (:class:`~plastic.cache.Cache`) The cache of compressed bodies.
+        self.cache = cache
+        if encodings is None:
+            encodings = [e for e in ('br', 'gzip', 'deflate')
+                         if e in ENCODERS]
+        else:
+            for encoding in encodings:
+                if encoding not in ENCODERS:
+                    raise ValueError('unsupported encoding: ' +
+                                     repr(encoding))
+        self.encodings = list(encodings)
+
+    def is_compressible(self, mimetype):
+        """Determines whether the ``mimetype`` is worth compressing.
+
+        :param mimetype: the mimetype without parameters
+        :type mimetype: :class:`basestring`
+        :returns: whether to compress
+        :rtype: :class:`bool`
+
+        """
+        return bool(mimetype) and (
+            mimetype in self.mimetypes or
+            mimetype.startswith(self.mimetype_prefixes) or
+            mimetype.endswith(self.mimetype_suffixes)
+        )
+
+    def negotiate(self, environ):
+        """Chooses the content coding the client accepts best.
+
+        :param environ: the WSGI environ of the request
+        :type environ: :class:`collections.Mapping`
+        :returns: the content coding, or ``None`` for the identity
+        :rtype: :class:`str`
+
+        """
+        header = environ.get('HTTP_ACCEPT_ENCODING')
+        if not header:
+            return None
+        return parse_accept_header(header).best_match(self.encodings)
+
+    def compress(self, environ, response):
+        """Compresses the ``response`` body in place if it should be.
+
+        :param environ: the WSGI environ of the request
+        :type environ: :class:`collections.Mapping`
+        :param response: the response to compress
+        :type response: :class:`~plastic.message.Response`
+        :returns: the ``response``
+        :rtype: :class:`~plastic.message.Response`
+
+        """
+        status = response.status_code
+        headers = response.headers
+        if (status < 200 or status in (204, 206, 304) or
+            response.direct_passthrough or 'Content-Encoding' in headers or
+            'no-transform' in headers.get('Cache-Control', '') or
+            not self.is_compressible(response.mimetype)):
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = self.negotiate(environ)
+        if encoding is None:
+            return response
+        head = environ.get('REQUEST_METHOD') == 'HEAD'
+        if response.is_sequence:
+            body = response.get_data()
+            if len(body) < self.min_size:
+                return response
+            elif head:
+                # The length of the compressed body is unknown without
+                # compressing it, and the length of the uncompressed one
+                # is wrong.
+                headers.pop('Content-Length', None)
+                response.automatically_set_content_length = False
+            else:
+                response.set_data(self.compress_data(body, encoding))
+        else:
+            if not head:
+                encoder = ENCODERS[encoding](self.level)
+                response.response = CompressedIterator(
+                    response.response, encoder, response.charset,
+                    self.buffer_size
+                )
+            headers.pop('Content-Length', None)
+        headers['Content-Encoding'] = encoding
+        etag, weak = response.get_etag()
+        if etag:
+            response.set_etag(etag + '-' + encoding, weak)
+        return response
+
+    def compress_data(self, data, encoding):
+        """Compresses the whole ``data``.  If there's the :attr:`cache`
+        the result is cached by the hash of the ``data``.
+
+        :param data: the data to compress
+        :type data: :class:`str`
+        :param encoding: the content coding
+        :type encoding: :class:`str`
+        :returns: the compressed data
+        :rtype: :class:`str`
+
+        """
+        def compress():
+            encoder = ENCODERS[encoding](self.level)
+            return encoder.compress(data) + encoder.finish()
+        if self.cache is None:
+            return compress()
+        key = 'compression', encoding, self.level, hashlib.sha1(data).digest()
+        return self.cache.get_or_set(key, compress)
+
+
+class CompressedIterator(object):
+    """The iterable which compresses chunks of the ``iterable``.
+    Chunks are buffered until they reach ``buffer_size`` bytes, and
+    then compressed and flushed together, so clients can decompress
+    what they have received so far.
+
+    :param iterable: the iterable of chunks
+    :type iterable: :class:`collections.Iterable`
+    :param encoder: the encoder made by :data:`ENCODERS`
+    :param charset: the charset to encode unicode chunks.
+                    default is ``'utf-8'``
+    :type charset: :class:`str`
+    :param buffer_size: the bytes of chunks to buffer before compressing
+                        them.  0 means to compress every chunk.
+                        default is 8192
+    :type buffer_size: :class:`numbers.Integral`
+
+    """
+
+    def __init__(self, iterable, encoder, charset='utf-8', buffer_size=8192):
+        self.iterable = iterable
+        self.encoder = encoder
+        self.charset = charset
+        self.buffer_size = buffer_size
+
+    def __iter__(self):
+        compress = self.encoder.compress
+        buffer_ = []
+        buffered = 0
+        for chunk in self.iterable:
+            if isinstance(chunk, unicode):
+                chunk = chunk.encode(self.charset)
+            if chunk:
+                buffer_.append(chunk)
+                buffered += len(chunk)
+                if buffered >= self.buffer_size:
+                    yield compress(''.join(buffer_))
+                    buffer_ = []
+                    buffered = 0
+        if buffer_:
+            yield compress(''.join(buffer_))
+        yield self.encoder.finish()
+
+    def close(self):
+        close = getattr(self.iterable, 'close', None)
+        if close is not None:
+            close()
@@ -11,6 +11,8 @@ from types import ModuleType
 from werkzeug._internal import _DictAccessorProperty
 from werkzeug.utils import import_string
 
+from .profiling import startup_phase
+
 __all__ = 'Config', 'config_property', 'get_typename', 'import_instance'
 
 
@@ -66,10 +68,11 @@ class Config(dict):
         :type overwrite: :class:`bool`
 
         """
-        module = ModuleType(filename)
-        module.__file__ = abspath(filename)
-        execfile(filename, module.__dict__)
-        self.update_from_object(module, overwrite)
+        with startup_phase('update_from_file', filename):
+            module = ModuleType(filename)
+            module.__file__ = abspath(filename)
+            execfile(filename, module.__dict__)
+            self.update_from_object(module, overwrite)
 
     def update_unless_exists(self, mapping=(), **keywords):
         """Almost equivalent to :meth:`~dict.update()` except
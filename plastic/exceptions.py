@@ -5,7 +5,7 @@
 from werkzeug.exceptions import NotAcceptable
 
 
-__all__ = 'PlasticError', 'RenderError'
+__all__ = 'PlasticError', 'RenderError', 'SessionError'
 
 
 class PlasticError(Exception):
@@ -26,3 +26,9 @@ class RenderError(PlasticError, NotAcceptable):
         if message is not None:
             PlasticError.__init__(self, message)
 
+
+class SessionError(PlasticError, ValueError):
+    """Raised when a session cannot be stored e.g. it's too large to
+    fit in a cookie.
+
+    """
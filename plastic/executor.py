@@ -0,0 +1,279 @@
+""":mod:`plastic.executor` --- Render executor
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+This module provides the thread pool which runs template engines and
+serializers declared as blocking (see :meth:`BaseApp.add_template_engine()
+<plastic.app.BaseApp.add_template_engine>` and
+:meth:`BaseApp.add_serializer() <plastic.app.BaseApp.add_serializer>`)
+off the request thread::
+
+    @App.serializer('application/json', blocking=True)
+    def serialize_json(request, value):
+        return json.dumps(value)
+
+The request thread waits for the render to finish, so on threaded or
+prefork servers the executor doesn't free request threads; what it
+does is to limit the number of renders running at once to
+:attr:`RenderExecutor.max_workers`, so heavy renders cannot occupy
+every worker of the server.  When more than
+:attr:`RenderExecutor.max_queue` renders are waiting, new ones are
+rejected with :exc:`~werkzeug.exceptions.ServiceUnavailable`.
+
+If :mod:`threading` is monkey-patched by gevent_, threads made by
+:mod:`threading` are greenlets and would block the hub as the request
+greenlet does.  So in that case renders run in native threads of
+:class:`gevent.threadpool.ThreadPool`, and only the request greenlet
+waits for them while the hub keeps serving other requests.  Note that
+Python code still takes turns under the :abbr:`GIL (global interpreter
+lock)`, so renders and other requests share a core.  Eventlet's
+monkey-patching isn't detected; threads are green there.
+
+The executor is configured by ``'render_executor'`` configuration::
+
+    app = App({
+        'render_executor': 'plastic.executor:RenderExecutor('
+                           'max_workers=8, max_queue=64)'
+    })
+
+Its worker threads are started when the first blocking render is
+submitted, so applications without blocking renderers pay nothing.
+If it's ``None`` blocking renderers run inline.
+
+Renderers which return iterables (e.g. generators) are only called
+by the executor; their chunks are produced while the response is sent.
+
+.. _gevent: http://www.gevent.org/
+
+"""
+import Queue
+import os
+import sys
+import threading
+import time
+
+from werkzeug.exceptions import ServiceUnavailable
+
+__all__ = 'RenderExecutor', 'RenderTask'
+
+
+def is_gevent_patched():
+    """Determines whether :mod:`threading` is monkey-patched by gevent.
+    It doesn't import gevent unless the application has imported it.
+
+    :returns: whether threads are greenlets
+    :rtype: :class:`bool`
+
+    """
+    monkey = sys.modules.get('gevent.monkey')
+    return monkey is not None and monkey.is_module_patched('threading')
+
+
+def get_original(module, name):
+    """Gets the attribute of the ``module`` as it was before gevent's
+    monkey-patching.  Native threads have to use native locks.
+
+    :param module: the module name e.g. ``'thread'``
+    :type module: :class:`str`
+    :param name: the attribute name
+    :type name: :class:`str`
+    :returns: the original attribute
+
+    """
+    if is_gevent_patched():
+        return sys.modules['gevent.monkey'].get_original(module, name)
+    return getattr(__import__(module), name)
+
+
+class RenderExecutor(object):
+    """The bounded thread pool for blocking renders.
+
+    :param max_workers: the number of worker threads.  default is 4
+    :type max_workers: :class:`numbers.Integral`
+    :param max_queue: the maximum number of renders waiting for workers.
+                      unlimited by default
+    :type max_queue: :class:`numbers.Integral`
+
+    """
+
+    def __init__(self, max_workers=4, max_queue=None):
+        if max_workers < 1:
+            raise ValueError('max_workers must be greater than 0, not ' +
+                             repr(max_workers))
+        if max_queue is not None and max_queue < 0:
+            raise ValueError('max_queue must not be negative, not ' +
+                             repr(max_queue))
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.lock = get_original('thread', 'allocate_lock')()
+        self.queue = Queue.Queue()
+        self.local = get_original('thread', '_local')()
+        self.workers = []
+        #: (:class:`gevent.threadpool.ThreadPool`) The pool of native
+        #: threads used instead of :attr:`workers` if :mod:`threading`
+        #: is monkey-patched by gevent.
+        self.threadpool = None
+        self.pid = None
+        #: (:class:`numbers.Integral`) The number of renders waiting for
+        #: workers i.e. the queue depth.
+        self.pending = 0
+        #: (:class:`numbers.Integral`) The number of running renders.
+        self.active = 0
+        #: (:class:`numbers.Integral`) The highest queue depth so far.
+        self.max_pending = 0
+        #: (:class:`numbers.Integral`) The number of submitted renders.
+        self.submitted = 0
+        #: (:class:`numbers.Integral`) The number of finished renders.
+        self.completed = 0
+        #: (:class:`numbers.Integral`) The number of renders rejected
+        #: because the queue was full.
+        self.rejected = 0
+        #: (:class:`numbers.Real`) The total seconds renders waited in
+        #: the queue.
+        self.wait_seconds = 0.0
+
+    def run(self, function, *args, **kwargs):
+        """Calls the ``function`` in a worker thread and waits for
+        its result.  If it's called from a worker thread the ``function``
+        is called inline to avoid deadlocks.
+
+        :param function: the function to call
+        :type function: :class:`collections.Callable`
+        :returns: the result of the ``function``
+        :raises werkzeug.exceptions.ServiceUnavailable:
+           when the queue is full
+
+        """
+        if getattr(self.local, 'worker', False):
+            return function(*args, **kwargs)
+        task = RenderTask(function, args, kwargs)
+        with self.lock:
+            if self.max_queue is not None and self.pending >= self.max_queue:
+                self.rejected += 1
+                raise ServiceUnavailable('too many renders are queued')
+            self.pending += 1
+            self.submitted += 1
+            if self.pending > self.max_pending:
+                self.max_pending = self.pending
+            self._start_workers()
+        if self.threadpool is None:
+            self.queue.put(task)
+            task.done.wait()
+        else:
+            # Only the current greenlet waits; the hub keeps running.
+            self.threadpool.apply(self._run_task, (task,))
+        if task.exc_info is not None:
+            exc_type, exc_value, traceback = task.exc_info
+            task.exc_info = None
+            raise exc_type, exc_value, traceback
+        return task.result
+
+    def stats(self):
+        """Takes the snapshot of metrics.
+
+        :returns: the mapping which has ``'workers'``, ``'pending'``
+                  (the queue depth), ``'active'``, ``'max_pending'``,
+                  ``'submitted'``, ``'completed'``, ``'rejected'`` and
+                  ``'mean_wait_seconds'``
+        :rtype: :class:`dict`
+
+        """
+        with self.lock:
+            started = self.submitted - self.pending
+            threadpool = self.threadpool
+            return {
+                'workers': (len(self.workers) if threadpool is None
+                            else threadpool.size),
+                'pending': self.pending,
+                'active': self.active,
+                'max_pending': self.max_pending,
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'mean_wait_seconds': (self.wait_seconds / started
+                                      if started else 0.0)
+            }
+
+    def shutdown(self):
+        """Stops worker threads after queued renders are finished.
+        Workers are started again when a render is submitted.
+        """
+        with self.lock:
+            workers = self.workers
+            self.workers = []
+            threadpool = self.threadpool
+            self.threadpool = None
+            for _ in workers:
+                self.queue.put(None)
+        for worker in workers:
+            if worker is not threading.current_thread():
+                worker.join()
+        if threadpool is not None:
+            threadpool.join()
+            threadpool.kill()
+
+    def _start_workers(self):
+        pid = os.getpid()
+        if self.pid != pid:  # threads don't survive fork()
+            self.pid = pid
+            self.queue = Queue.Queue()
+            self.workers = []
+            self.threadpool = None
+        if is_gevent_patched():
+            if self.threadpool is None:
+                from gevent.threadpool import ThreadPool
+                self.threadpool = ThreadPool(self.max_workers)
+            return
+        while len(self.workers) < self.max_workers:
+            worker = threading.Thread(target=self._work,
+                                      name='plastic-render-executor')
+            worker.daemon = True
+            worker.start()
+            self.workers.append(worker)
+
+    def _work(self):
+        queue = self.queue
+        while True:
+            task = queue.get()
+            if task is None:
+                return
+            self._run_task(task)
+            task.done.set()
+
+    def _run_task(self, task):
+        self.local.worker = True
+        with self.lock:
+            self.pending -= 1
+            self.active += 1
+            self.wait_seconds += time.time() - task.submitted_at
+        try:
+            task.result = task.function(*task.args, **task.kwargs)
+        except BaseException:
+            task.exc_info = sys.exc_info()
+        finally:
+            with self.lock:
+                self.active -= 1
+                self.completed += 1
+
+    def __repr__(self):
+        cls = type(self)
+        stats = self.stats()
+        return '<{0}.{1} {2}/{3} active, {4} pending>'.format(
+            cls.__module__, cls.__name__, stats['active'], self.max_workers,
+            stats['pending']
+        )
+
+
+class RenderTask(object):
+    """The render submitted to :class:`RenderExecutor`."""
+
+    __slots__ = ('function', 'args', 'kwargs', 'done', 'result', 'exc_info',
+                 'submitted_at')
+
+    def __init__(self, function, args, kwargs):
+        self.function = function
+        self.args = args
+        self.kwargs = kwargs
+        self.done = threading.Event()
+        self.result = None
+        self.exc_info = None
+        self.submitted_at = time.time()
@@ -0,0 +1,197 @@
+""":mod:`plastic.instrumentation` --- Request instrumentation
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+This module provides the interface of instruments which are notified
+how long each stage of handling requests takes, and the bundled
+:class:`LatencyCollector` that aggregates these into per-endpoint
+latency histograms.  Instruments are configured by ``'instruments'``
+configuration, a list of instruments or import expressions (see
+:func:`~plastic.config.import_instance()`)::
+
+    app = App({'instruments': ['plastic.instrumentation:LatencyCollector']})
+
+Stages are:
+
+``'routing'``
+   Making the :class:`~plastic.message.Request` and matching it to
+   the endpoint.
+
+``'view'``
+   Calling the view function.  It includes ``'render'`` stage.
+
+``'render'``
+   Rendering templates or serializing values.  See also
+   :func:`~plastic.rendering.render()`.
+
+``'session'``
+   Saving the session.  It's not recorded if the session wasn't used.
+
+``'response'``
+   Making the response and starting it.  Streamed bodies are iterated
+   by the WSGI server after this stage.
+
+``'total'``
+   All the above stages.
+
+When there are no instruments nothing is timed at all.
+
+"""
+import bisect
+import json
+import threading
+
+from werkzeug.wrappers import BaseResponse
+
+__all__ = 'DEFAULT_BUCKETS', 'Instrument', 'LatencyCollector', 'STAGES'
+
+
+#: (:class:`tuple`) The names of stages in the order of handling requests.
+STAGES = 'routing', 'view', 'render', 'session', 'response', 'total'
+
+#: (:class:`tuple`) The default upper bounds of histogram buckets in
+#: seconds.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Instrument(object):
+    """The abstract base class of instruments.  Subclasses have to
+    implement :meth:`record()` method.
+
+    """
+
+    def record(self, stage, endpoint, seconds):
+        """Called when a ``stage`` of handling a request has finished.
+        It's called from the thread handling the request, so it should
+        be fast and thread-safe.
+
+        :param stage: the name of the stage e.g. ``'view'``.
+                      see also :const:`STAGES`
+        :type stage: :class:`str`
+        :param endpoint: the endpoint of the request.  ``None`` if
+                         the request didn't match to any endpoint
+        :type endpoint: :class:`basestring`
+        :param seconds: how long the stage took in seconds
+        :type seconds: :class:`numbers.Real`
+
+        """
+        raise NotImplementedError('record() method has to be implemented')
+
+
+class LatencyCollector(Instrument):
+    """The thread-safe in-memory instrument which aggregates latencies
+    into histograms for each endpoint and stage.  It's also a WSGI
+    application which responds the :meth:`report()` in JSON, so that
+    you can mount it to see the statistics::
+
+        collector = LatencyCollector()
+        App.add_rule(Rule('/_latency', endpoint='latency'),
+                     lambda request: collector)
+        app = App({'instruments': [collector]})
+
+    :param buckets: the ascending upper bounds of histogram buckets
+                    in seconds.  default is :const:`DEFAULT_BUCKETS`
+    :type buckets: :class:`collections.Sequence`
+
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        buckets = tuple(buckets)
+        if not buckets or list(buckets) != sorted(set(buckets)):
+            raise ValueError('buckets must be ascending and unique, not ' +
+                             repr(buckets))
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        # (endpoint, stage) -> [count, sum, max, bucket counts...]
+        # the last bucket counts latencies greater than the last bound.
+        self.stats = {}
+
+    def record(self, stage, endpoint, seconds):
+        index = bisect.bisect_left(self.buckets, seconds)
+        key = endpoint, stage
+        with self.lock:
+            stat = self.stats.get(key)
+            if stat is None:
+                stat = [0, 0.0, 0.0] + [0] * (len(self.buckets) + 1)
+                self.stats[key] = stat
+            stat[0] += 1
+            stat[1] += seconds
+            if seconds > stat[2]:
+                stat[2] = seconds
+            stat[3 + index] += 1
+
+    def percentile(self, endpoint, stage, q):
+        """Estimates the ``q``-th percentile latency of the ``stage``
+        of the ``endpoint``.  It's the upper bound of the bucket
+        the percentile falls into (or the maximum latency if it's
+        greater than the last bound).
+
+        :param endpoint: the endpoint
+        :type endpoint: :class:`basestring`
+        :param stage: the stage e.g. ``'total'``
+        :type stage: :class:`str`
+        :param q: the percentile between 0 and 100
+        :type q: :class:`numbers.Real`
+        :returns: the estimated latency in seconds, or ``None`` if
+                  nothing has been recorded
+        :rtype: :class:`numbers.Real`
+
+        """
+        if not 0 <= q <= 100:
+            raise ValueError('q must be between 0 and 100, not ' + repr(q))
+        with self.lock:
+            stat = self.stats.get((endpoint, stage))
+            if stat is None:
+                return None
+            stat = list(stat)
+        rank = stat[0] * q / 100.0
+        seen = 0
+        for bound, count in zip(self.buckets, stat[3:]):
+            seen += count
+            if count and seen >= rank:
+                return min(bound, stat[2])
+        return stat[2]
+
+    def report(self):
+        """Makes the structured report of recorded latencies.
+
+        :returns: the mapping of endpoints to mappings of stages to
+                  statistics.  each statistic has ``'count'``,
+                  ``'sum'``, ``'mean'``, ``'max'``, ``'p50'``, ``'p90'``,
+                  ``'p99'`` (in seconds) and ``'histogram'``, the list of
+                  pairs of the upper bound (``None`` means infinity) and
+                  the number of latencies in the bucket
+        :rtype: :class:`dict`
+
+        """
+        with self.lock:
+            stats = dict((key, list(stat))
+                         for key, stat in self.stats.iteritems())
+        report = {}
+        bounds = list(self.buckets) + [None]
+        for (endpoint, stage), stat in stats.iteritems():
+            count, sum_, max_ = stat[:3]
+            report.setdefault(endpoint, {})[stage] = {
+                'count': count,
+                'sum': sum_,
+                'mean': sum_ / count,
+                'max': max_,
+                'p50': self.percentile(endpoint, stage, 50),
+                'p90': self.percentile(endpoint, stage, 90),
+                'p99': self.percentile(endpoint, stage, 99),
+                'histogram': zip(bounds, stat[3:])
+            }
+        return report
+
+    def reset(self):
+        """Forgets all recorded latencies."""
+        with self.lock:
+            self.stats.clear()
+
+    def __call__(self, environ, start_response):
+        report = dict((str(endpoint), stages)
+                      for endpoint, stages in self.report().iteritems())
+        response = BaseResponse(json.dumps(report, indent=2, sort_keys=True),
+                                mimetype='application/json')
+        response.headers['Cache-Control'] = 'no-cache'
+        return response(environ, start_response)
@@ -26,9 +26,6 @@ class Request(BaseRequest):
     #: (:class:`~plastic.app.BaseApp`) The requested application instance.
     app = None
 
-    #: (:class:`werkzeug.routing.MapAdapter`) The bound url adapter.
-    bound_routing_map = None
-
     #: (:class:`collections.Mapping`) The pararmeter values of routed
     #: endpoint.
     endpoint_values = None
@@ -41,11 +38,15 @@ class Request(BaseRequest):
         super(Request, self).__init__(environ=environ,
                                       populate_request=populate_request,
                                       shallow=shallow)
-        self.bound_routing_map = app.routing_map.bind_to_environ(environ)
-        self.endpoint, self.endpoint_values = self.bound_routing_map.match()
         self.app = app
+        self.endpoint, self.endpoint_values = app.router.match(self)
         self.context = Context()
 
+    @cached_property
+    def bound_routing_map(self):
+        """(:class:`werkzeug.routing.MapAdapter`) The bound url adapter."""
+        return self.app.routing_map.bind_to_environ(self.environ)
+
     def build_url(self, endpoint, _method=None, _external=False, **values):
         """Builds an url for the given ``endpoint`` and other editional
         options.
@@ -61,10 +62,72 @@ class Request(BaseRequest):
         :type _external: :class:`bool`
         :param \*\*values: the parameter values for the ``endpoint``
 
+        Built urls are cached by the application's
+        :attr:`~plastic.app.BaseApp.url_cache` unless ``values`` are
+        unhashable.
+
+        """
+        cache = self.app.url_cache
+        try:
+            key = (self._url_cache_prefix, endpoint, _method, _external,
+                   make_values_key(values))
+            url = cache.get(key)
+        except TypeError:
+            return self.bound_routing_map.build(endpoint, values,
+                                                method=_method,
+                                                force_external=_external)
+        if url is None:
+            url = self.bound_routing_map.build(endpoint, values,
+                                               method=_method,
+                                               force_external=_external)
+            cache.set(key, url)
+        return url
+
+    def build_urls(self, endpoint, values_list, _method=None,
+                   _external=False):
+        """Builds urls for the same ``endpoint`` with each of
+        ``values_list`` at once.  It's equivalent to calling
+        :meth:`build_url()` for each values, but cheaper.
+        ::
+
+            urls = request.build_urls('person', [{'name': name}
+                                                 for name in names])
+
+        :param endpoint: the endpoint of urls to build
+        :type endpoint: :class:`basestring`
+        :param values_list: the iterable of parameter values mappings
+        :type values_list: :class:`collections.Iterable`
+        :param _method: an optional HTTP method to disambiguate the rule
+        :type _method: :class:`basestring`
+        :param _external: build absolute urls instead of relative urls
+        :type _external: :class:`bool`
+        :returns: the list of built urls in the same order
+        :rtype: :class:`list`
+
         """
-        return self.bound_routing_map.build(endpoint, values,
-                                            method=_method,
-                                            force_external=_external)
+        cache = self.app.url_cache
+        build = self.bound_routing_map.build
+        prefix = self._url_cache_prefix, endpoint, _method, _external
+        urls = []
+        append = urls.append
+        for values in values_list:
+            try:
+                key = prefix + (make_values_key(values),)
+                url = cache.get(key)
+            except TypeError:
+                url = key = None
+            if url is None:
+                url = build(endpoint, values, method=_method,
+                            force_external=_external)
+                if key is not None:
+                    cache.set(key, url)
+            append(url)
+        return urls
+
+    @cached_property
+    def _url_cache_prefix(self):
+        # Built urls depend on the scheme, host and script root as well.
+        return self.environ.get('wsgi.url_scheme'), self.host, self.script_root
 
     @cached_property
     def session(self):
@@ -72,6 +135,10 @@ class Request(BaseRequest):
         If this value has changed in view functions the state will be
         kept in future requests of the same session as well.
 
+        It's loaded from the :attr:`~plastic.app.BaseApp.session_store`
+        when it's accessed for the first time.  Requests that never
+        access it don't touch the session store at all.
+
         """
         app = self.app
         sid = self.cookies.get(app.session_cookie['key'])
@@ -81,6 +148,22 @@ class Request(BaseRequest):
         return store.new()
 
 
+def make_values_key(values):
+    """Makes the hashable cache key of url parameter ``values``.
+    Types of values are the part of the key, since equal values of
+    different types e.g. ``1``, ``1.0`` and ``True`` build different urls.
+
+    :param values: the url parameter values
+    :type values: :class:`collections.Mapping`
+    :returns: the cache key
+    :rtype: :class:`frozenset`
+    :raises TypeError: when any of ``values`` is unhashable
+
+    """
+    return frozenset((name, type(value), value)
+                     for name, value in values.iteritems())
+
+
 class Response(BaseResponse):
     """The richier subclass of :class:`werkzeug.wrappers.Response`."""
 
@@ -0,0 +1,284 @@
+""":mod:`plastic.profiling` --- Startup profiling
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+This module instruments phases of making application classes and
+instances e.g. :meth:`BaseApp.clone() <plastic.app.BaseApp.clone>`,
+routing map compilation, importing the session store, loading
+configuration files, so that you can find what makes an application
+slow to boot::
+
+    from plastic.profiling import enable_startup_profiling
+
+    profiler = enable_startup_profiling()
+    import myapp
+    app = myapp.App()
+    print profiler.format_table()
+
+It also can be enabled by setting :envvar:`PLASTIC_STARTUP_PROFILE`
+environment variable to the path of the report file.  The report is
+written in JSON if the path ends with :file:`.json`, or in a plain text
+table otherwise.  ``-`` means the standard error.  It's written when
+the interpreter exits::
+
+    $ export PLASTIC_STARTUP_PROFILE=startup.json
+    $ python -c 'import myapp; myapp.App()'
+
+It costs nothing but a function call for each phase when it's disabled.
+
+"""
+import atexit
+import gc
+import json
+import os
+import sys
+import threading
+import time
+
+__all__ = ('StartupProfiler', 'disable_startup_profiling',
+           'enable_startup_profiling', 'get_startup_profiler',
+           'startup_phase')
+
+
+#: (:class:`StartupProfiler`) The enabled profiler.  ``None`` if it's
+#: disabled.
+startup_profiler = None
+
+
+class StartupProfiler(object):
+    """Records wall time and allocations of each phase.  Phases can be
+    nested.
+
+    :param track_allocations: whether to count objects allocated during
+                              each phase.  it's somewhat expensive for
+                              big heaps.  default is ``True``
+    :type track_allocations: :class:`bool`
+
+    """
+
+    def __init__(self, track_allocations=True):
+        self.track_allocations = track_allocations
+        #: (:class:`list`) The list of records in the order of beginning.
+        #: Each record is a :class:`dict` which has ``'phase'``,
+        #: ``'label'``, ``'depth'``, ``'seconds'`` and ``'allocations'``.
+        self.records = []
+        self.local = threading.local()
+
+    def phase(self, phase, label=None):
+        """Makes the context manager which records the time and
+        allocations of its block::
+
+            with profiler.phase('load_config', label='prod.cfg'):
+                config.update_from_file('prod.cfg')
+
+        :param phase: the name of the phase e.g. ``'compile_routing'``
+        :type phase: :class:`basestring`
+        :param label: the optional label which tells what it's for
+                      e.g. the application class name
+        :type label: :class:`basestring`
+        :returns: the context manager
+
+        """
+        return StartupPhase(self, phase, label)
+
+    def count_objects(self):
+        """Counts objects tracked by the garbage collector.
+        It returns 0 if :attr:`track_allocations` is ``False``.
+
+        :returns: the number of objects
+        :rtype: :class:`numbers.Integral`
+
+        """
+        if not self.track_allocations:
+            return 0
+        return len(gc.get_objects())
+
+    def report(self):
+        """Makes the structured report.
+
+        :returns: the report mapping which has ``'phases'`` (the list of
+                  :attr:`records`) and ``'total_seconds'`` (the sum of
+                  top-level phases' seconds)
+        :rtype: :class:`dict`
+
+        """
+        records = [dict(record) for record in self.records]
+        total = sum(r['seconds'] or 0 for r in records if r['depth'] == 0)
+        return {'phases': records, 'total_seconds': total}
+
+    def to_json(self):
+        """Serializes the :meth:`report()` into JSON.
+
+        :returns: the JSON string
+        :rtype: :class:`str`
+
+        """
+        return json.dumps(self.report(), indent=2, sort_keys=True)
+
+    def format_table(self):
+        """Formats the :meth:`report()` into a human-readable table.
+        Nested phases are indented.
+
+        :returns: the formatted table
+        :rtype: :class:`str`
+
+        """
+        report = self.report()
+        rows = [('phase', 'label', 'ms', 'allocations')]
+        for record in report['phases']:
+            rows.append((
+                '  ' * record['depth'] + record['phase'],
+                record['label'] or '',
+                '{0:.3f}'.format(record['seconds'] * 1000),
+                str(record['allocations'])
+            ))
+        rows.append(('total', '',
+                     '{0:.3f}'.format(report['total_seconds'] * 1000), ''))
+        widths = [max(len(row[i]) for row in rows) for i in xrange(4)]
+        lines = []
+        for i, row in enumerate(rows):
+            lines.append('  '.join([row[0].ljust(widths[0]),
+                                    row[1].ljust(widths[1]),
+                                    row[2].rjust(widths[2]),
+                                    row[3].rjust(widths[3])]).rstrip())
+            if i == 0 or i == len(rows) - 2:
+                lines.append('  '.join('-' * width for width in widths))
+        return '\n'.join(lines)
+
+    def dump(self, file_, format='json'):
+        """Writes the report to the ``file_``.
+
+        :param file_: the writable file object
+        :param format: ``'json'`` or ``'table'``.  default is ``'json'``
+        :type format: :class:`basestring`
+
+        """
+        if format == 'json':
+            file_.write(self.to_json())
+        elif format == 'table':
+            file_.write(self.format_table())
+        else:
+            raise ValueError('format must be json or table, not ' +
+                             repr(format))
+        file_.write('\n')
+
+
+class StartupPhase(object):
+    """The context manager made by :meth:`StartupProfiler.phase()`."""
+
+    __slots__ = 'profiler', 'phase', 'label', 'record', 'started', 'objects'
+
+    def __init__(self, profiler, phase, label=None):
+        self.profiler = profiler
+        self.phase = phase
+        self.label = label
+
+    def __enter__(self):
+        profiler = self.profiler
+        local = profiler.local
+        depth = getattr(local, 'depth', 0)
+        local.depth = depth + 1
+        self.record = {'phase': self.phase, 'label': self.label,
+                       'depth': depth, 'seconds': None, 'allocations': None}
+        profiler.records.append(self.record)
+        self.objects = profiler.count_objects()
+        self.started = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        elapsed = time.time() - self.started
+        profiler = self.profiler
+        self.record['seconds'] = elapsed
+        self.record['allocations'] = profiler.count_objects() - self.objects
+        profiler.local.depth -= 1
+
+
+class NullPhase(object):
+    """The context manager that does nothing, used when the profiling
+    is disabled.
+
+    """
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+
+null_phase = NullPhase()
+
+
+def startup_phase(phase, label=None):
+    """Makes the context manager which records the ``phase`` to
+    the enabled profiler.  If the profiling is disabled it does nothing.
+
+    :param phase: the name of the phase e.g. ``'compile_routing'``
+    :type phase: :class:`basestring`
+    :param label: the optional label which tells what it's for
+                  e.g. the application class name
+    :type label: :class:`basestring`
+    :returns: the context manager
+
+    """
+    if startup_profiler is None:
+        return null_phase
+    return startup_profiler.phase(phase, label)
+
+
+def enable_startup_profiling(track_allocations=True):
+    """Enables the startup profiling.  If it's already enabled
+    it returns the enabled profiler.
+
+    :param track_allocations: whether to count allocated objects.
+                              default is ``True``
+    :type track_allocations: :class:`bool`
+    :returns: the enabled profiler
+    :rtype: :class:`StartupProfiler`
+
+    """
+    global startup_profiler
+    if startup_profiler is None:
+        startup_profiler = StartupProfiler(track_allocations)
+    return startup_profiler
+
+
+def disable_startup_profiling():
+    """Disables the startup profiling.
+
+    :returns: the profiler that was enabled, or ``None``
+    :rtype: :class:`StartupProfiler`
+
+    """
+    global startup_profiler
+    profiler = startup_profiler
+    startup_profiler = None
+    return profiler
+
+
+def get_startup_profiler():
+    """Gets the enabled profiler.
+
+    :returns: the enabled profiler, or ``None`` if it's disabled
+    :rtype: :class:`StartupProfiler`
+
+    """
+    return startup_profiler
+
+
+def dump_on_exit(path):
+    profiler = get_startup_profiler()
+    if profiler is None:
+        return
+    format = 'json' if path.endswith('.json') else 'table'
+    if path == '-':
+        profiler.dump(sys.stderr, format)
+    else:
+        with open(path, 'w') as f:
+            profiler.dump(f, format)
+
+
+if os.environ.get('PLASTIC_STARTUP_PROFILE'):
+    enable_startup_profiling()
+    atexit.register(dump_on_exit, os.environ['PLASTIC_STARTUP_PROFILE'])
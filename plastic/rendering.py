@@ -16,13 +16,41 @@ Serializers
    It's for making responses that have structural data like JSON.
    A typical case of use this is providing RESTful API to clients.
 
+.. _conditional-rendering:
+
+Conditional rendering
+---------------------
+
+:func:`render()` and :func:`render_template()` can set
+the :mailheader:`ETag` header and respond ``304 Not Modified`` when
+the request's :mailheader:`If-None-Match` header matches, by passing
+``_etag`` argument.  If it's ``True`` the strong entity tag is computed
+from the rendered body, which saves bandwidth::
+
+    return render(request, feed, 'feed', _etag=True)
+
+Or you can pass the cheap version key of the resource, e.g. the last
+modified time or the revision number.  The entity tag is made from the
+key and the negotiated mimetype, and then the body isn't even rendered
+if the client has the same version::
+
+    return render(request, feed, 'feed', _etag=feed.revision)
+
+Streamed bodies cannot be hashed, so they need version keys to be
+conditional.
+
 """
+import functools
+import hashlib
+import time
+
 from werkzeug.exceptions import NotAcceptable
 
+from .compression import ENCODERS
 from .message import Request, Response
 
 
-def render_template(request, path, values={}, **keywords):
+def render_template(request, path, values={}, _etag=None, **keywords):
     """Helper function that renders a template of the given ``path``
     with ``values`` (and ``keywords``).  It's a shortcut of
     :meth:`BaseApp.render_template() <plastic.app.BaseApp.render_template>`
@@ -57,10 +85,15 @@ def render_template(request, path, values={}, **keywords):
     :type path: :class:`basestring`
     :param values: a dictionary of values to pass to template
     :type values: :class:`collections.Mapping`
+    :param _etag: makes the response conditional if it's present.
+                  see also :ref:`conditional-rendering`
     :param \*\*keywords: the same to ``values`` except these are passed
                          by keywords
-    :returns: a rendered result
-    :rtype: :class:`basestring`
+    :returns: a rendered result.  it may be an iterable of strings
+              if the template engine streams its result.  if ``_etag``
+              is present it's a :class:`~plastic.message.Response`
+    :rtype: :class:`basestring`, :class:`collections.Iterable`,
+            :class:`~plastic.message.Response`
     :raises plastic.exceptions.RenderError:
        when there are no matched template files
 
@@ -74,10 +107,18 @@ def render_template(request, path, values={}, **keywords):
     if not isinstance(request, Request):
         raise TypeError('request must be an instance of plastic.message.'
                         'Request, not ' + repr(request))
-    return request.app.render_template(request, path, values, **keywords)
+    if _etag is None:
+        return request.app.render_template(request, path, values, **keywords)
+    elif _etag is not True:
+        _etag = make_version_etag(_etag, path)
+        matched = is_not_modified(request, _etag)
+        if matched:
+            return make_not_modified(_etag, matched)
+    rendered = request.app.render_template(request, path, values, **keywords)
+    return make_conditional(request, Response(rendered), _etag)
 
 
-def render(request, value, path, values={}, **keywords):
+def render(request, value, path, values={}, _etag=None, **keywords):
     """Renders the suitable response using content negotiation.
     It's aware of given ``request``'s :mailheader:`Accept` header.
 
@@ -96,6 +137,11 @@ def render(request, value, path, values={}, **keywords):
     :func:`render_template()` function with the same arguments
     except ``value``.
 
+    If the template engine or the serializer returns an iterable of
+    strings (e.g. a generator) instead of a string, the response body
+    is streamed: it's not buffered into memory and sent to the client
+    chunk by chunk as it's rendered.
+
     :param request: a request which make it to render
     :type request: :class:`~plastic.message.Request`
     :param value: a value to serialize
@@ -104,6 +150,8 @@ def render(request, value, path, values={}, **keywords):
     :type path: :class:`basestring`
     :param values: a dictionary of values to pass to template
     :type values: :class:`collections.Mapping`
+    :param _etag: makes the response conditional if it's present.
+                  see also :ref:`conditional-rendering`
     :param \*\*keywords: the same to ``values`` except these are passed
                          by keywords
     :returns: a rendered response
@@ -119,17 +167,111 @@ def render(request, value, path, values={}, **keywords):
         raise TypeError('request must be an instance of plastic.message.'
                         'Request, not ' + repr(request))
     rendering_mapping = request.app.mimetype_mapping
-    mimetype = request.accept_mimetypes.best_match(rendering_mapping)
+    mimetype = request.app.negotiate_mimetype(request)
     if not mimetype:
         raise NotAcceptable()
+    if _etag is not None and _etag is not True:
+        _etag = make_version_etag(_etag, mimetype)
+        matched = is_not_modified(request, _etag)
+        if matched:
+            return make_not_modified(_etag, matched)
     rendering_method = rendering_mapping[mimetype]
     if isinstance(rendering_method, basestring):
         template_path = '{0}.{1}'.format(path, rendering_method)
         rendered = render_template(request, template_path, values, **keywords)
     elif callable(rendering_method):
-        rendered = rendering_method(request, value)
+        app = request.app
+        if mimetype in app.blocking_renderers:
+            serialize = functools.partial(app.run_blocking, rendering_method)
+        else:
+            serialize = rendering_method
+        if app.instruments:
+            started = time.time()
+            try:
+                rendered = serialize(request, value)
+            finally:
+                app.record_stage('render', request.endpoint,
+                                 time.time() - started)
+        else:
+            rendered = serialize(request, value)
     else:
         raise TypeError('every value of rendering_mapping has to be callable '
                         'or a suffix string; but rendering_mapping[{0!r}] is '
                         '{1!r}'.format(mimetype, rendering_method))
-    return Response(rendered, headers={'Vary': 'Accept'}, mimetype=mimetype)
+    response = Response(rendered, headers={'Vary': 'Accept'},
+                        mimetype=mimetype)
+    if _etag is None:
+        return response
+    return make_conditional(request, response, _etag)
+
+
+def make_version_etag(version, variant):
+    """Makes the strong entity tag from the caller-supplied ``version``
+    key of the resource and the ``variant`` of its representation e.g.
+    the mimetype.
+
+    :param version: the version key of the resource
+    :param variant: the representation variant
+    :type variant: :class:`basestring`
+    :returns: the unquoted entity tag
+    :rtype: :class:`str`
+
+    """
+    if isinstance(version, unicode):
+        version = version.encode('utf-8')
+    elif not isinstance(version, str):
+        version = repr(version)
+    if isinstance(variant, unicode):
+        variant = variant.encode('utf-8')
+    return hashlib.sha1(version + '\0' + variant).hexdigest()
+
+
+def is_not_modified(request, etag):
+    """Determines whether the ``request``'s :mailheader:`If-None-Match`
+    matches to the ``etag``.  Entity tags of compressed representations
+    (see :mod:`plastic.compression`) also match.
+
+    :param request: the request to check
+    :type request: :class:`~plastic.message.Request`
+    :param etag: the unquoted entity tag
+    :type etag: :class:`str`
+    :returns: the matched entity tag e.g. ``etag + '-gzip'`` if
+              the client has the same representation, or ``None``
+    :rtype: :class:`str`
+
+    """
+    if request.method not in ('GET', 'HEAD'):
+        return None
+    if_none_match = request.if_none_match
+    if not if_none_match:
+        return None
+    if if_none_match.contains(etag):
+        return etag
+    for encoding in ENCODERS:
+        if if_none_match.contains(etag + '-' + encoding):
+            return etag + '-' + encoding
+    return None
+
+
+def make_not_modified(etag, matched=None):
+    # The 304 response has to carry the entity tag of the representation
+    # the client revalidated, which can be of a compressed one.
+    response = Response(status=304, headers={'Vary': 'Accept'})
+    if matched is not None and matched != etag:
+        response.vary.add('Accept-Encoding')
+        etag = matched
+    response.set_etag(etag)
+    del response.headers['Content-Type']
+    return response
+
+
+def make_conditional(request, response, etag):
+    if etag is True:
+        if not response.is_sequence:  # streamed bodies cannot be hashed
+            return response
+        etag = hashlib.sha1(response.get_data()).hexdigest()
+    matched = is_not_modified(request, etag)
+    if matched:
+        return make_not_modified(etag, matched)
+    response.set_etag(etag)
+    return response
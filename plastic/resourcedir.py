@@ -3,21 +3,76 @@
 
 """
 import collections
+import mmap
+import os
+import stat
 
-from pkg_resources import (resource_exists, resource_isdir, resource_listdir,
-                           resource_stream)
+from pkg_resources import (DefaultProvider, get_provider, resource_exists,
+                           resource_isdir, resource_listdir, resource_stream)
+from werkzeug.wsgi import wrap_file
+
+__all__ = 'Resource', 'ResourceDirectory', 'ResourceIndex', 'ResourceInfo'
 
 
 class ResourceDirectory(collections.Mapping):
-    """Mapping interface of package resources."""
+    """Mapping interface of package resources.
 
-    def __init__(self, package, directory=''):
+    By default every operation asks :mod:`pkg_resources`, so it always
+    reflects the current state of resources.  If ``snapshot`` is
+    ``True`` it instead walks the whole directory once when it's first
+    used, and then :keyword:`in` operator, :func:`len()`, iteration
+    and subdirectory lookups are served by the in-memory
+    :attr:`index`.  Subdirectories share the index of their parent.
+    Call :meth:`revalidate()` to reflect changes made after that.
+
+    :param package: the package which contains resources
+    :type package: :class:`basestring`
+    :param directory: the path of the directory in the ``package``
+    :type directory: :class:`basestring`
+    :param snapshot: whether to use the snapshot :attr:`index`.
+                     default is ``False``
+    :type snapshot: :class:`bool`
+
+    """
+
+    def __init__(self, package, directory='', snapshot=False):
         self.package = package
         if directory and not directory.endswith('/'):
             directory += '/'
         self.directory = directory
+        self.snapshot = snapshot
+        self._index = None
+
+    @property
+    def index(self):
+        """(:class:`ResourceIndex`) The snapshot index.  It's built
+        when it's first accessed.  ``None`` if :attr:`snapshot` is
+        ``False``.
+
+        """
+        if not self.snapshot:
+            return None
+        if self._index is None:
+            self._index = ResourceIndex(self.package, self.directory)
+        return self._index
+
+    def revalidate(self):
+        """Checks whether the directory has changed since
+        the :attr:`index` was built, and rebuilds it if it has.
+        See :meth:`ResourceIndex.revalidate()`.  It does nothing if
+        :attr:`snapshot` is ``False``.
+
+        :returns: ``True`` if the index was rebuilt
+        :rtype: :class:`bool`
+
+        """
+        if self.snapshot:
+            return self.index.revalidate()
+        return False
 
     def __iter__(self):
+        if self.snapshot:
+            return self.index.walk(self._key(''))
         def iterate(path):
             for name in resource_listdir(self.package, self.directory + path):
                 yield name
@@ -28,42 +83,337 @@ class ResourceDirectory(collections.Mapping):
         return iterate('')
 
     def __contains__(self, name):
+        if self.snapshot:
+            return self._key(name) in self.index.entries
         subname = self.directory + name
         return (resource_exists(self.package, subname) or
                 resource_isdir(self.package, subname))
 
     def __getitem__(self, name):
         subname = self.directory + name
+        if self.snapshot:
+            info = self.index.entries.get(self._key(name))
+            if info is None:
+                raise KeyError(name)
+            elif info.is_dir:
+                directory = type(self)(self.package, subname, snapshot=True)
+                directory._index = self.index
+                return directory
+            return self._open(name)
         if resource_isdir(self.package, subname):
             return type(self)(self.package, subname)
         elif resource_exists(self.package, subname):
-            file_ = resource_stream(self.package, subname)
-            return Resource(file_)
+            return self._open(name)
         raise KeyError(name)
 
+    def _open(self, name):
+        filename = self.get_filename(name)
+        if filename is None:
+            file_ = resource_stream(self.package, self.directory + name)
+        else:
+            file_ = open(filename, 'rb')
+        return Resource(file_, filename)
+
     def __len__(self):
+        if self.snapshot:
+            return self.index.counts.get(self._key(''), 0)
         i = 0
         for _ in self:
             i += 1
         return i
 
+    def _key(self, name):
+        return (self.directory + name).rstrip('/')
+
+    def get_info(self, name):
+        """Gets the :class:`ResourceInfo` of the resource ``name``.
+        If :attr:`snapshot` is ``True`` it's looked up from
+        the :attr:`index`.
+
+        :param name: the name of the resource
+        :type name: :class:`basestring`
+        :returns: the information of the resource
+        :rtype: :class:`ResourceInfo`
+        :raises KeyError: when there's no such resource
+
+        """
+        if self.snapshot:
+            try:
+                return self.index.entries[self._key(name)]
+            except KeyError:
+                raise KeyError(name)
+        elif name not in self:
+            raise KeyError(name)
+        filename = self.get_filename(name)
+        if filename is None:
+            is_dir = resource_isdir(self.package, self.directory + name)
+            return ResourceInfo(self._key(name), is_dir, None, None)
+        return ResourceInfo.from_stat(self._key(name), os.stat(filename))
+
+    def get_filename(self, name=''):
+        """Finds the real filesystem path of the resource ``name``.
+        It doesn't check whether the resource exists or not.
+
+        :param name: the name of the resource.  the directory itself
+                     by default
+        :type name: :class:`basestring`
+        :returns: the filesystem path, or ``None`` if the package is
+                  not placed on the filesystem e.g. zipped eggs
+        :rtype: :class:`basestring`
+
+        """
+        provider = get_provider(self.package)
+        if not isinstance(provider, DefaultProvider):
+            return None
+        return provider.get_resource_filename(None, self.directory + name)
+
+
+class ResourceInfo(collections.namedtuple('ResourceInfo',
+                                          'path is_dir size mtime')):
+    """The information of a resource.  ``path`` is the resource path
+    in the package without trailing slash, and ``size`` and ``mtime``
+    are ``None`` if the package is not placed on the filesystem.
+
+    """
+
+    @classmethod
+    def from_stat(cls, path, stat_result):
+        """Makes the information from the result of :func:`os.stat()`.
+
+        :param path: the resource path
+        :type path: :class:`basestring`
+        :param stat_result: the result of :func:`os.stat()`
+        :returns: the information of the resource
+        :rtype: :class:`ResourceInfo`
+
+        """
+        is_dir = stat.S_ISDIR(stat_result.st_mode)
+        return cls(path, is_dir, None if is_dir else stat_result.st_size,
+                   stat_result.st_mtime)
+
+
+class ResourceIndex(object):
+    """The in-memory tree index of a resource directory, used by
+    :class:`ResourceDirectory` of the snapshot mode.  It's built by
+    walking the directory once: on the filesystem it takes a
+    :func:`os.listdir()` call for each directory and a :func:`os.stat()`
+    call for each entry.
+
+    :param package: the package which contains resources
+    :type package: :class:`basestring`
+    :param directory: the path of the root directory in the ``package``
+    :type directory: :class:`basestring`
+
+    """
+
+    def __init__(self, package, directory=''):
+        self.package = package
+        self.root = directory.rstrip('/')
+        self.build()
+
+    def build(self):
+        """(Re)builds the index by walking the directory."""
+        provider = get_provider(self.package)
+        if isinstance(provider, DefaultProvider):
+            base = provider.get_resource_filename(None, self.root)
+        else:
+            base = None
+        entries = {}
+        children = {}
+        counts = {}
+        def walk(path, filename):
+            prefix = path + '/' if path else ''
+            if filename is None:
+                names = resource_listdir(self.package, path)
+            else:
+                names = os.listdir(filename)
+            names.sort()
+            children[path] = names
+            count = 0
+            for name in names:
+                subpath = prefix + name
+                if filename is None:
+                    is_dir = resource_isdir(self.package, subpath)
+                    info = ResourceInfo(subpath, is_dir, None, None)
+                    subfilename = None
+                else:
+                    subfilename = os.path.join(filename, name)
+                    try:
+                        stat_result = os.stat(subfilename)
+                    except OSError:  # removed while walking
+                        continue
+                    info = ResourceInfo.from_stat(subpath, stat_result)
+                entries[subpath] = info
+                count += 1
+                if info.is_dir:
+                    count += walk(subpath, subfilename)
+            counts[path] = count
+            return count
+        if base is None:
+            if resource_isdir(self.package, self.root):
+                walk(self.root, None)
+                entries[self.root] = ResourceInfo(self.root, True, None, None)
+        elif os.path.isdir(base):
+            root_info = ResourceInfo.from_stat(self.root, os.stat(base))
+            walk(self.root, base)
+            entries[self.root] = root_info
+        #: (:class:`dict`) The mapping of resource paths to
+        #: :class:`ResourceInfo` objects.
+        self.entries = entries
+        #: (:class:`dict`) The mapping of directory paths to sorted lists
+        #: of their entry names.
+        self.children = children
+        #: (:class:`dict`) The mapping of directory paths to the number of
+        #: all entries under them.
+        self.counts = counts
+        self.filename = base
+
+    def walk(self, path):
+        """Generates all entry names under the directory ``path``,
+        relative to it.
+
+        :param path: the directory path without trailing slash
+        :type path: :class:`basestring`
+        :returns: relative names of entries
+        :rtype: :class:`collections.Iterator`
+
+        """
+        prefix = path + '/' if path else ''
+        for name in self.children.get(path, ()):
+            yield name
+            if self.entries[prefix + name].is_dir:
+                for subname in self.walk(prefix + name):
+                    yield name + '/' + subname
+
+    def revalidate(self):
+        """Checks the modification times of the indexed directories
+        (not files), and rebuilds the index if any of them changed.
+        Since adding, removing or renaming an entry changes
+        the modification time of its directory, it catches every change
+        of the tree structure with one :func:`os.stat()` call for each
+        directory.  It never rebuilds if the package is not placed on
+        the filesystem.
+
+        :returns: ``True`` if the index was rebuilt
+        :rtype: :class:`bool`
+
+        """
+        if self.filename is None:
+            return False
+        elif self.root not in self.entries:
+            if os.path.isdir(self.filename):
+                self.build()
+                return True
+            return False
+        provider = get_provider(self.package)
+        for path in self.children:
+            info = self.entries[path]
+            try:
+                mtime = os.stat(provider.get_resource_filename(None, path)) \
+                          .st_mtime
+            except OSError:
+                mtime = None
+            if mtime != info.mtime:
+                self.build()
+                return True
+        return False
+
 
 class Resource(object):
     """Readable file object provided by :class:`ResourceDirectory` mapping
     objects.  You can treat this simply as file object.  It also is a
     context manager, so you can use it using :keyword:`with`.
 
+    Besides reading, the content can be accessed without copying it into
+    a new string by :meth:`map()`, and can be handed to the WSGI server
+    as a response body by :meth:`wrap()`.
+
     :param file_: file to wrap
+    :param filename: the filesystem path of the file if it's a real file
+    :type filename: :class:`basestring`
 
     """
 
-    def __init__(self, file_):
+    def __init__(self, file_, filename=None):
         self.file_ = file_
+        #: (:class:`basestring`) The filesystem path of the file.
+        #: ``None`` if it's not a real file e.g. a resource of zipped eggs.
+        self.filename = filename
+        self.mapping = None
 
     def read(self, *args, **kwargs):
         return self.file_.read(*args, **kwargs)
 
+    def readline(self, *args, **kwargs):
+        return self.file_.readline(*args, **kwargs)
+
+    def __iter__(self):
+        return iter(self.file_.readline, '')
+
+    def seek(self, *args, **kwargs):
+        return self.file_.seek(*args, **kwargs)
+
+    def tell(self):
+        return self.file_.tell()
+
+    def fileno(self):
+        return self.file_.fileno()
+
+    def map(self):
+        """Gets the read-only buffer of the whole content.  If it's
+        a real file it's memory-mapped using :mod:`mmap`, so the content
+        isn't copied and pages are shared with the OS page cache.
+        Otherwise the whole content is read into a string once.
+        The buffer is valid until the resource is closed.  ::
+
+            with template_directory['large.html'] as f:
+                buffer_ = f.map()
+                header = buffer_[:1024]
+
+        :returns: the read-only buffer
+        :rtype: :class:`buffer`
+
+        """
+        if self.mapping is None:
+            if self.filename is None:
+                if hasattr(self.file_, 'seek'):
+                    self.file_.seek(0)
+                self.mapping = self.file_.read()
+            else:
+                fileno = self.file_.fileno()
+                if os.fstat(fileno).st_size:
+                    self.mapping = mmap.mmap(fileno, 0,
+                                             access=mmap.ACCESS_READ)
+                else:
+                    self.mapping = ''  # empty files cannot be mapped
+        return buffer(self.mapping)
+
+    def wrap(self, environ, buffer_size=8192):
+        """Makes the iterable of the content to be a WSGI response body.
+        It uses the server's ``wsgi.file_wrapper`` if available, which
+        may send the file by :func:`os.sendfile()` without copying it
+        through Python.  The resource is closed when the response is
+        closed.  ::
+
+            resource = app.template_directory['large.html']
+            return Response(resource.wrap(request.environ),
+                            direct_passthrough=True)
+
+        :param environ: the WSGI environ of the request
+        :type environ: :class:`collections.Mapping`
+        :param buffer_size: the number of bytes of each chunk.
+                            default is 8192
+        :type buffer_size: :class:`numbers.Integral`
+        :returns: the iterable of chunks
+        :rtype: :class:`collections.Iterable`
+
+        """
+        return wrap_file(environ, self, buffer_size)
+
     def close(self):
+        if isinstance(self.mapping, mmap.mmap):
+            self.mapping.close()
+        self.mapping = None
         self.file_.close()
 
     def __enter__(self):
@@ -71,4 +421,3 @@ class Resource(object):
 
     def __exit__(self, type, value, traceback):
         self.close()
-
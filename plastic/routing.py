@@ -0,0 +1,390 @@
+""":mod:`plastic.routing` --- URL routing
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+This module provides routers that dispatch requests to endpoints
+using the :class:`werkzeug.routing.Map` made from
+:attr:`BaseApp.rules <plastic.app.BaseApp.rules>`.
+
+You can choose the router of an application class by overriding
+:attr:`BaseApp.router_class <plastic.app.BaseApp.router_class>`::
+
+    from plastic.routing import RadixTreeRouter
+
+    App = BaseApp.clone(router_class=RadixTreeRouter)
+
+"""
+import re
+import sys
+
+from werkzeug.routing import (PathConverter, ValidationError,
+                              parse_converter_args, parse_rule)
+
+__all__ = 'RadixTreeNode', 'RadixTreeRouter', 'Router'
+
+
+class Router(object):
+    """The default router.  Rules without any converters, which most
+    URLs are routed by, are matched by looking up the hash table of
+    HTTP methods and paths instead of trying every regular expression
+    of rules one by one.  Other rules are matched by
+    :meth:`werkzeug.routing.MapAdapter.match()`.
+
+    :param routing_map: the routing map to match
+    :type routing_map: :class:`werkzeug.routing.Map`
+
+    """
+
+    def __init__(self, routing_map):
+        self.routing_map = routing_map
+        self.static_rules = self.index_static_rules(routing_map)
+
+    @staticmethod
+    def index_static_rules(routing_map):
+        """Makes the hash table of paths to static rules of
+        the ``routing_map``.  Rules that require werkzeug's matching
+        e.g. rules having subdomains, hosts, defaults, redirects are
+        excluded.
+
+        :param routing_map: the routing map to index
+        :type routing_map: :class:`werkzeug.routing.Map`
+        :returns: the mapping of paths to sequences of pairs of
+                  allowed methods (``None`` means all methods) and
+                  endpoints.  pairs are in the order of matching
+        :rtype: :class:`collections.Mapping`
+
+        """
+        index = {}
+        if routing_map.host_matching:
+            return index
+        routing_map.update()
+        for rule in routing_map.iter_rules():
+            if (rule.arguments or rule.build_only or
+                rule.redirect_to is not None or rule.subdomain or
+                getattr(rule, 'websocket', False)):
+                continue
+            index.setdefault(rule.rule, []).append((rule.methods,
+                                                    rule.endpoint))
+        return index
+
+    def match(self, request):
+        """Matches the ``request`` to the endpoint.
+
+        :param request: the request to match
+        :type request: :class:`~plastic.message.Request`
+        :returns: a pair of the endpoint and the mapping of its
+                  parameter values
+        :rtype: :class:`tuple`
+        :raises werkzeug.exceptions.HTTPException:
+           when the request doesn't match to any rules, or
+           :exc:`werkzeug.routing.RequestRedirect` when it has to be
+           redirected
+
+        """
+        if request.environ.get('PATH_INFO'):
+            candidates = self.static_rules.get(request.path)
+            if candidates:
+                method = request.method
+                for methods, endpoint in candidates:
+                    if methods is None or method in methods:
+                        return endpoint, {}
+        return request.bound_routing_map.match()
+
+
+class RadixTreeRouter(Router):
+    """The router which compiles rules into a prefix tree of path
+    segments, so that the cost of dispatching is proportional to
+    the length of the path rather than the number of rules.  Segments
+    are matched by converters of rules e.g. ``<int:id>``.  If a path
+    matches more than one rule, the rule werkzeug tries first wins
+    i.e. the first one in the order of
+    :meth:`werkzeug.routing.Map.iter_rules()`, which sorts rules by
+    their weights and then by the order of registration.
+
+    Rules which cannot be represented in the tree e.g. rules having
+    defaults, subdomains, converters sharing a segment with static text
+    (``/<name>.json``) are matched by
+    :meth:`werkzeug.routing.MapAdapter.match()` instead, and so are all
+    paths starting with the static prefix of these rules (``/`` for
+    ``/<name>.json``) to keep werkzeug's precedence.  All failures to
+    match (including redirects and
+    :exc:`~werkzeug.exceptions.MethodNotAllowed`) fall back to werkzeug
+    as well.  So do paths which the tree matches but which also match
+    some rule if a slash is appended, since werkzeug redirects them to
+    the rule ending with a slash (``strict_slashes``).
+
+    :param routing_map: the routing map to match
+    :type routing_map: :class:`werkzeug.routing.Map`
+
+    """
+
+    def __init__(self, routing_map):
+        super(RadixTreeRouter, self).__init__(routing_map)
+        self.tree = RadixTreeNode()
+        fallback_prefixes = set()
+        if routing_map.host_matching:
+            fallback_prefixes.add('/')
+        else:
+            # Rules are already sorted in the order of matching by
+            # index_static_rules(), so indices keep werkzeug's precedence.
+            for index, rule in enumerate(routing_map.iter_rules()):
+                if rule.build_only:
+                    continue
+                segments = self.split_rule(routing_map, rule)
+                if segments is None:
+                    prefix = rule.rule.split('<', 1)[0]
+                    fallback_prefixes.add(prefix)
+                else:
+                    self.tree.insert(segments, rule.methods, rule.endpoint,
+                                     index)
+        #: (:class:`tuple`) The static prefixes of rules which aren't
+        #: in the :attr:`tree`.  Paths starting with these are matched
+        #: by werkzeug.
+        self.fallback_prefixes = tuple(fallback_prefixes)
+
+    @staticmethod
+    def split_rule(routing_map, rule):
+        """Splits the ``rule`` into segments.
+
+        :param routing_map: the routing map which has converters
+        :type routing_map: :class:`werkzeug.routing.Map`
+        :param rule: the rule to split
+        :type rule: :class:`werkzeug.routing.Rule`
+        :returns: the list of segments.  static segments are strings,
+                  and dynamic segments are pairs of the variable name
+                  and the converter.  ``None`` if the rule cannot be
+                  represented by segments
+        :rtype: :class:`list`
+
+        """
+        if (rule.defaults or rule.build_only or rule.subdomain or
+            rule.redirect_to is not None or getattr(rule, 'websocket', False)):
+            return None
+        segments = [[]]
+        for converter, arguments, variable in parse_rule(rule.rule):
+            if converter is None:
+                texts = variable.split('/')
+                if texts[0]:
+                    segments[-1].append(texts[0])
+                segments.extend([text] if text else [] for text in texts[1:])
+                continue
+            converter_class = routing_map.converters[converter]
+            if arguments:
+                args, kwargs = parse_converter_args(arguments)
+            else:
+                args, kwargs = (), {}
+            converter = converter_class(routing_map, *args, **kwargs)
+            segments[-1].append((variable, converter))
+        result = []
+        for i, parts in enumerate(segments):
+            if not parts:
+                result.append('')
+            elif len(parts) > 1:
+                return None
+            elif isinstance(parts[0], tuple):
+                if (isinstance(parts[0][1], PathConverter) and
+                    i < len(segments) - 1):
+                    return None
+                result.append(parts[0])
+            else:
+                result.append(parts[0])
+        return result
+
+    def match(self, request):
+        if request.environ.get('PATH_INFO'):
+            path = request.path
+            candidates = self.static_rules.get(path)
+            method = request.method
+            if candidates:
+                for methods, endpoint in candidates:
+                    if methods is None or method in methods:
+                        return endpoint, {}
+            if not path.startswith(self.fallback_prefixes):
+                values = {}
+                endpoint = self.tree.match(path.split('/'), 0, method,
+                                           values)
+                if endpoint is not None and (
+                        path.endswith('/') or
+                        not self.matches_with_slash(path)):
+                    return endpoint, values
+        return request.bound_routing_map.match()
+
+    def matches_with_slash(self, path):
+        """Determines whether the ``path`` with a trailing slash matches
+        to any rule regardless of methods.
+
+        :param path: the path without a trailing slash
+        :type path: :class:`basestring`
+        :returns: whether werkzeug would redirect the ``path``
+        :rtype: :class:`bool`
+
+        """
+        path += '/'
+        if path in self.static_rules:
+            return True
+        return self.tree.match(path.split('/'), 0, None, {}) is not None
+
+
+class RadixTreeNode(object):
+    """The node of :class:`RadixTreeRouter`'s tree.  Each node stands for
+    a path segment.
+
+    """
+
+    __slots__ = ('static_children', 'dynamic_children', 'path_rules', 'rules',
+                 'index')
+
+    def __init__(self):
+        #: (:class:`dict`) The children of static segments.
+        self.static_children = {}
+        #: (:class:`list`) The children of converters, in the order of
+        #: their :attr:`index`.  each child is a tuple of the variable
+        #: name, the converter, the compiled pattern and the node.
+        self.dynamic_children = []
+        #: (:class:`list`) The rules which end with path converters.
+        #: each rule is a tuple of the index, the variable name,
+        #: the converter, the compiled pattern, the methods and
+        #: the endpoint.
+        self.path_rules = []
+        #: (:class:`list`) The triples of indices, methods and endpoints
+        #: of rules which end at this node.
+        self.rules = []
+        #: (:class:`numbers.Integral`) The least index of rules under
+        #: this node.
+        self.index = None
+
+    def insert(self, segments, methods, endpoint, index, offset=0):
+        """Inserts the rule which consists of ``segments``.  Rules have
+        to be inserted in the order of their ``index``.
+
+        :param segments: the segments made by
+                         :meth:`RadixTreeRouter.split_rule()`
+        :type segments: :class:`collections.Sequence`
+        :param methods: the allowed methods, or ``None`` for every method
+        :type methods: :class:`collections.Set`
+        :param endpoint: the endpoint of the rule
+        :param index: the order of the rule to be tried.  if a path
+                      matches more than one rule, the least index wins
+        :type index: :class:`numbers.Integral`
+        :param offset: the index of the segment to insert.  default is 0
+        :type offset: :class:`numbers.Integral`
+
+        """
+        if self.index is None:
+            self.index = index
+        if offset == len(segments):
+            self.rules.append((index, methods, endpoint))
+            return
+        segment = segments[offset]
+        if isinstance(segment, basestring):
+            try:
+                child = self.static_children[segment]
+            except KeyError:
+                child = self.static_children[segment] = RadixTreeNode()
+            child.insert(segments, methods, endpoint, index, offset + 1)
+            return
+        variable, converter = segment
+        pattern = re.compile('(?:' + converter.regex + r')\Z', re.UNICODE)
+        if isinstance(converter, PathConverter):
+            self.path_rules.append((index, variable, converter, pattern,
+                                    methods, endpoint))
+            return
+        for name, conv, _, child in self.dynamic_children:
+            if (name == variable and type(conv) is type(converter) and
+                vars(conv) == vars(converter)):
+                break
+        else:
+            child = RadixTreeNode()
+            self.dynamic_children.append((variable, converter, pattern, child))
+        child.insert(segments, methods, endpoint, index, offset + 1)
+
+    def match(self, segments, offset, method, values):
+        """Finds the endpoint which matches to ``segments``.
+        Parameter values of the matched rule are filled in ``values``.
+
+        :param segments: the segments of the path to match
+        :type segments: :class:`collections.Sequence`
+        :param offset: the index of the segment to match
+        :type offset: :class:`numbers.Integral`
+        :param method: the request method.  ``None`` matches
+                       every method
+        :type method: :class:`basestring`
+        :param values: the mapping to fill parameter values
+        :type values: :class:`collections.MutableMapping`
+        :returns: the matched endpoint, or ``None``
+
+        """
+        found = self.search(segments, offset, method, {}, sys.maxsize)
+        if found is None:
+            return None
+        values.update(found[2])
+        return found[1]
+
+    def search(self, segments, offset, method, values, limit):
+        """Finds the rule of the least index under ``limit`` which
+        matches to ``segments``.  Subtrees which have no such rules
+        are skipped.
+
+        :param segments: the segments of the path to match
+        :type segments: :class:`collections.Sequence`
+        :param offset: the index of the segment to match
+        :type offset: :class:`numbers.Integral`
+        :param method: the request method.  ``None`` matches
+                       every method
+        :type method: :class:`basestring`
+        :param values: parameter values matched so far
+        :type values: :class:`collections.MutableMapping`
+        :param limit: rules of this index or greater are ignored
+        :type limit: :class:`numbers.Integral`
+        :returns: the triple of the index, the endpoint and
+                  the parameter values of the matched rule, or ``None``
+        :rtype: :class:`tuple`
+
+        """
+        if self.index is None or self.index >= limit:
+            return None
+        if offset == len(segments):
+            for index, methods, endpoint in self.rules:
+                if index >= limit:
+                    break
+                if methods is None or method is None or method in methods:
+                    return index, endpoint, dict(values)
+            return None
+        found = None
+        segment = segments[offset]
+        child = self.static_children.get(segment)
+        if child is not None:
+            found = child.search(segments, offset + 1, method, values, limit)
+            if found is not None:
+                limit = found[0]
+        for variable, converter, pattern, child in self.dynamic_children:
+            if child.index >= limit:
+                break
+            if not pattern.match(segment):
+                continue
+            try:
+                values[variable] = converter.to_python(segment)
+            except ValidationError:
+                continue
+            result = child.search(segments, offset + 1, method, values, limit)
+            del values[variable]
+            if result is not None:
+                found = result
+                limit = found[0]
+        if self.path_rules:
+            rest = '/'.join(segments[offset:])
+            for index, variable, converter, pattern, methods, endpoint \
+                    in self.path_rules:
+                if index >= limit:
+                    break
+                if (methods is not None and method is not None and
+                    method not in methods):
+                    continue
+                if pattern.match(rest):
+                    try:
+                        value = converter.to_python(rest)
+                    except ValidationError:
+                        continue
+                    result = dict(values)
+                    result[variable] = value
+                    return index, endpoint, result
+        return found
@@ -0,0 +1,345 @@
+""":mod:`plastic.server` --- Prefork server
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+This module provides the server which forks multiple worker processes
+sharing one listening socket, so that an application can use all
+cores without any external server.  In most cases you don't need to
+use it directly, but :meth:`BaseApp.run() <plastic.app.BaseApp.run>`
+method with ``workers`` option::
+
+    app = App()
+    app.run(host='0.0.0.0', port=8080, workers=4)
+
+The application is warmed up in the parent process before forking
+(see :meth:`BaseApp.warmup() <plastic.app.BaseApp.warmup>`), so workers
+share the routing map, the template index and compiled templates
+copy-on-write, and don't pay for them on their first requests.
+
+The parent process supervises workers:
+
+- Workers which exit unexpectedly (e.g. crashed) are restarted.
+  If they keep crashing soon after started, restarts are delayed
+  more and more (up to :attr:`PreforkServer.max_backoff` seconds).
+- :const:`~signal.SIGHUP` gracefully reloads: the application is
+  warmed up again with the current template files, and workers are
+  replaced by new ones while old ones finish requests they are
+  handling.  Note that Python modules are not reloaded; changes of
+  code need a restart.
+- :const:`~signal.SIGTERM` and :const:`~signal.SIGINT` gracefully stop
+  the server.  Workers which don't finish in ``graceful_timeout``
+  seconds are killed.
+
+It works only on POSIX systems since it depends on :func:`os.fork()`.
+
+"""
+import errno
+import logging
+import os
+import random
+import signal
+import socket
+import threading
+import time
+
+from werkzeug.serving import make_server, select_address_family
+
+__all__ = 'PreforkServer',
+
+
+class PreforkServer(object):
+    """The server which forks ``workers`` processes to serve the ``app``.
+
+    :param app: the application to serve
+    :type app: :class:`~plastic.app.BaseApp`
+    :param host: the hostname to listen.  default is ``'127.0.0.1'``
+    :type host: :class:`basestring`
+    :param port: the port number to listen.  if it's 0 an arbitrary
+                 free port is chosen.  default is 5555
+    :type port: :class:`numbers.Integral`
+    :param workers: the number of worker processes.  default is
+                    the number of CPUs
+    :type workers: :class:`numbers.Integral`
+    :param threaded: whether each worker handles requests in threads.
+                     default is ``False``
+    :type threaded: :class:`bool`
+    :param backlog: the size of the queue of pending connections.
+                    default is 128
+    :type backlog: :class:`numbers.Integral`
+    :param graceful_timeout: seconds to wait for workers to finish
+                             requests when stopping or reloading.
+                             default is 30
+    :type graceful_timeout: :class:`numbers.Real`
+    :param \*\*options: other options to be passed to
+                        :func:`werkzeug.serving.make_server()` function
+                        e.g. ``request_handler``, ``ssl_context``
+
+    """
+
+    #: (:class:`numbers.Real`) Seconds between checks of the parent
+    #: and workers.
+    poll_interval = 0.5
+
+    #: (:class:`numbers.Real`) Workers which exit in less seconds than
+    #: this after started are considered to fail on startup, and
+    #: restarting them is delayed.
+    min_uptime = 1.0
+
+    #: (:class:`numbers.Real`) The maximum seconds to delay restarting
+    #: workers which fail on startup.
+    max_backoff = 30.0
+
+    def __init__(self, app, host='127.0.0.1', port=5555, workers=None,
+                 threaded=False, backlog=128, graceful_timeout=30,
+                 **options):
+        if workers is None:
+            try:
+                import multiprocessing
+                workers = multiprocessing.cpu_count()
+            except (ImportError, NotImplementedError):
+                workers = 1
+        if workers < 1:
+            raise ValueError('workers must be greater than 0, not ' +
+                             repr(workers))
+        self.app = app
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.threaded = threaded
+        self.backlog = backlog
+        self.graceful_timeout = graceful_timeout
+        self.options = options
+        self.socket = None
+        #: (:class:`dict`) The mapping of pids of worker processes to
+        #: their generations.  The generation increases on reload.
+        self.children = {}
+        self.started_at = {}
+        self.generation = 0
+        self.failures = 0
+        self.spawn_after = 0
+        self.running = False
+        self.reload_requested = False
+        self.logger = logging.getLogger(__name__ + '.' + type(self).__name__)
+
+    def listen(self):
+        """Binds the listening socket.  It's called by
+        :meth:`serve_forever()` if it hasn't been called yet.
+        Call it first to know the :attr:`port` when it's 0.
+
+        :returns: the listening socket
+        :rtype: :class:`socket.socket`
+
+        """
+        if self.socket is None:
+            family = select_address_family(self.host, self.port)
+            sock = socket.socket(family, socket.SOCK_STREAM)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            sock.bind((self.host, self.port))
+            sock.listen(self.backlog)
+            # Every worker polls the socket, and those which lose the race
+            # for a connection must not block on accept().
+            sock.setblocking(False)
+            self.port = sock.getsockname()[1]
+            self.socket = sock
+        return self.socket
+
+    def preload(self):
+        """Initializes the application's lazy states in the parent
+        process by :meth:`BaseApp.warmup() <plastic.app.BaseApp.warmup>`,
+        so that workers share them.  It's called before forking and
+        on reload.
+
+        """
+        app = self.app
+        app.template_directory.revalidate()
+        for step, seconds in app.warmup().iteritems():
+            self.logger.debug('warmup %s took %.3f seconds', step, seconds)
+
+    def serve_forever(self):
+        """Forks workers and supervises them until the server is
+        stopped by a signal or :meth:`stop()`.
+
+        """
+        self.listen()
+        self.preload()
+        self.running = True
+        handlers = {}
+        for signum, handler in [(signal.SIGTERM, self.stop),
+                                (signal.SIGINT, self.stop),
+                                (signal.SIGHUP, self.reload)]:
+            handlers[signum] = signal.signal(signum, handler)
+        self.logger.info('serving on http://%s:%d/ with %d workers',
+                         self.host, self.port, self.workers)
+        try:
+            while self.running:
+                self.reap_workers()
+                if self.reload_requested:
+                    self.reload_requested = False
+                    self.replace_workers()
+                self.spawn_workers()
+                time.sleep(self.poll_interval)
+        finally:
+            for signum, handler in handlers.iteritems():
+                signal.signal(signum, handler)
+            self.stop_workers(self.children)
+            self.socket.close()
+            self.socket = None
+
+    def stop(self, signum=None, frame=None):
+        """Requests the parent process to stop gracefully."""
+        self.running = False
+
+    def reload(self, signum=None, frame=None):
+        """Requests the parent process to reload gracefully."""
+        self.reload_requested = True
+
+    def spawn_workers(self):
+        """Forks workers until there are :attr:`workers` of
+        the current generation.
+
+        """
+        if time.time() < self.spawn_after:
+            return
+        current = sum(1 for g in self.children.itervalues()
+                      if g == self.generation)
+        for _ in xrange(self.workers - current):
+            pid = os.fork()
+            if pid == 0:
+                status = 1
+                try:
+                    self.run_worker()
+                    status = 0
+                except BaseException:
+                    self.logger.exception('worker %d failed', os.getpid())
+                finally:
+                    os._exit(status)
+            self.children[pid] = self.generation
+            self.started_at[pid] = time.time()
+
+    def reap_workers(self):
+        """Collects exited workers.  Unexpected exits are logged, and
+        these workers are replaced by :meth:`spawn_workers()`.  If they
+        exited in :attr:`min_uptime` seconds, replacing them is delayed
+        exponentially.
+
+        """
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except OSError as e:
+                if e.errno == errno.ECHILD:
+                    return
+                raise
+            if not pid:
+                return
+            generation = self.children.pop(pid, None)
+            started_at = self.started_at.pop(pid, None)
+            if generation != self.generation or not self.running:
+                continue
+            now = time.time()
+            if started_at is not None and now - started_at < self.min_uptime:
+                self.failures += 1
+                delay = min(self.max_backoff,
+                            self.poll_interval * 2 ** self.failures)
+                self.spawn_after = now + delay
+                self.logger.warning('worker %d failed on startup '
+                                    '(status %d); restarting in %.1f '
+                                    'seconds', pid, status, delay)
+            else:
+                self.failures = 0
+                self.logger.warning('worker %d exited unexpectedly '
+                                    '(status %d); restarting', pid, status)
+
+    def replace_workers(self):
+        """Preloads the application again, and replaces workers with
+        new ones.  Old workers are stopped gracefully in the background.
+
+        """
+        self.app.template_cache.clear()
+        self.preload()
+        old = dict(self.children)
+        self.generation += 1
+        self.spawn_workers()
+        for pid in old:
+            self._kill(pid, signal.SIGTERM)
+        self.logger.info('reloaded; %d old workers are stopping', len(old))
+
+    def stop_workers(self, pids):
+        """Stops workers of the ``pids`` gracefully, and kills them if
+        they don't finish in :attr:`graceful_timeout` seconds.
+
+        :param pids: the pids of workers to stop
+        :type pids: :class:`collections.Iterable`
+
+        """
+        pids = set(pids)
+        for pid in pids:
+            self._kill(pid, signal.SIGTERM)
+        deadline = time.time() + self.graceful_timeout
+        while pids and time.time() < deadline:
+            for pid in list(pids):
+                try:
+                    exited, _ = os.waitpid(pid, os.WNOHANG)
+                except OSError:
+                    exited = pid
+                if exited:
+                    pids.discard(pid)
+                    self.children.pop(pid, None)
+                    self.started_at.pop(pid, None)
+            if pids:
+                time.sleep(0.05)
+        for pid in pids:
+            self._kill(pid, signal.SIGKILL)
+            try:
+                os.waitpid(pid, 0)
+            except OSError:
+                pass
+            self.children.pop(pid, None)
+            self.started_at.pop(pid, None)
+
+    def run_worker(self):
+        """The main loop of worker processes.  It's called in forked
+        processes, and returns when the worker is stopped.
+
+        """
+        state = {'alive': True}
+        def stop(signum, frame):
+            state['alive'] = False
+        signal.signal(signal.SIGTERM, stop)
+        # The parent stops workers when it's interrupted by the terminal.
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        # Workers must not generate the same random numbers
+        # (e.g. session ids) as their siblings.
+        random.seed()
+        parent = os.getppid()
+        server = make_server(self.host, self.port, self.app,
+                             threaded=self.threaded,
+                             fd=self.socket.fileno(), **self.options)
+        server.multiprocess = True
+        server.timeout = self.poll_interval
+        # ThreadedWSGIServer makes daemon threads by default, but threads
+        # handling requests have to be joined to finish them gracefully.
+        server.daemon_threads = False
+        try:
+            while state['alive'] and os.getppid() == parent:
+                server.handle_request()
+        finally:
+            server.server_close()
+        deadline = time.time() + self.graceful_timeout
+        for thread in threading.enumerate():
+            if thread is not threading.current_thread() and \
+               not thread.daemon:
+                thread.join(max(0, deadline - time.time()))
+
+    def _kill(self, pid, signum):
+        try:
+            os.kill(pid, signum)
+        except OSError as e:
+            if e.errno != errno.ESRCH:
+                raise
+
+    def __repr__(self):
+        cls = type(self)
+        return '<{0}.{1} http://{2}:{3}/ {4} workers>'.format(
+            cls.__module__, cls.__name__, self.host, self.port, self.workers
+        )
@@ -0,0 +1,477 @@
+""":mod:`plastic.sessions` --- Session stores
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+This module provides session store implementations that can be used
+for ``'session_store'`` configuration of :class:`~plastic.app.BaseApp`
+(see :attr:`BaseApp.session_store <plastic.app.BaseApp.session_store>`)::
+
+    app = App({
+        'session_store': 'plastic.sessions:MemorySessionStore(ttl=3600)'
+    })
+
+The default is still :class:`werkzeug.contrib.sessions.FilesystemSessionStore`
+since sessions in it survive restarts of the process e.g. by the reloader.
+
+"""
+import atexit
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+from werkzeug.contrib.sessions import SessionStore
+from werkzeug.security import safe_str_cmp
+
+from .cache import LRUCache
+from .config import import_instance
+from .exceptions import SessionError
+
+__all__ = ('MemorySessionStore', 'SignedCookieSessionStore',
+           'SQLiteSessionStore', 'WriteBehindSessionStore')
+
+
+class MemorySessionStore(SessionStore):
+    """The process-local session store.  It's the fastest one, but
+    sessions aren't shared between processes and disappear when
+    the process ends.  Session data are pickled to be isolated from
+    mutations of unsaved sessions, as persistent stores do.
+
+    :param size: the maximum number of sessions to keep.  the least
+                 recently used sessions are discarded first.
+                 default is 10000
+    :type size: :class:`numbers.Integral`
+    :param ttl: the optional number of seconds to keep each session
+                after it's saved.  sessions don't expire by default
+    :type ttl: :class:`numbers.Real`
+    :param session_class: the session class to use.  default is
+                          :class:`werkzeug.contrib.sessions.Session`
+    :type session_class: :class:`type`
+
+    """
+
+    def __init__(self, size=10000, ttl=None, session_class=None):
+        super(MemorySessionStore, self).__init__(session_class)
+        self.sessions = LRUCache(size, ttl)
+
+    def save(self, session):
+        data = pickle.dumps(dict(session), pickle.HIGHEST_PROTOCOL)
+        self.sessions.set(session.sid, data)
+
+    def delete(self, session):
+        self.sessions.delete(session.sid)
+
+    def get(self, sid):
+        if not self.is_valid_key(sid):
+            return self.new()
+        data = self.sessions.get(sid)
+        if data is None:
+            return self.session_class({}, sid, True)
+        return self.session_class(pickle.loads(data), sid, False)
+
+
+class SQLiteSessionStore(SessionStore):
+    """The session store backed by a SQLite database file.  Unlike
+    :class:`MemorySessionStore` sessions are shared by multiple processes
+    (e.g. prefork workers) on the same host, and it doesn't create a file
+    for each session.
+
+    :param filename: the path of the database file.  it's created if
+                     it doesn't exist.  default is
+                     :file:`plastic_sessions.sqlite`
+    :type filename: :class:`basestring`
+    :param ttl: the optional number of seconds to keep each session
+                after it's saved.  sessions don't expire by default
+    :type ttl: :class:`numbers.Real`
+    :param session_class: the session class to use.  default is
+                          :class:`werkzeug.contrib.sessions.Session`
+    :type session_class: :class:`type`
+
+    """
+
+    def __init__(self, filename='plastic_sessions.sqlite', ttl=None,
+                 session_class=None):
+        super(SQLiteSessionStore, self).__init__(session_class)
+        self.filename = filename
+        self.ttl = ttl
+        self.local = threading.local()
+        connection = self.connection
+        with connection:
+            connection.execute('CREATE TABLE IF NOT EXISTS plastic_sessions '
+                               '(sid TEXT PRIMARY KEY, data BLOB NOT NULL, '
+                               'expires REAL)')
+
+    @property
+    def connection(self):
+        """(:class:`sqlite3.Connection`) The database connection of
+        the current thread.  Connections aren't shared between threads
+        nor forked processes.
+
+        """
+        local = self.local
+        pid = os.getpid()
+        if getattr(local, 'pid', None) != pid:
+            local.connection = sqlite3.connect(self.filename, timeout=30)
+            local.connection.execute('PRAGMA journal_mode=WAL')
+            local.connection.execute('PRAGMA synchronous=NORMAL')
+            local.pid = pid
+        return local.connection
+
+    def save(self, session):
+        data = pickle.dumps(dict(session), pickle.HIGHEST_PROTOCOL)
+        expires = None if self.ttl is None else time.time() + self.ttl
+        connection = self.connection
+        with connection:
+            connection.execute('INSERT OR REPLACE INTO plastic_sessions '
+                               '(sid, data, expires) VALUES (?, ?, ?)',
+                               (session.sid, sqlite3.Binary(data), expires))
+
+    def delete(self, session):
+        connection = self.connection
+        with connection:
+            connection.execute('DELETE FROM plastic_sessions WHERE sid = ?',
+                               (session.sid,))
+
+    def get(self, sid):
+        if not self.is_valid_key(sid):
+            return self.new()
+        cursor = self.connection.execute(
+            'SELECT data FROM plastic_sessions '
+            'WHERE sid = ? AND (expires IS NULL OR expires > ?)',
+            (sid, time.time())
+        )
+        row = cursor.fetchone()
+        if row is None:
+            return self.session_class({}, sid, True)
+        return self.session_class(pickle.loads(str(row[0])), sid, False)
+
+    def purge(self):
+        """Deletes expired sessions from the database.  Expired sessions
+        are never loaded anyway, so it's only for saving disk space.
+
+        :returns: the number of deleted sessions
+        :rtype: :class:`numbers.Integral`
+
+        """
+        connection = self.connection
+        with connection:
+            cursor = connection.execute(
+                'DELETE FROM plastic_sessions WHERE expires <= ?',
+                (time.time(),)
+            )
+        return cursor.rowcount
+
+
+class WriteBehindSessionStore(SessionStore):
+    """The wrapper of another session ``store`` which saves sessions
+    in the background instead of inline with responses.  Saved and
+    deleted sessions are queued and flushed to the wrapped ``store``
+    by a background thread in batches, every ``interval`` seconds or
+    as soon as ``batch_size`` sessions are queued.  Queued sessions
+    are read from the queue, so a client always sees its own writes
+    as long as it's served by the same process.
+
+    The wrapped ``store`` can be an import expression as well, so it
+    can be configured like::
+
+        app = App({
+            'session_store': 'plastic.sessions:WriteBehindSessionStore('
+                             '"plastic.sessions:SQLiteSessionStore", 0.5)'
+        })
+
+    .. note::
+
+       Queued sessions are lost if the process is killed before they
+       are flushed.  They are flushed when the interpreter exits normally.
+
+    :param store: the session store to write sessions to.
+                  it can be an import expression
+    :type store: :class:`werkzeug.contrib.sessions.SessionStore`,
+                 :class:`basestring`
+    :param interval: the maximum seconds to delay writes.  default is 1
+    :type interval: :class:`numbers.Real`
+    :param batch_size: the number of queued sessions that triggers
+                       flushing before ``interval``.  default is 100
+    :type batch_size: :class:`numbers.Integral`
+
+    """
+
+    def __init__(self, store, interval=1.0, batch_size=100):
+        self.store = import_instance(store, SessionStore)
+        super(WriteBehindSessionStore, self).__init__(
+            self.store.session_class
+        )
+        self.interval = interval
+        self.batch_size = batch_size
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.pending = {}
+        self.flushing = {}
+        self.worker_pid = None
+        atexit.register(self.flush)
+
+    def save(self, session):
+        with self.lock:
+            self.pending[session.sid] = pickle.dumps(dict(session),
+                                                     pickle.HIGHEST_PROTOCOL)
+            size = len(self.pending)
+        self._ensure_worker()
+        if size >= self.batch_size:
+            self.wakeup.set()
+
+    def delete(self, session):
+        with self.lock:
+            self.pending[session.sid] = None
+        self._ensure_worker()
+
+    def get(self, sid):
+        with self.lock:
+            if sid in self.pending:
+                data = self.pending[sid]
+            elif sid in self.flushing:
+                data = self.flushing[sid]
+            else:
+                return self.store.get(sid)
+        if data is None:
+            return self.session_class({}, sid, True)
+        return self.session_class(pickle.loads(data), sid, False)
+
+    def flush(self):
+        """Writes all queued sessions to the wrapped :attr:`store`
+        immediately.  The background thread calls it periodically.
+
+        :returns: the number of written sessions
+        :rtype: :class:`numbers.Integral`
+
+        """
+        with self.flush_lock:
+            with self.lock:
+                self.flushing, self.pending = self.pending, {}
+            batch = self.flushing
+            store = self.store
+            session_class = self.session_class
+            try:
+                for sid, data in batch.iteritems():
+                    try:
+                        if data is None:
+                            store.delete(session_class({}, sid, False))
+                        else:
+                            session = session_class(pickle.loads(data),
+                                                    sid, False)
+                            store.save(session)
+                    except Exception:
+                        logger = logging.getLogger(__name__ + '.' +
+                                                   type(self).__name__)
+                        logger.exception('failed to write the session %s',
+                                         sid)
+            finally:
+                with self.lock:
+                    self.flushing = {}
+        return len(batch)
+
+    def _ensure_worker(self):
+        # Threads don't survive fork(), so it's checked by pid.
+        pid = os.getpid()
+        if self.worker_pid == pid:
+            return
+        with self.lock:
+            if self.worker_pid == pid:
+                return
+            self.worker_pid = pid
+            worker = threading.Thread(target=self._work,
+                                      name=type(self).__name__)
+            worker.daemon = True
+            worker.start()
+
+    def _work(self):
+        while True:
+            self.wakeup.wait(self.interval)
+            self.wakeup.clear()
+            self.flush()
+
+
+class SignedCookieSessionStore(SessionStore):
+    """The session store which keeps the whole session in the cookie
+    itself instead of server-side storage, so that it doesn't need
+    any I/O nor shared storage between hosts.  Session data are
+    serialized into JSON, compressed if it's worth, and signed using
+    HMAC-SHA256 so that clients cannot forge them.  Clients still can
+    *read* them, so don't put secrets into sessions.
+
+    The cookie is configured by
+    :attr:`BaseApp.session_cookie <plastic.app.BaseApp.session_cookie>`
+    as well::
+
+        app = App({
+            'session_store': 'plastic.sessions:SignedCookieSessionStore('
+                             '"new secret", old_secret_keys="old secret")'
+        })
+
+    Since the session id *is* the cookie value, the ``sid`` of sessions
+    changes whenever these are saved.  Only JSON-serializable values
+    can be stored.
+
+    :param secret_key: the secret key to sign sessions
+    :type secret_key: :class:`basestring`
+    :param old_secret_keys: previous secret keys to rotate keys without
+                            invalidating every session at once.  sessions
+                            signed with these are still accepted, and
+                            signed again with ``secret_key`` when these
+                            are saved.  it can be a comma-separated
+                            string as well
+    :type old_secret_keys: :class:`collections.Iterable`, :class:`basestring`
+    :param max_size: the maximum length of the cookie value.  default is
+                     4000 since browsers limit cookies to 4 KB
+    :type max_size: :class:`numbers.Integral`
+    :param max_age: the optional number of seconds sessions are valid
+                    after these are saved.  sessions don't expire by default
+    :type max_age: :class:`numbers.Real`
+    :param session_class: the session class to use.  default is
+                          :class:`werkzeug.contrib.sessions.Session`
+    :type session_class: :class:`type`
+
+    """
+
+    #: (:class:`numbers.Integral`) Serialized sessions longer than this
+    #: are compressed.
+    compress_threshold = 128
+
+    def __init__(self, secret_key, old_secret_keys=(), max_size=4000,
+                 max_age=None, session_class=None):
+        super(SignedCookieSessionStore, self).__init__(session_class)
+        if not secret_key:
+            raise TypeError('secret_key is required')
+        if isinstance(old_secret_keys, basestring):
+            old_secret_keys = old_secret_keys.split(',')
+        self.secret_key = secret_key
+        self.secret_keys = [secret_key]
+        self.secret_keys.extend(key for key in old_secret_keys if key)
+        self.max_size = max_size
+        self.max_age = max_age
+
+    def sign(self, message, secret_key=None):
+        """Makes the signature of the ``message``.
+
+        :param message: the message to sign
+        :type message: :class:`str`
+        :param secret_key: the secret key to sign with.  default is
+                           :attr:`secret_key`
+        :type secret_key: :class:`basestring`
+        :returns: the url-safe signature
+        :rtype: :class:`str`
+
+        """
+        if secret_key is None:
+            secret_key = self.secret_key
+        if isinstance(secret_key, unicode):
+            secret_key = secret_key.encode('utf-8')
+        digest = hmac.new(secret_key, message, hashlib.sha256).digest()
+        return base64.urlsafe_b64encode(digest).rstrip('=')
+
+    def dumps(self, data, timestamp=None):
+        """Serializes and signs the session ``data`` into a cookie value.
+
+        :param data: the session data to serialize
+        :type data: :class:`collections.Mapping`
+        :param timestamp: the time the session is saved.  default is now
+        :type timestamp: :class:`numbers.Real`
+        :returns: the signed cookie value
+        :rtype: :class:`str`
+        :raises plastic.exceptions.SessionError:
+           when the result is longer than :attr:`max_size`
+
+        """
+        payload = json.dumps(data, separators=(',', ':'))
+        if isinstance(payload, unicode):
+            payload = payload.encode('utf-8')
+        flag = 'j'
+        if len(payload) > self.compress_threshold:
+            compressed = zlib.compress(payload, 9)
+            if len(compressed) < len(payload):
+                payload = compressed
+                flag = 'z'
+        if timestamp is None:
+            timestamp = time.time()
+        message = '{0}{1}.{2:x}'.format(
+            flag, base64.urlsafe_b64encode(payload).rstrip('='),
+            int(timestamp)
+        )
+        value = message + '.' + self.sign(message)
+        if len(value) > self.max_size:
+            raise SessionError(
+                'the signed session is {0} bytes long; it exceeds max_size '
+                '({1})'.format(len(value), self.max_size)
+            )
+        return value
+
+    def loads(self, value):
+        """Verifies and deserializes the cookie ``value`` made by
+        :meth:`dumps()`.
+
+        :param value: the signed cookie value
+        :type value: :class:`basestring`
+        :returns: a pair of the session data and whether it's signed by
+                  an old secret key.  the session data is ``None`` if
+                  the value is invalid, forged or expired
+        :rtype: :class:`tuple`
+
+        """
+        try:
+            message, signature = str(value).rsplit('.', 1)
+            payload, timestamp = message.split('.', 1)
+            timestamp = int(timestamp, 16)
+        except (ValueError, UnicodeError):
+            return None, False
+        for i, secret_key in enumerate(self.secret_keys):
+            if safe_str_cmp(self.sign(message, secret_key), signature):
+                break
+        else:
+            return None, False
+        if self.max_age is not None and time.time() - timestamp > self.max_age:
+            return None, False
+        flag, payload = payload[:1], payload[1:]
+        try:
+            payload = base64.urlsafe_b64decode(payload +
+                                               '=' * (-len(payload) % 4))
+            if flag == 'z':
+                payload = zlib.decompress(payload)
+            elif flag != 'j':
+                return None, False
+            data = json.loads(payload)
+        except (TypeError, ValueError, zlib.error):
+            return None, False
+        if not isinstance(data, dict):
+            return None, False
+        return data, i > 0
+
+    def is_valid_key(self, key):
+        return self.loads(key)[0] is not None
+
+    def new(self):
+        return self.session_class({}, '', True)
+
+    def save(self, session):
+        session.sid = self.dumps(dict(session))
+
+    def delete(self, session):
+        session.clear()
+
+    def get(self, sid):
+        data, rotated = self.loads(sid)
+        if data is None:
+            return self.new()
+        session = self.session_class(data, sid, False)
+        if rotated:
+            session.modified = True
+        return session
@@ -0,0 +1,173 @@
+""":mod:`plastic.static` --- Static files
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+This module provides the view which serves static files e.g. stylesheets,
+scripts, images in a :class:`~plastic.resourcedir.ResourceDirectory`.
+In most cases you don't need to use it directly, but
+:meth:`BaseApp.add_static_files() <plastic.app.BaseApp.add_static_files>`
+method::
+
+    App.add_static_files('/static', 'static/')
+
+Files are sent by the server's ``wsgi.file_wrapper`` (which may use
+:func:`os.sendfile()`) if available, instead of being read into memory.
+It supports conditional requests (:mailheader:`ETag` and
+:mailheader:`Last-Modified`), byte ranges, and precompressed variants
+of files: if there are :file:`app.js.br` or :file:`app.js.gz` besides
+:file:`app.js` these are sent to clients which accept them.
+
+"""
+import datetime
+import mimetypes
+
+from werkzeug.datastructures import Accept
+from werkzeug.exceptions import NotFound
+from werkzeug.http import http_date, is_resource_modified, quote_etag
+
+from .message import Response
+from .resourcedir import ResourceDirectory
+
+__all__ = 'ENCODINGS', 'StaticFiles'
+
+
+#: (:class:`tuple`) The pairs of content codings and suffixes of
+#: precompressed variants, in the order of preference.
+ENCODINGS = ('br', '.br'), ('gzip', '.gz')
+
+
+class StaticFiles(object):
+    """The view function which serves files in the ``directory`` of
+    the ``package``.  It takes the ``path`` parameter::
+
+        static_files = StaticFiles('myapp', 'static/')
+        App.add_rule(Rule('/static/<path:path>', endpoint='static'),
+                     static_files)
+
+    Metadata of files (sizes and modification times) are read once
+    and kept in the snapshot index of
+    :class:`~plastic.resourcedir.ResourceDirectory`, so repeated hits
+    don't make any :func:`os.stat()` calls.  Turn ``auto_reload`` on
+    to revalidate the index on every request during development.
+
+    :param package: the package which contains static files
+    :type package: :class:`basestring`
+    :param directory: the path of the directory in the ``package``.
+                      default is ``'static/'``
+    :type directory: :class:`basestring`
+    :param max_age: seconds for :mailheader:`Cache-Control` ``max-age``.
+                    default is 3600
+    :type max_age: :class:`numbers.Integral`
+    :param auto_reload: whether to reflect changes of files without
+                        restarting.  default is ``False``
+    :type auto_reload: :class:`bool`
+    :param buffer_size: the number of bytes of each chunk to send.
+                        default is 8192
+    :type buffer_size: :class:`numbers.Integral`
+
+    """
+
+    def __init__(self, package, directory='static/', max_age=3600,
+                 auto_reload=False, buffer_size=8192):
+        self.directory = ResourceDirectory(package, directory,
+                                           snapshot=not auto_reload)
+        self.max_age = max_age
+        self.auto_reload = auto_reload
+        self.buffer_size = buffer_size
+
+    def find(self, path, accept_encodings=()):
+        """Finds the file to send for the ``path``.
+
+        :param path: the path of the file in the directory
+        :type path: :class:`basestring`
+        :param accept_encodings: the content codings the client accepts.
+                                 codings of quality 0 in
+                                 :class:`~werkzeug.datastructures.Accept`
+                                 objects are not accepted
+        :type accept_encodings: :class:`collections.Container`
+        :returns: a tuple of the path of the file to send (it may be
+                  a precompressed variant), its
+                  :class:`~plastic.resourcedir.ResourceInfo`, its
+                  content coding (``None`` for the identity), and
+                  whether there are any precompressed variants.
+                  ``None`` if there's no such file
+        :rtype: :class:`tuple`
+
+        """
+        if not path or any(segment in ('', '.', '..')
+                           for segment in path.split('/')):
+            return None
+        if isinstance(accept_encodings, Accept):
+            # Accept.__contains__() ignores qualities e.g. gzip;q=0.
+            accepts = lambda encoding: accept_encodings[encoding] > 0
+        else:
+            accepts = accept_encodings.__contains__
+        directory = self.directory
+        try:
+            info = directory.get_info(path)
+        except KeyError:
+            return None
+        if info.is_dir:
+            return None
+        variants = False
+        for encoding, suffix in ENCODINGS:
+            if path + suffix in directory:
+                variants = True
+                if accepts(encoding):
+                    variant = directory.get_info(path + suffix)
+                    return path + suffix, variant, encoding, True
+        return path, info, None, variants
+
+    def __call__(self, request, path):
+        if self.auto_reload:
+            self.directory.revalidate()
+        found = self.find(path, request.accept_encodings)
+        if found is None:
+            raise NotFound()
+        filename, info, encoding, variants = found
+        mimetype, file_encoding = mimetypes.guess_type(path)
+        if file_encoding:  # e.g. .tar.gz files are served as they are
+            mimetype = 'application/octet-stream'
+        headers = [('Accept-Ranges', 'bytes')]
+        if info.mtime is not None:
+            etag = '{0:x}-{1:x}'.format(int(info.mtime * 1000000), info.size)
+            if encoding:
+                etag += '-' + encoding
+            headers.append(('ETag', quote_etag(etag)))
+            last_modified = datetime.datetime.utcfromtimestamp(info.mtime)
+            headers.append(('Last-Modified', http_date(last_modified)))
+        else:
+            etag = None
+        if self.max_age is not None:
+            headers.append(('Cache-Control',
+                            'public, max-age={0}'.format(self.max_age)))
+        if encoding:
+            headers.append(('Content-Encoding', encoding))
+        if variants:
+            headers.append(('Vary', 'Accept-Encoding'))
+        environ = request.environ
+        if etag is not None and not environ.get('HTTP_RANGE') and \
+           not is_resource_modified(environ, etag, None, last_modified):
+            return Response(status=304, headers=headers,
+                            mimetype=mimetype)
+        if request.method == 'HEAD':
+            response = Response(headers=headers, mimetype=mimetype)
+            if info.size is not None:
+                response.content_length = info.size
+            return response
+        resource = self.directory[filename]
+        try:
+            response = Response(resource.wrap(environ, self.buffer_size),
+                                headers=headers, mimetype=mimetype,
+                                direct_passthrough=True)
+            if info.size is None:
+                return response
+            response.content_length = info.size
+            response.make_conditional(request, accept_ranges=True,
+                                      complete_length=info.size)
+        except Exception:
+            resource.close()
+            raise
+        if response.status_code in (304, 412):
+            resource.close()
+            response.response = []
+        return response
@@ -0,0 +1,67 @@
+""":mod:`plasticbenchmarks` --- Benchmarks
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+Performance benchmarks of Plastic.  Each submodule can be run as
+a script e.g.::
+
+    $ python -m plasticbenchmarks.sessions
+
+The request pipeline as a whole is measured by
+:mod:`plasticbenchmarks.pipeline`, which can also compare results
+across commits.
+
+"""
+import timeit
+
+__all__ = 'format_table', 'measure'
+
+
+def measure(function, number=None, repeat=3):
+    """Measures the average seconds a call of the ``function`` takes.
+    The best of ``repeat`` rounds is taken.
+
+    :param function: the function to measure.  it takes no arguments
+    :type function: :class:`collections.Callable`
+    :param number: the number of calls for each round.  if it's omitted
+                   it's determined to make a round take about 0.2 seconds
+    :type number: :class:`numbers.Integral`
+    :param repeat: the number of rounds.  default is 3
+    :type repeat: :class:`numbers.Integral`
+    :returns: the average seconds of a call
+    :rtype: :class:`float`
+
+    """
+    timer = timeit.Timer(function)
+    if number is None:
+        number = 1
+        while timer.timeit(number) < 0.2:
+            number *= 10
+    return min(timer.repeat(repeat, number)) / number
+
+
+def format_table(header, rows):
+    """Formats ``rows`` into a human-readable plain text table.
+
+    :param header: the sequence of column names
+    :type header: :class:`collections.Sequence`
+    :param rows: the sequence of rows.  each row is a sequence of values
+                 and these are formatted using :func:`str()`.
+                 :class:`float` values are formatted in microseconds
+    :type rows: :class:`collections.Iterable`
+    :returns: the formatted table
+    :rtype: :class:`str`
+
+    """
+    def format_value(value):
+        if isinstance(value, float):
+            return '{0:.2f} us'.format(value * 1000000)
+        return str(value)
+    table = [list(header)]
+    table.extend(map(format_value, row) for row in rows)
+    widths = [max(len(row[i]) for row in table) for i in xrange(len(header))]
+    lines = []
+    for row in table:
+        lines.append('  '.join(cell.ljust(width)
+                               for cell, width in zip(row, widths)).rstrip())
+    lines.insert(1, '  '.join('-' * width for width in widths))
+    return '\n'.join(lines)
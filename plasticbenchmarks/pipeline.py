@@ -0,0 +1,241 @@
+""":mod:`plasticbenchmarks.pipeline` --- Request pipeline benchmarks
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+Drives :meth:`BaseApp.__call__() <plastic.app.BaseApp.__call__>` with
+synthetic WSGI environs across scenarios (routing, rendering, sessions,
+content negotiation) and reports requests per second, latency
+percentiles and gc-tracked objects left per request::
+
+    $ python -m plasticbenchmarks.pipeline
+
+It needs no network nor external services.  To compare commits, save
+the results of one in JSON and then compare the other with it::
+
+    $ git checkout master
+    $ python -m plasticbenchmarks.pipeline --save master.json
+    $ git checkout feature
+    $ python -m plasticbenchmarks.pipeline --compare master.json
+
+Objects per request are the net growth of objects tracked by the garbage
+collector while it's disabled, i.e. reference cycles and caches each
+request leaves for the collector.  Python 2 cannot count every
+allocation.
+
+"""
+import argparse
+import gc
+import json
+import sys
+import time
+
+from werkzeug.test import EnvironBuilder
+
+from plastic.app import BaseApp
+from plastic.rendering import render
+from plastic.sessions import MemorySessionStore
+from . import format_table
+
+__all__ = 'benchmark_request', 'make_app', 'scenarios'
+
+
+#: (:class:`tuple`) The :mailheader:`Accept` headers to negotiate.
+ACCEPT_HEADERS = (
+    ('json', 'application/json'),
+    ('html', 'text/html'),
+    ('browser', 'text/html,application/xhtml+xml,application/xml;q=0.9,'
+                'image/webp,*/*;q=0.8'),
+    ('any', '*/*'),
+    ('none', None)
+)
+
+
+def make_app(rule_count=10):
+    """Makes the application to benchmark.  It has ``rule_count``
+    static rules, ``rule_count`` dynamic rules, and rules for rendering
+    and sessions.
+
+    :param rule_count: the number of filler rules of each kind.
+                       default is 10
+    :type rule_count: :class:`numbers.Integral`
+    :returns: the application instance
+    :rtype: :class:`~plastic.app.BaseApp`
+
+    """
+    App = BaseApp.clone(__module__='plasticbenchmarks')
+    App.associate_mimetypes(html='text/html', xml='application/xml')
+
+    @App.template_engine('fmt', compiler=lambda app, path, source: source)
+    def render_fmt(request, template, values):
+        return template.format(**values)
+
+    @App.serializer('application/json')
+    def serialize_json(request, value):
+        return json.dumps(value)
+
+    def view(request, **values):
+        return 'Hello'
+    for i in xrange(rule_count):
+        App.route('/static/{0}'.format(i), endpoint='s{0}'.format(i))(view)
+        App.route('/dynamic/{0}/<int:id>'.format(i),
+                  endpoint='d{0}'.format(i))(view)
+
+    @App.route('/render')
+    def render_(request):
+        items = range(10)
+        return render(request, {'title': 'Pipeline', 'items': items},
+                      'pipeline', title='Pipeline',
+                      items=''.join('<li>{0}</li>'.format(i) for i in items))
+
+    @App.route('/session')
+    def session(request):
+        request.session['hits'] = request.session.get('hits', 0) + 1
+        return 'Hello'
+
+    return App({'session_store': MemorySessionStore()})
+
+
+def benchmark_request(app, environ, duration=1.0):
+    """Measures the ``app`` handling requests of the ``environ`` for
+    about ``duration`` seconds.  Response bodies are consumed as WSGI
+    servers do.
+
+    :param app: the application to call
+    :type app: :class:`~plastic.app.BaseApp`
+    :param environ: the WSGI environ to copy for each request
+    :type environ: :class:`collections.Mapping`
+    :param duration: seconds to run.  default is 1
+    :type duration: :class:`numbers.Real`
+    :returns: the mapping which has ``'requests'``, ``'rps'``
+              (requests per second), ``'p50'``, ``'p90'``, ``'p99'``
+              (latencies in seconds) and ``'objects'`` (gc-tracked
+              objects left per request)
+    :rtype: :class:`dict`
+
+    """
+    def start_response(status, headers, exc_info=None):
+        return lambda data: None
+    def call():
+        started = timer()
+        app_iter = app(environ.copy(), start_response)
+        try:
+            for _ in app_iter:
+                pass
+        finally:
+            close = getattr(app_iter, 'close', None)
+            if close is not None:
+                close()
+        return timer() - started
+    timer = time.time
+    for _ in xrange(10):  # warm caches up
+        call()
+    latencies = []
+    gc_enabled = gc.isenabled()
+    gc.collect()
+    gc.disable()
+    try:
+        objects = len(gc.get_objects())
+        finish = timer() + duration
+        while timer() < finish:
+            latencies.append(call())
+        objects = len(gc.get_objects()) - objects
+    finally:
+        if gc_enabled:
+            gc.enable()
+    gc.collect()
+    latencies.sort()
+    count = len(latencies)
+    percentile = lambda q: latencies[min(count - 1, int(count * q / 100.0))]
+    return {
+        'requests': count,
+        'rps': count / sum(latencies),
+        'p50': percentile(50),
+        'p90': percentile(90),
+        'p99': percentile(99),
+        'objects': objects / float(count)
+    }
+
+
+def scenarios():
+    """Generates scenarios to benchmark.
+
+    :returns: triples of the scenario name, the application and
+              the environ
+    :rtype: :class:`collections.Iterable`
+
+    """
+    for rule_count in 10, 100, 1000:
+        app = make_app(rule_count)
+        last = rule_count - 1
+        for kind, path in [('static', '/static/{0}'.format(last)),
+                           ('dynamic', '/dynamic/{0}/123'.format(last))]:
+            name = 'routing/{0}/{1}'.format(kind, rule_count * 2)
+            yield name, app, EnvironBuilder(path=path).get_environ()
+    app = make_app()
+    for name, accept in ACCEPT_HEADERS:
+        headers = [('Accept', accept)] if accept else []
+        environ = EnvironBuilder(path='/render', headers=headers).get_environ()
+        yield 'render/' + name, app, environ
+    yield 'session/off', app, EnvironBuilder(path='/static/0').get_environ()
+    session = app.session_store.new()
+    app.session_store.save(session)
+    cookie = '{0}={1}'.format(app.session_cookie['key'], session.sid)
+    environ = EnvironBuilder(path='/session',
+                             headers=[('Cookie', cookie)]).get_environ()
+    yield 'session/on', app, environ
+
+
+def compare(results, baseline):
+    rows = []
+    for name, result in results:
+        base = baseline.get(name)
+        if base is None:
+            rows.append((name, '{0:.0f}'.format(result['rps']), '', '', ''))
+            continue
+        change = (result['rps'] - base['rps']) / base['rps'] * 100
+        rows.append((name,
+                     '{0:.0f}'.format(result['rps']),
+                     '{0:.0f}'.format(base['rps']),
+                     '{0:+.1f}%'.format(change),
+                     '{0:+.2f}'.format(result['objects'] - base['objects'])))
+    return format_table(('scenario', 'req/s', 'baseline', 'change',
+                         'objects'), rows)
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m plasticbenchmarks.pipeline',
+        description='Benchmarks the request pipeline.'
+    )
+    parser.add_argument('-d', '--duration', type=float, default=1.0,
+                        help='seconds to run each scenario [%(default)s]')
+    parser.add_argument('-s', '--save', metavar='FILE',
+                        help='save results to FILE in JSON')
+    parser.add_argument('-c', '--compare', metavar='FILE',
+                        help='compare results with saved FILE')
+    parser.add_argument('filter', nargs='?', default='',
+                        help='run only scenarios starting with it')
+    args = parser.parse_args(args)
+    results = []
+    for name, app, environ in scenarios():
+        if name.startswith(args.filter):
+            result = benchmark_request(app, environ, args.duration)
+            results.append((name, result))
+            print >> sys.stderr, name, '{0:.0f} req/s'.format(result['rps'])
+    if args.compare:
+        with open(args.compare) as f:
+            print compare(results, json.load(f)['results'])
+    else:
+        print format_table(
+            ('scenario', 'req/s', 'p50', 'p90', 'p99', 'objects'),
+            [(name, '{0:.0f}'.format(r['rps']), r['p50'], r['p90'], r['p99'],
+              '{0:.2f}'.format(r['objects']))
+             for name, r in results]
+        )
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({'python': sys.version, 'results': dict(results)}, f,
+                      indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+""":mod:`plasticbenchmarks.routing` --- Routing benchmarks
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+Measures the dispatch cost of :class:`plastic.routing.Router` and
+:class:`plastic.routing.RadixTreeRouter` compared to
+:meth:`werkzeug.routing.MapAdapter.match()` by the number of rules::
+
+    $ python -m plasticbenchmarks.routing
+
+"""
+from werkzeug.test import EnvironBuilder
+
+from plastic.app import BaseApp
+from plastic.message import Request
+from plastic.routing import RadixTreeRouter
+from . import format_table, measure
+
+
+def make_app(rule_count, **values):
+    """Makes an application which has ``rule_count`` static rules and
+    ``rule_count`` dynamic rules.
+
+    :param rule_count: the number of rules of each kind
+    :type rule_count: :class:`numbers.Integral`
+    :param \*\*values: class attributes of the application class
+    :returns: the application instance
+    :rtype: :class:`~plastic.app.BaseApp`
+
+    """
+    App = BaseApp.clone(**values)
+    def view(request, **values):
+        return ''
+    for i in xrange(rule_count):
+        App.route('/static/{0}'.format(i), endpoint='s{0}'.format(i))(view)
+        App.route('/dynamic/{0}/<int:id>'.format(i),
+                  endpoint='d{0}'.format(i))(view)
+    return App()
+
+
+def benchmark_dispatch(app, path):
+    """Measures the seconds to match the ``path``.
+
+    :param app: the application to dispatch
+    :type app: :class:`~plastic.app.BaseApp`
+    :param path: the path to match
+    :type path: :class:`basestring`
+    :returns: a pair of average seconds of :attr:`BaseApp.router
+              <plastic.app.BaseApp.router>` and werkzeug's
+              :class:`~werkzeug.routing.MapAdapter`
+    :rtype: :class:`tuple`
+
+    """
+    environ = EnvironBuilder(path=path).get_environ()
+    request = Request(environ, app=app)
+    def router():
+        request.__dict__.pop('bound_routing_map', None)
+        app.router.match(request)
+    def werkzeug():
+        app.routing_map.bind_to_environ(environ).match()
+    return measure(router), measure(werkzeug)
+
+
+def main():
+    rows = []
+    for rule_count in 10, 100, 1000:
+        app = make_app(rule_count)
+        tree_app = make_app(rule_count, router_class=RadixTreeRouter)
+        last = rule_count - 1
+        for kind, path in [('static', '/static/{0}'.format(last)),
+                           ('dynamic', '/dynamic/{0}/123'.format(last))]:
+            router, werkzeug = benchmark_dispatch(app, path)
+            tree, _ = benchmark_dispatch(tree_app, path)
+            rows.append((rule_count * 2, kind, router, tree, werkzeug))
+    print format_table(('rules', 'path', 'Router', 'RadixTreeRouter',
+                        'werkzeug'), rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+""":mod:`plasticbenchmarks.sessions` --- Session store benchmarks
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+Compares session stores of :mod:`plastic.sessions` with the default
+:class:`werkzeug.contrib.sessions.FilesystemSessionStore`::
+
+    $ python -m plasticbenchmarks.sessions
+
+"""
+import os.path
+import shutil
+import tempfile
+
+from werkzeug.contrib.sessions import FilesystemSessionStore
+
+from plastic.sessions import MemorySessionStore, SQLiteSessionStore
+from . import format_table, measure
+
+
+def benchmark_store(store):
+    """Measures the ``store``'s costs of saving and loading a session.
+
+    :param store: the session store to measure
+    :type store: :class:`werkzeug.contrib.sessions.SessionStore`
+    :returns: a pair of average seconds to save and load a session
+    :rtype: :class:`tuple`
+
+    """
+    session = store.new()
+    session.update(user_id=1234, cart=range(20), flash=u'Hello, world')
+    def save():
+        store.save(session)
+    def load():
+        store.get(session.sid)
+    save()
+    return measure(save), measure(load)
+
+
+def main():
+    tmpdir = tempfile.mkdtemp()
+    try:
+        stores = [
+            ('FilesystemSessionStore', FilesystemSessionStore(tmpdir)),
+            ('MemorySessionStore', MemorySessionStore()),
+            ('SQLiteSessionStore',
+             SQLiteSessionStore(os.path.join(tmpdir, 'sessions.sqlite')))
+        ]
+        rows = []
+        for name, store in stores:
+            save, load = benchmark_store(store)
+            rows.append((name, save, load))
+    finally:
+        shutil.rmtree(tmpdir)
+    print format_table(('store', 'save', 'load'), rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,16 +1,28 @@
 from attest import Tests
 
 from plastic.version import VERSION, VERSION_INFO
-from . import app, config, context, message, rendering, resourcedir
+from . import (app, batch, cache, compression, config, context, executor,
+               instrumentation, message, profiling, rendering, resourcedir,
+               routing, server, sessions, static)
 
 
 tests = Tests()
 tests.register(app.tests)
+tests.register(batch.tests)
+tests.register(cache.tests)
+tests.register(compression.tests)
 tests.register(config.tests)
 tests.register(context.tests)
+tests.register(executor.tests)
+tests.register(instrumentation.tests)
 tests.register(message.tests)
+tests.register(profiling.tests)
 tests.register(rendering.tests)
 tests.register(resourcedir.tests)
+tests.register(routing.tests)
+tests.register(server.tests)
+tests.register(sessions.tests)
+tests.register(static.tests)
 
 
 @tests.test
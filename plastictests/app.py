@@ -300,3 +300,120 @@ def view_returns_string():
     assert response.status_code == 200
     expected = 'okay \xec\x9c\xa0\xeb\x8b\x88\xec\xbd\x94\xeb\x93\x9c'
     assert response.data == expected
+
+
+@tests.test
+def resolve_template():
+    App = BaseApp.clone()
+    @App.template_engine('t1')
+    def t1(request, path, values):
+        return 't1'
+    @App.template_engine('t2')
+    def t2(request, path, values):
+        return 't2'
+    app = App()
+    assert (app.resolve_template('render_template_one.html') ==
+            ('render_template_one.html.t1', 't1'))
+    assert (app.resolve_template('render_template_two.html') ==
+            ('render_template_two.html.t2', 't2'))
+    with raises(RenderError):
+        app.resolve_template('render_template_three.html')
+    with raises(RenderError):
+        app.resolve_template('not/exist')
+    app2 = App()
+    assert app2.build_template_index() == 4
+    assert (app2.resolve_template('render_template_one.html') ==
+            ('render_template_one.html.t1', 't1'))
+    assert app2.resolve_template('home.xml') == ('home.xml.t1', 't1')
+    with raises(RenderError):
+        app2.resolve_template('render_template_three.html')
+    app3 = App({'template_auto_reload': True})
+    assert (app3.resolve_template('render_template_two.html') ==
+            ('render_template_two.html.t2', 't2'))
+    with raises(RenderError):
+        app3.resolve_template('render_template_three.html')
+
+
+@tests.test
+def template_compiler():
+    compiled = []
+    def compile_t1(app, path, source):
+        compiled.append(path)
+        return source.strip().replace('{b}', '').format
+    App = BaseApp.clone()
+    @App.template_engine('t1', compiler=compile_t1)
+    def t1(request, template, values):
+        return template(request=request, **values)
+    assert App.template_engines['t1'] is t1
+    assert App.template_compilers['t1'] is compile_t1
+    @App.route('/')
+    def home(request):
+        return render_template(request, 'render_template_one.html', a='hi')
+    app = App()
+    client = Client(app, Response)
+    for _ in xrange(3):
+        response = client.get('/')
+        assert response.data == 't1: /, hi, '
+    assert compiled == ['render_template_one.html.t1']
+    assert app.template_cache.hits == 2
+    assert app.template_cache.misses == 1
+    with raises(TypeError):
+        App.add_template_engine('t2', t1, compiler=1234)
+
+
+@tests.test
+def warmup():
+    compiled = []
+    def compile_t1(app, path, source):
+        compiled.append(path)
+        return source
+    App = BaseApp.clone()
+    App.associate_mimetypes(html='text/html')
+    @App.template_engine('t1', compiler=compile_t1)
+    def t1(request, template, values):
+        return template
+    @App.route('/')
+    def home(request):
+        return render_template(request, 'home.html')
+    app = App()
+    assert compiled == []
+    steps = app.warmup()
+    assert steps.keys() == ['routing', 'templates', 'negotiation',
+                            'static_files']
+    assert all(seconds >= 0 for seconds in steps.values())
+    assert sorted(compiled) == ['home.html.t1', 'home.xml.t1',
+                                'render_template_one.html.t1']
+    assert app.negotiation_cache.misses == 3
+    response = Client(app, Response).get('/')
+    assert response.status_code == 200
+    assert len(compiled) == 3
+    assert app.template_cache.misses == 3
+    del compiled[:]
+    app2 = App({'warmup': True})
+    assert len(compiled) == 3
+
+
+@tests.test
+def compile_routing():
+    App = BaseApp.clone()
+    @App.route('/a')
+    def a(request):
+        return 'a'
+    app1 = App()
+    app2 = App()
+    assert app1.routing_map is app2.routing_map
+    assert app1.router is app2.router
+    @App.route('/b')
+    def b(request):
+        return 'b'
+    app3 = App()
+    assert app3.routing_map is not app1.routing_map
+    assert Client(app3, Response).get('/b').data == 'b'
+    assert Client(app1, Response).get('/b').status_code == 404
+    SubApp = App.clone()
+    sub_app = SubApp()
+    assert sub_app.routing_map is not app3.routing_map
+    @App.route('/c')
+    def c(request):
+        return 'c'
+    assert Client(SubApp(), Response).get('/c').data == 'c'
@@ -0,0 +1,232 @@
+import base64
+import json
+import os
+import threading
+
+from attest import Tests, assert_hook
+from werkzeug.exceptions import Forbidden
+from werkzeug.test import Client, EnvironBuilder
+from werkzeug.wrappers import Response
+
+from plastic.app import BaseApp
+from plastic.batch import BatchView
+from plastic.cache import cache_response
+from plastic.message import Request
+from plastic.sessions import MemorySessionStore
+
+
+BatchTestApp = BaseApp.clone()
+BatchTestApp.add_batch_endpoint('/_batch', max_requests=4)
+BatchTestApp.add_static_files('/static', 'assets/')
+
+
+@BatchTestApp.route('/users/<int:user_id>')
+def user(request, user_id):
+    return 'user {0} {1}'.format(user_id, request.args.get('x', ''))
+
+
+@BatchTestApp.route('/echo', methods=['POST'])
+def echo(request):
+    return '{0} {1} {2}'.format(request.content_type,
+                                request.headers.get('X-Token'),
+                                request.get_data())
+
+
+event = threading.Event()
+
+
+@BatchTestApp.route('/wait')
+def wait(request):
+    event.wait(5)
+    return 'waited' if event.is_set() else 'timeout'
+
+
+@BatchTestApp.route('/set')
+def set_(request):
+    event.set()
+    return 'set'
+
+
+@BatchTestApp.route('/thread')
+def thread(request):
+    return threading.current_thread().name
+
+
+@BatchTestApp.route('/forbidden')
+def forbidden(request):
+    raise Forbidden()
+
+
+@BatchTestApp.route('/error')
+def error(request):
+    raise KeyError('error')
+
+
+@BatchTestApp.route('/binary')
+def binary(request):
+    return '\xff\xfe'
+
+
+@BatchTestApp.route('/invalid')
+def invalid(request):
+    return 123
+
+
+@BatchTestApp.route('/broken-stream')
+def broken_stream(request):
+    def stream():
+        yield 'a'
+        raise KeyError('error')
+    return Response(stream())
+
+
+@BatchTestApp.route('/login', methods=['POST'])
+def login(request):
+    request.session['user'] = request.get_data()
+    return 'logged in'
+
+
+@BatchTestApp.route('/whoami')
+def whoami(request):
+    return request.session.get('user', 'anonymous')
+
+
+@BatchTestApp.route('/me')
+@cache_response()
+def me(request):
+    return request.session.get('user', 'anonymous')
+
+
+tests = Tests()
+
+
+@tests.test
+def dispatch_batch():
+    app = BatchTestApp()
+    responses = app.dispatch_batch([
+        ('GET', '/users/1'),
+        ('get', '/users/2?x=y'),
+        ('POST', '/echo', {'Content-Type': 'text/plain', 'X-Token': 'abc'},
+         'hello'),
+        ('GET', '/forbidden'),
+        ('GET', '/error'),
+        ('GET', '/not-found'),
+        ('GET', '/invalid')
+    ])
+    assert [r.status_code for r in responses] == [200, 200, 200, 403, 500,
+                                                  404, 500]
+    assert responses[0].data == 'user 1 '
+    assert responses[1].data == 'user 2 y'
+    assert responses[2].data == 'text/plain abc hello'
+    environ = EnvironBuilder(path='/users/1', method='POST',
+                             base_url='http://example.com/',
+                             headers=[('X-Token', 'parent')],
+                             content_type='application/json',
+                             data='{}').get_environ()
+    parent = Request(environ, app=app)
+    responses = app.dispatch_batch([('POST', '/echo'),
+                                    ('POST', '/echo', [('X-Token', 'sub')])],
+                                   parent)
+    assert responses[0].data == 'None parent '
+    assert responses[1].data == 'None sub '
+    app = BatchTestApp({'session_store': MemorySessionStore()})
+    parent = Request(EnvironBuilder(path='/whoami').get_environ(), app=app)
+    responses = app.dispatch_batch([('POST', '/login', (), 'dahlia'),
+                                    ('GET', '/whoami')], parent,
+                                   max_workers=1)
+    assert [r.data for r in responses] == ['logged in', 'dahlia']
+    assert 'Set-Cookie' not in responses[0].headers
+    assert parent.session['user'] == 'dahlia'
+
+
+@tests.test
+def dispatch_batch_cache_response():
+    app = BatchTestApp({'session_store': MemorySessionStore()})
+    builder = EnvironBuilder(path='/_batch', method='POST')
+    parent = Request(builder.get_environ(), app=app)
+    responses = app.dispatch_batch([('POST', '/login', (), 'alice'),
+                                    ('GET', '/me')], parent, max_workers=1)
+    assert [r.data for r in responses] == ['logged in', 'alice']
+    parent = Request(builder.get_environ(), app=app)
+    responses = app.dispatch_batch([('GET', '/me')], parent)
+    assert responses[0].data == 'anonymous'
+    client = Client(app, Response)
+    response = client.get('/me')
+    assert response.data == 'anonymous'
+
+
+@tests.test
+def dispatch_batch_concurrency():
+    app = BatchTestApp()
+    event.clear()
+    responses = app.dispatch_batch([('GET', '/wait'), ('GET', '/set')],
+                                   max_workers=2)
+    assert [r.data for r in responses] == ['waited', 'set']
+    responses = app.dispatch_batch([('GET', '/thread')] * 4, max_workers=1)
+    names = set(r.data for r in responses)
+    assert names == set([threading.current_thread().name])
+    assert app.dispatch_batch([]) == []
+
+
+@tests.test
+def batch_endpoint():
+    assert isinstance(BatchTestApp.endpoints['batch'], BatchView)
+    app = BatchTestApp({'session_store': MemorySessionStore()})
+    client = Client(app, Response)
+    def post(data, **kwargs):
+        kwargs.setdefault('content_type', 'application/json')
+        return client.post('/_batch', data=data, **kwargs)
+    body = json.dumps([
+        {'path': '/users/1?x=z'},
+        {'method': 'POST', 'path': '/echo',
+         'headers': {'Content-Type': 'text/plain'}, 'body': u'안'},
+        {'path': '/binary'}
+    ])
+    response = post(body, headers=[('X-Token', 'parent')])
+    assert response.status_code == 200
+    assert response.mimetype == 'application/json'
+    results = json.loads(response.data)
+    assert [r['status'] for r in results] == [200, 200, 200]
+    assert results[0]['body'] == 'user 1 z'
+    assert ['Content-Type', 'text/plain; charset=utf-8'] in \
+           results[0]['headers']
+    assert results[1]['body'] == u'text/plain parent 안'
+    assert results[2]['encoding'] == 'base64'
+    assert base64.b64decode(results[2]['body']) == '\xff\xfe'
+    response = post(json.dumps([{'path': '/'}] * 5))
+    assert response.status_code == 400
+    response = post('{}')
+    assert response.status_code == 400
+    response = post('[{"method": "GET"}]')
+    assert response.status_code == 400
+    for content_type in 'text/plain', 'application/x-www-form-urlencoded':
+        response = post(body, content_type=content_type)
+        assert response.status_code == 415
+    response = client.get('/_batch')
+    assert response.status_code == 405
+    nested = json.dumps([{'method': 'POST', 'path': '/_batch',
+                          'body': '[]'}])
+    response = post(nested)
+    assert json.loads(response.data)[0]['status'] == 400
+    body = json.dumps([{'path': '/static/css/main.css'},
+                       {'path': '/broken-stream'},
+                       {'path': '/users/2'}])
+    response = post(body)
+    assert response.status_code == 200
+    results = json.loads(response.data)
+    assert [r['status'] for r in results] == [200, 500, 200]
+    with open(os.path.join(os.path.dirname(__file__), 'assets', 'css',
+                           'main.css')) as f:
+        css = f.read()
+    assert results[0]['body'] == css
+    assert results[2]['body'] == 'user 2 '
+    body = json.dumps([{'method': 'POST', 'path': '/login',
+                        'body': 'dahlia'}])
+    response = post(body)
+    results = json.loads(response.data)
+    assert results[0]['body'] == 'logged in'
+    assert not any(name.lower() == 'set-cookie'
+                   for name, _ in results[0]['headers'])
+    assert 'sessionid=' in response.headers['Set-Cookie']
+    response = post(json.dumps([{'path': '/whoami'}]))
+    assert json.loads(response.data)[0]['body'] == 'dahlia'
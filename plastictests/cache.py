@@ -0,0 +1,192 @@
+import json
+import time
+
+from attest import Tests, assert_hook, raises
+from werkzeug.test import Client
+from werkzeug.wrappers import Response
+
+from plastic.app import BaseApp
+from plastic.cache import Cache, LRUCache, cache_response
+from plastic.rendering import render
+
+
+tests = Tests()
+
+
+@tests.test
+def lru_cache():
+    cache = LRUCache(3)
+    assert isinstance(cache, Cache)
+    missing = cache.get('a')
+    assert missing is None
+    missing = cache.get('a', 123)
+    assert missing == 123
+    assert cache.misses == 2
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.set('c', 3)
+    assert len(cache) == 3
+    value = cache.get('a')
+    assert value == 1
+    assert cache.hits == 1
+    cache.set('d', 4)
+    assert len(cache) == 3
+    assert 'b' not in cache
+    assert 'a' in cache
+    assert cache.evictions == 1
+    cache.set('a', 5)
+    cache.set('e', 6)
+    assert 'c' not in cache
+    value = cache.get('a')
+    assert value == 5
+    cache.delete('a')
+    assert 'a' not in cache
+    cache.delete('a')
+    cache.clear()
+    assert len(cache) == 0
+    assert 'd' not in cache
+    with raises(ValueError):
+        LRUCache(0)
+
+
+@tests.test
+def get_or_set():
+    cache = LRUCache()
+    calls = []
+    def make():
+        calls.append(1)
+        return 'value'
+    for _ in xrange(2):
+        value = cache.get_or_set('key', make)
+        assert value == 'value'
+    assert len(calls) == 1
+    assert cache.hits == 1
+    assert cache.misses == 1
+
+
+@tests.test
+def lru_cache_ttl():
+    cache = LRUCache(ttl=0.05)
+    cache.set('a', 1)
+    assert 'a' in cache
+    value = cache.get('a')
+    assert value == 1
+    time.sleep(0.1)
+    assert 'a' not in cache
+    value = cache.get('a')
+    assert value is None
+    with raises(ValueError):
+        LRUCache(ttl=0)
+
+
+ResponseCacheApp = BaseApp.clone()
+ResponseCacheApp.associate_mimetypes(txt='text/plain')
+response_cache_calls = []
+
+
+@ResponseCacheApp.serializer('application/json')
+def serialize_json(request, value):
+    return json.dumps(value)
+
+
+@ResponseCacheApp.template_engine('txt')
+def render_txt(request, path, values):
+    with request.app.template_directory[path] as template:
+        return template.read().format(**values)
+
+
+@ResponseCacheApp.route('/<int:value>')
+@cache_response(ttl=60, headers=['X-Tenant'])
+def cached_value(request, value):
+    response_cache_calls.append(value)
+    response = render(request, {'value': value}, 'value', number=value)
+    if request.args.get('vary'):
+        response.vary.add(request.args['vary'])
+    return response
+
+
+@ResponseCacheApp.route('/session', methods=['GET', 'POST'])
+@cache_response()
+def cached_session(request):
+    response_cache_calls.append('session')
+    request.session['visited'] = True
+    return 'session'
+
+
+@ResponseCacheApp.route('/pages')
+@cache_response()
+def cached_page(request):
+    response_cache_calls.append('pages')
+    return 'page ' + request.args.get('page', '1')
+
+
+@tests.test
+def cache_response_():
+    del response_cache_calls[:]
+    cache = LRUCache()
+    app = ResponseCacheApp({'response_cache': cache})
+    client = Client(app, Response)
+    def get(path, accept='application/json', **headers):
+        headers = [(k.replace('_', '-'), v) for k, v in headers.items()]
+        return client.get(path, headers=[('Accept', accept)] + headers)
+    response = get('/1')
+    assert json.loads(response.data) == {'value': 1}
+    assert response_cache_calls == [1]
+    response = get('/1')
+    assert json.loads(response.data) == {'value': 1}
+    assert response.mimetype == 'application/json'
+    assert 'Accept' in response.vary
+    assert response_cache_calls == [1]
+    response = get('/1', accept='text/plain')
+    assert response.data == 'value: 1'
+    assert response_cache_calls == [1, 1]
+    response = get('/2')
+    assert json.loads(response.data) == {'value': 2}
+    assert response_cache_calls == [1, 1, 2]
+    response = get('/1', X_Tenant='a')
+    assert json.loads(response.data) == {'value': 1}
+    assert response_cache_calls == [1, 1, 2, 1]
+    response = get('/1', X_Tenant='a')
+    assert response_cache_calls == [1, 1, 2, 1]
+    response = client.post('/1')
+    assert response_cache_calls == [1, 1, 2, 1, 1]
+    response = get('/session')
+    response = get('/session')
+    assert response.data == 'session'
+    assert response_cache_calls == [1, 1, 2, 1, 1, 'session', 'session']
+    del response_cache_calls[:]
+    response = get('/3?vary=X-Other', X_Other='a')
+    response = get('/3?vary=X-Other', X_Other='a')
+    assert response_cache_calls == [3]
+    response = get('/3?vary=X-Other', X_Other='b')
+    assert response_cache_calls == [3, 3]
+    response = get('/3?vary=*')
+    response = get('/3?vary=*')
+    assert response_cache_calls == [3, 3, 3, 3]
+    del response_cache_calls[:]
+    assert get('/pages?page=1').data == 'page 1'
+    assert get('/pages?page=2').data == 'page 2'
+    assert get('/pages?page=1').data == 'page 1'
+    assert get('/pages').data == 'page 1'
+    assert response_cache_calls == ['pages', 'pages', 'pages']
+    with raises(ValueError):
+        cache_response(ttl=0)
+
+
+@tests.test
+def cache_response_ttl():
+    del response_cache_calls[:]
+    app = ResponseCacheApp()
+    assert isinstance(app.response_cache, Cache)
+    client = Client(app, Response)
+    headers = [('Accept', 'text/plain')]
+    client.get('/4', headers=headers)
+    client.get('/4', headers=headers)
+    assert response_cache_calls == [4]
+    time_ = time.time
+    try:
+        time.time = lambda: time_() + 61
+        client.get('/4', headers=headers)
+    finally:
+        time.time = time_
+    assert response_cache_calls == [4, 4]
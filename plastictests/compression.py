@@ -0,0 +1,157 @@
+import gzip
+import json
+import zlib
+from StringIO import StringIO
+
+from attest import Tests, assert_hook, raises
+from werkzeug.test import Client
+from werkzeug.wrappers import Response
+
+from plastic.app import BaseApp
+from plastic.cache import LRUCache
+from plastic.compression import Compression
+from plastic.message import Response as PlasticResponse
+
+
+def gunzip(data):
+    return gzip.GzipFile(fileobj=StringIO(data)).read()
+
+
+CompressionApp = BaseApp.clone()
+large_list = [{'id': i, 'name': 'item'} for i in xrange(2000)]
+large_body = json.dumps(large_list[:100])
+
+
+@CompressionApp.route('/large')
+def large(request):
+    return PlasticResponse(large_body, mimetype='application/json')
+
+
+@CompressionApp.route('/tagged')
+def tagged(request):
+    response = PlasticResponse(large_body, mimetype='application/json')
+    response.set_etag('tag')
+    return response
+
+
+@CompressionApp.route('/small')
+def small(request):
+    return PlasticResponse('{}', mimetype='application/json')
+
+
+@CompressionApp.route('/image')
+def image(request):
+    return PlasticResponse('\x89PNG' * 1000, mimetype='image/png')
+
+
+@CompressionApp.route('/stream')
+def stream(request):
+    return PlasticResponse((str(i) * 100 for i in xrange(10)),
+                           mimetype='text/plain')
+
+
+@CompressionApp.route('/json-stream')
+def json_stream(request):
+    return PlasticResponse(json.JSONEncoder().iterencode(large_list),
+                           mimetype='application/json')
+
+
+tests = Tests()
+
+
+@tests.test
+def compression():
+    client = Client(CompressionApp(), Response)
+    response = client.get('/large', headers=[('Accept-Encoding', 'gzip')])
+    assert response.data == large_body
+    assert 'Content-Encoding' not in response.headers
+    cache = LRUCache()
+    app = CompressionApp({'compression': Compression(cache=cache)})
+    client = Client(app, Response)
+    response = client.get('/large', headers=[('Accept-Encoding', 'gzip')])
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.vary
+    assert response.content_length == len(response.data)
+    assert len(response.data) < len(large_body)
+    assert gunzip(response.data) == large_body
+    assert len(cache) == 1
+    response = client.get('/large', headers=[('Accept-Encoding', 'gzip')])
+    assert gunzip(response.data) == large_body
+    assert cache.hits == 1
+    response = client.get('/large',
+                          headers=[('Accept-Encoding', 'deflate, gzip;q=0.5')])
+    assert response.headers['Content-Encoding'] == 'deflate'
+    assert zlib.decompress(response.data) == large_body
+    response = client.get('/large')
+    assert response.data == large_body
+    assert 'Content-Encoding' not in response.headers
+    assert 'Accept-Encoding' in response.vary
+    response = client.get('/large', headers=[('Accept-Encoding', 'identity')])
+    assert response.data == large_body
+    response = client.get('/small', headers=[('Accept-Encoding', 'gzip')])
+    assert response.data == '{}'
+    assert 'Content-Encoding' not in response.headers
+    response = client.get('/image', headers=[('Accept-Encoding', 'gzip')])
+    assert 'Content-Encoding' not in response.headers
+    assert 'Accept-Encoding' not in response.vary
+    response = client.get('/404', headers=[('Accept-Encoding', 'gzip')])
+    assert response.status_code == 404
+    with raises(ValueError):
+        Compression(level=10)
+    with raises(ValueError):
+        Compression(encodings=['compress'])
+    app = CompressionApp({
+        'compression': 'plastic.compression:Compression(min_size=0)'
+    })
+    assert isinstance(app.compression, Compression)
+    assert app.compression.min_size == 0
+
+
+@tests.test
+def compression_head():
+    app = CompressionApp({'compression': Compression()})
+    client = Client(app, Response)
+    get = client.get('/tagged', headers=[('Accept-Encoding', 'gzip')])
+    head = client.head('/tagged', headers=[('Accept-Encoding', 'gzip')])
+    assert head.data == ''
+    assert head.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in head.vary
+    assert 'Content-Length' not in head.headers
+    assert head.headers['ETag'] == get.headers['ETag']
+    assert head.headers['ETag'] == '"tag-gzip"'
+    head = client.head('/stream', headers=[('Accept-Encoding', 'gzip')])
+    assert head.headers['Content-Encoding'] == 'gzip'
+    assert 'Content-Length' not in head.headers
+    head = client.head('/small', headers=[('Accept-Encoding', 'gzip')])
+    assert 'Content-Encoding' not in head.headers
+    assert head.content_length == 2
+
+
+@tests.test
+def compression_streaming():
+    app = CompressionApp({'compression': Compression(buffer_size=100)})
+    client = Client(app, Response)
+    response = client.get('/stream', headers=[('Accept-Encoding', 'gzip')],
+                          buffered=False)
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Content-Length' not in response.headers
+    chunks = list(response.iter_encoded())
+    assert len(chunks) == 11
+    assert gunzip(''.join(chunks)) == ''.join(str(i) * 100
+                                              for i in xrange(10))
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    first_chunk = decompressor.decompress(chunks[0])
+    assert first_chunk == '0' * 100
+    response.close()
+    app = CompressionApp({'compression': Compression()})
+    client = Client(app, Response)
+    response = client.get('/stream', headers=[('Accept-Encoding', 'gzip')],
+                          buffered=False)
+    chunks = list(response.iter_encoded())
+    assert len(chunks) == 2
+    response.close()
+    response = client.get('/json-stream',
+                          headers=[('Accept-Encoding', 'gzip')])
+    raw_body = json.dumps(large_list)
+    assert gunzip(response.data) == raw_body
+    assert len(response.data) < len(raw_body) / 10
@@ -0,0 +1,111 @@
+import json
+import threading
+
+from attest import Tests, assert_hook, raises
+from werkzeug.exceptions import ServiceUnavailable
+from werkzeug.test import Client
+from werkzeug.wrappers import Response
+
+from plastic.app import BaseApp
+from plastic.executor import RenderExecutor
+from plastic.rendering import render, render_template
+
+
+ExecutorTestApp = BaseApp.clone()
+ExecutorTestApp.associate_mimetypes(html='text/html')
+
+
+@ExecutorTestApp.serializer('application/json', blocking=True)
+def serialize_json(request, value):
+    return json.dumps([value, threading.current_thread().name])
+
+
+@ExecutorTestApp.template_engine('t1', blocking=True)
+def render_t1(request, path, values):
+    return threading.current_thread().name
+
+
+@ExecutorTestApp.route('/')
+def home(request):
+    return render(request, 1, 'home')
+
+
+tests = Tests()
+
+
+@tests.test
+def render_executor():
+    executor = RenderExecutor(max_workers=2)
+    assert executor.stats()['workers'] == 0
+    result = executor.run(lambda a, b=0: a + b, 1, b=2)
+    assert result == 3
+    def fail():
+        raise KeyError('error')
+    with raises(KeyError):
+        executor.run(fail)
+    nested = executor.run(executor.run, lambda: 'nested')
+    assert nested == 'nested'
+    stats = executor.stats()
+    assert stats['workers'] == 2
+    assert stats['submitted'] == 3
+    assert stats['completed'] == 3
+    assert stats['pending'] == 0
+    assert stats['active'] == 0
+    assert stats['max_pending'] >= 1
+    executor.shutdown()
+    assert executor.stats()['workers'] == 0
+    with raises(ValueError):
+        RenderExecutor(max_workers=0)
+
+
+@tests.test
+def render_executor_max_queue():
+    executor = RenderExecutor(max_workers=1, max_queue=1)
+    started = threading.Event()
+    release = threading.Event()
+    def block():
+        started.set()
+        release.wait()
+        return 'blocked'
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(
+        executor.run(block)
+    ))]
+    threads[0].start()
+    started.wait()
+    threads.append(threading.Thread(target=lambda: results.append(
+        executor.run(lambda: 'queued')
+    )))
+    threads[1].start()
+    while executor.stats()['pending'] < 1:
+        pass
+    with raises(ServiceUnavailable):
+        executor.run(lambda: 'rejected')
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert sorted(results) == ['blocked', 'queued']
+    stats = executor.stats()
+    assert stats['rejected'] == 1
+    assert stats['completed'] == 2
+    executor.shutdown()
+
+
+@tests.test
+def blocking_renderers():
+    assert ExecutorTestApp.blocking_renderers == frozenset(['t1',
+                                                           'application/json'])
+    app = ExecutorTestApp()
+    assert isinstance(app.render_executor, RenderExecutor)
+    client = Client(app, Response)
+    response = client.get('/', headers=[('Accept', 'application/json')])
+    value, thread_name = json.loads(response.data)
+    assert value == 1
+    assert thread_name == 'plastic-render-executor'
+    response = client.get('/', headers=[('Accept', 'text/html')])
+    assert response.data == 'plastic-render-executor'
+    app.render_executor.shutdown()
+    app = ExecutorTestApp({'render_executor': None})
+    client = Client(app, Response)
+    response = client.get('/', headers=[('Accept', 'text/html')])
+    assert response.data == threading.current_thread().name
@@ -0,0 +1,108 @@
+import json
+
+from attest import Tests, assert_hook, raises
+from werkzeug.routing import Rule
+from werkzeug.test import Client
+from werkzeug.wrappers import Response
+
+from plastic.app import BaseApp
+from plastic.instrumentation import Instrument, LatencyCollector
+from plastic.rendering import render
+
+
+class RecordingInstrument(Instrument):
+
+    def __init__(self):
+        self.records = []
+
+    def record(self, stage, endpoint, seconds):
+        assert seconds >= 0
+        self.records.append((stage, endpoint))
+
+
+InstrumentedApp = BaseApp.clone()
+
+
+@InstrumentedApp.serializer('application/json')
+def serialize_json(request, value):
+    return json.dumps(value)
+
+
+@InstrumentedApp.route('/')
+def home(request):
+    return render(request, {'a': 1}, 'home')
+
+
+@InstrumentedApp.route('/login')
+def login(request):
+    request.session['user'] = 'a'
+    return 'logged in'
+
+
+tests = Tests()
+
+
+@tests.test
+def instruments():
+    instrument = RecordingInstrument()
+    app = InstrumentedApp({'instruments': [instrument]})
+    client = Client(app, Response)
+    response = client.get('/', headers=[('Accept', 'application/json')])
+    assert json.loads(response.data) == {'a': 1}
+    assert instrument.records == [
+        ('routing', 'home'), ('render', 'home'), ('view', 'home'),
+        ('response', 'home'), ('total', 'home')
+    ]
+    del instrument.records[:]
+    response = client.get('/login')
+    assert response.data == 'logged in'
+    assert instrument.records == [
+        ('routing', 'login'), ('view', 'login'), ('session', 'login'),
+        ('response', 'login'), ('total', 'login')
+    ]
+    del instrument.records[:]
+    response = client.get('/404')
+    assert response.status_code == 404
+    assert instrument.records == [
+        ('routing', None), ('response', None), ('total', None)
+    ]
+    app = InstrumentedApp({
+        'instruments': ['plastic.instrumentation:LatencyCollector']
+    })
+    assert isinstance(app.instruments[0], LatencyCollector)
+    app = InstrumentedApp()
+    assert app.instruments == []
+
+
+@tests.test
+def latency_collector():
+    with raises(ValueError):
+        LatencyCollector(buckets=(0.1, 0.01))
+    collector = LatencyCollector(buckets=(0.01, 0.1, 1))
+    for seconds in 0.005, 0.05, 0.05, 0.5, 2:
+        collector.record('total', 'home', seconds)
+    collector.record('view', 'home', 0.001)
+    p50 = collector.percentile('home', 'total', 50)
+    assert p50 == 0.1
+    p100 = collector.percentile('home', 'total', 100)
+    assert p100 == 2
+    missing = collector.percentile('home', 'routing', 50)
+    assert missing is None
+    report = collector.report()
+    total = report['home']['total']
+    assert total['count'] == 5
+    assert total['max'] == 2
+    assert abs(total['sum'] - 2.605) < 1e-9
+    assert total['histogram'] == [(0.01, 1), (0.1, 2), (1, 1), (None, 1)]
+    assert report['home']['view']['p99'] == 0.001
+    LatencyApp = InstrumentedApp.clone()
+    LatencyApp.add_rule(Rule('/_latency', endpoint='latency'),
+                        lambda request: collector)
+    app = LatencyApp({'instruments': [collector]})
+    client = Client(app, Response)
+    response = client.get('/_latency')
+    assert response.mimetype == 'application/json'
+    assert json.loads(response.data)['home']['total']['count'] == 5
+    collector.reset()
+    report = collector.report()
+    assert report == {}
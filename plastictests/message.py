@@ -84,3 +84,46 @@ def session_cookie_key():
             app2.config['session_cookie']['key'] ==
             'my_session_id')
 
+
+
+@tests.test
+def build_url_cache():
+    app = App()
+    environ = EnvironBuilder(path='/').get_environ()
+    request = Request(environ, app=app)
+    for _ in xrange(3):
+        url = request.build_url('build_url_test', a=1, b=2, c=3)
+        assert url == '/1/2?c=3'
+    assert app.url_cache.misses == 1
+    assert app.url_cache.hits == 2
+    url = request.build_url('build_url_test', a=1, b=2, c=[3, 4])
+    assert url == '/1/2?c=3&c=4'
+    url = request.build_url('build_url_test', a=1, b=2, c=True)
+    assert url == '/1/2?c=True'
+    url = request.build_url('build_url_test', a=1, b=2, c=3.0)
+    assert url == '/1/2?c=3.0'
+    urls = request.build_urls('build_url_test', [{'a': 1, 'b': 2, 'c': 1},
+                                                 {'a': 1, 'b': 2, 'c': True}])
+    assert urls == ['/1/2?c=1', '/1/2?c=True']
+    url = request.build_url('build_url_test', _external=True, a=1, b=2)
+    assert url == 'http://localhost/1/2'
+    environ = EnvironBuilder(path='/', base_url='https://example.com/app/') \
+              .get_environ()
+    request = Request(environ, app=app)
+    url = request.build_url('build_url_test', a=1, b=2, c=3)
+    assert url == '/app/1/2?c=3'
+
+
+@tests.test
+def build_urls():
+    app = App()
+    environ = EnvironBuilder(path='/').get_environ()
+    request = Request(environ, app=app)
+    urls = request.build_urls('build_url_test',
+                              [{'a': 1, 'b': 2}, {'a': 3, 'b': 4},
+                               {'a': 1, 'b': 2}, {'a': 5, 'b': 6, 'c': [7]}])
+    assert urls == ['/1/2', '/3/4', '/1/2', '/5/6?c=7']
+    assert app.url_cache.hits == 1
+    urls = request.build_urls('build_url_test', [{'a': 1, 'b': 2}],
+                              _external=True)
+    assert urls == ['http://localhost/1/2']
@@ -0,0 +1,71 @@
+import gc
+import json
+from os.path import dirname, join
+
+from attest import Tests, assert_hook
+
+from plastic.app import BaseApp
+from plastic.config import Config
+from plastic.profiling import (StartupProfiler, disable_startup_profiling,
+                               enable_startup_profiling, get_startup_profiler,
+                               startup_phase)
+
+
+tests = Tests()
+
+
+@tests.test
+def startup_profiler():
+    profiler = StartupProfiler()
+    gc.collect()
+    gc.disable()  # a collection during the phase would skew the count
+    try:
+        with profiler.phase('outer', label='a'):
+            with profiler.phase('inner'):
+                garbage = [[] for _ in xrange(100)]
+    finally:
+        gc.enable()
+    assert len(profiler.records) == 2
+    outer, inner = profiler.records
+    assert outer['phase'] == 'outer'
+    assert outer['label'] == 'a'
+    assert outer['depth'] == 0
+    assert inner['depth'] == 1
+    assert inner['seconds'] <= outer['seconds']
+    assert inner['allocations'] >= 100
+    report = json.loads(profiler.to_json())
+    assert report['total_seconds'] == outer['seconds']
+    assert len(report['phases']) == 2
+    table = profiler.format_table()
+    assert '  inner' in table
+    assert 'total' in table
+
+
+@tests.test
+def startup_profiling():
+    assert get_startup_profiler() is None
+    disabled = disable_startup_profiling()
+    assert disabled is None
+    with startup_phase('noop'):
+        pass
+    profiler = enable_startup_profiling(track_allocations=False)
+    try:
+        assert get_startup_profiler() is profiler
+        enabled = enable_startup_profiling()
+        assert enabled is profiler
+        App = BaseApp.clone()
+        @App.route('/')
+        def home(request):
+            return ''
+        App()
+        config = Config()
+        config.update_from_file(join(dirname(__file__), 'test.cfg'))
+    finally:
+        disabled = disable_startup_profiling()
+    assert disabled is profiler
+    phases = [record['phase'] for record in profiler.records]
+    assert phases == ['clone', 'init', 'compile_routing',
+                      'import_session_store', 'import_caches',
+                      'update_from_file']
+    assert profiler.records[1]['label'] == __name__ + '.App'
+    assert all(record['allocations'] == 0 for record in profiler.records)
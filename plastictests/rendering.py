@@ -6,7 +6,7 @@ from werkzeug.test import Client
 from werkzeug.wrappers import Response
 
 from plastic.app import BaseApp
-from plastic.rendering import render
+from plastic.rendering import render, render_template
 
 
 RenderingTestApp = BaseApp.clone()
@@ -49,3 +49,144 @@ def render_():
     assert 'Accept' in response.vary
     response = client.get('/', headers=[('Accept', 'text/plain')])
     assert response.status_code == 406
+
+
+StreamingTestApp = BaseApp.clone()
+
+
+@StreamingTestApp.serializer('application/json')
+def iterencode_json(request, value):
+    return json.JSONEncoder().iterencode(value)
+
+
+@StreamingTestApp.template_engine('t1')
+def stream_t1(request, path, values):
+    with request.app.template_directory[path] as template:
+        for line in template:
+            yield line.format(request=request, **values)
+
+
+@StreamingTestApp.route('/')
+def stream(request):
+    return render(request, range(100), 'home')
+
+
+@StreamingTestApp.route('/template')
+def stream_template(request):
+    return render_template(request, 'home.html', pi=3.14)
+
+
+@tests.test
+def render_streaming():
+    client = Client(StreamingTestApp(), Response)
+    response = client.get('/', headers=[('Accept', 'application/json')])
+    assert json.loads(response.data) == range(100)
+    assert response.mimetype == 'application/json'
+    assert 'Content-Length' not in response.headers
+    response = client.get('/template')
+    assert response.status_code == 200
+    assert response.data.strip() == '<h1>3.14</h1>'
+
+
+@tests.test
+def negotiate_mimetype():
+    App = BaseApp.clone()
+    App.associate_mimetypes(html='text/html')
+    @App.route('/')
+    def home(request):
+        return repr(request.app.negotiate_mimetype(request))
+    app = App()
+    client = Client(app, Response)
+    for _ in xrange(3):
+        response = client.get('/', headers=[('Accept', 'text/html')])
+        assert response.data == "'text/html'"
+        response = client.get('/', headers=[('Accept', 'text/xml')])
+        assert response.data == 'None'
+    assert app.negotiation_cache.misses == 2
+    assert app.negotiation_cache.hits == 4
+    App.associate_mimetypes(xml='text/xml')
+    response = client.get('/', headers=[('Accept', 'text/xml')])
+    assert response.data == "'text/xml'"
+    assert app.negotiation_cache.misses == 3
+
+
+ConditionalTestApp = BaseApp.clone()
+ConditionalTestApp.associate_mimetypes(html='text/html')
+conditional_calls = []
+
+
+@ConditionalTestApp.serializer('application/json')
+def serialize_json_counting(request, value):
+    conditional_calls.append(value)
+    return json.dumps(value)
+
+
+@ConditionalTestApp.template_engine('t1')
+def t1_counting(request, path, values):
+    conditional_calls.append(path)
+    with request.app.template_directory[path] as template:
+        return template.read().format(request=request, **values)
+
+
+@ConditionalTestApp.route('/hashed')
+def hashed(request):
+    return render(request, {'pi': 3.14}, 'home', pi=3.14, _etag=True)
+
+
+@ConditionalTestApp.route('/versioned/<int:version>')
+def versioned(request, version):
+    return render(request, {'v': version}, 'home', pi=version,
+                  _etag=version)
+
+
+@ConditionalTestApp.route('/template/<int:version>')
+def versioned_template(request, version):
+    return render_template(request, 'home.html', pi=version, _etag=version)
+
+
+@tests.test
+def render_conditional():
+    del conditional_calls[:]
+    client = Client(ConditionalTestApp(), Response)
+    json_ = [('Accept', 'application/json')]
+    response = client.get('/hashed', headers=json_)
+    assert response.status_code == 200
+    etag, weak = response.get_etag()
+    assert etag and not weak
+    if_none_match = [('If-None-Match', '"' + etag + '"')]
+    response = client.get('/hashed', headers=json_ + if_none_match)
+    assert response.status_code == 304
+    assert response.data == ''
+    assert response.get_etag() == (etag, False)
+    response = client.get('/hashed',
+                          headers=[('Accept', 'text/html')] + if_none_match)
+    assert response.status_code == 200
+    assert response.get_etag()[0] != etag
+    del conditional_calls[:]
+    response = client.get('/versioned/1', headers=json_)
+    assert json.loads(response.data) == {'v': 1}
+    etag = response.get_etag()[0]
+    if_none_match = [('If-None-Match', '"' + etag + '"')]
+    response = client.get('/versioned/1', headers=json_ + if_none_match)
+    assert response.status_code == 304
+    assert conditional_calls == [{'v': 1}]
+    response = client.get('/versioned/1', headers=json_ + [
+        ('If-None-Match', '"' + etag + '-gzip"')
+    ])
+    assert response.status_code == 304
+    assert response.get_etag() == (etag + '-gzip', False)
+    assert 'Accept-Encoding' in response.vary
+    response = client.get('/versioned/1', headers=json_ + if_none_match)
+    assert response.get_etag() == (etag, False)
+    assert 'Accept-Encoding' not in response.vary
+    response = client.get('/versioned/2', headers=json_ + if_none_match)
+    assert response.status_code == 200
+    assert conditional_calls == [{'v': 1}, {'v': 2}]
+    del conditional_calls[:]
+    response = client.get('/template/1')
+    assert response.data.strip() == '<h1>1</h1>'
+    etag = response.get_etag()[0]
+    response = client.get('/template/1',
+                          headers=[('If-None-Match', '"' + etag + '"')])
+    assert response.status_code == 304
+    assert conditional_calls == ['home.html.t1']
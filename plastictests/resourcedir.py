@@ -1,6 +1,13 @@
+import os
+import shutil
+import tempfile
+from StringIO import StringIO
+
 from attest import Tests, assert_hook, raises
+from werkzeug.test import Client
+from werkzeug.wrappers import Response
 
-from plastic.resourcedir import ResourceDirectory
+from plastic.resourcedir import Resource, ResourceDirectory
 
 
 tests = Tests()
@@ -102,3 +109,111 @@ def rdir_len():
     assert len(rdir['c/c']) == 1
     assert len(rdir['d']) == 1
 
+
+
+@tests.test
+def rdir_snapshot():
+    snapshot = ResourceDirectory(__name__, 'resources', snapshot=True)
+    assert rdir.index is None
+    assert set(snapshot) == set(rdir)
+    assert len(snapshot) == 11
+    assert len(snapshot['c']) == 6
+    assert len(snapshot['c/c']) == 1
+    assert set(snapshot['c']) == set(['a', 'b', 'c', 'c/a', 'd', 'd/a'])
+    assert 'c/c/a' in snapshot
+    assert 'c/c/b' not in snapshot
+    assert 'c/' in snapshot
+    assert 'e' not in snapshot
+    assert snapshot['c'].index is snapshot.index
+    assert 'a' in snapshot['c/c']
+    with snapshot['c']['c']['a'] as f:
+        read = f.read().strip()
+        assert read == 'c-c-a'
+    with raises(KeyError):
+        snapshot['c/e']
+    info = snapshot.get_info('c/a')
+    assert not info.is_dir
+    assert info.size == 4
+    assert info.path == 'resources/c/a'
+    assert info == rdir.get_info('c/a')
+    info = snapshot.get_info('c')
+    assert info.is_dir
+    with raises(KeyError):
+        snapshot.get_info('e')
+    rebuilt = snapshot.revalidate()
+    assert not rebuilt
+    missing = ResourceDirectory(__name__, 'no-such-dir', snapshot=True)
+    assert len(missing) == 0
+    assert 'a' not in missing
+
+
+@tests.test
+def rdir_revalidate():
+    tmpdir = tempfile.mkdtemp(dir=os.path.dirname(__file__))
+    try:
+        os.mkdir(os.path.join(tmpdir, 'sub'))
+        with open(os.path.join(tmpdir, 'sub', 'a'), 'w') as f:
+            f.write('a')
+        snapshot = ResourceDirectory(__name__, os.path.basename(tmpdir),
+                                     snapshot=True)
+        assert set(snapshot) == set(['sub', 'sub/a'])
+        old_mtime = snapshot.get_info('sub').mtime
+        with open(os.path.join(tmpdir, 'sub', 'b'), 'w') as f:
+            f.write('b')
+        assert 'sub/b' not in snapshot
+        os.utime(os.path.join(tmpdir, 'sub'), (old_mtime + 1, old_mtime + 1))
+        rebuilt = snapshot.revalidate()
+        assert rebuilt
+        assert 'sub/b' in snapshot
+        assert len(snapshot) == 3
+        rebuilt = snapshot.revalidate()
+        assert not rebuilt
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+@tests.test
+def resource_map():
+    with rdir['c/a'] as f:
+        assert f.filename.endswith('resources/c/a')
+        mapped = f.map()
+        assert str(mapped) == 'c-a\n'
+        assert mapped[:3] == 'c-a'
+        assert f.map() is not None
+        read = f.read()
+        assert read == 'c-a\n'
+    f = Resource(StringIO('zipped'))
+    f.read(3)
+    mapped = f.map()
+    assert str(mapped) == 'zipped'
+    f.close()
+    tmpdir = tempfile.mkdtemp(dir=os.path.dirname(__file__))
+    try:
+        open(os.path.join(tmpdir, 'empty'), 'w').close()
+        directory = ResourceDirectory(__name__, os.path.basename(tmpdir))
+        with directory['empty'] as f:
+            mapped = f.map()
+            assert len(mapped) == 0
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+@tests.test
+def resource_wrap():
+    def app(environ, start_response):
+        response = Response(rdir['c/c/a'].wrap(environ, 2),
+                            direct_passthrough=True)
+        return response(environ, start_response)
+    client = Client(app, Response)
+    response = client.get('/')
+    assert response.data == 'c-c-a\n'
+    closed = []
+    def file_wrapper(file_, buffer_size):
+        closed.append(file_)
+        return iter([file_.read(), 'EOF'])
+    environ = {'wsgi.file_wrapper': file_wrapper}
+    resource = rdir['c/c/a']
+    chunks = list(resource.wrap(environ))
+    assert chunks == ['c-c-a\n', 'EOF']
+    assert closed == [resource]
+    resource.close()
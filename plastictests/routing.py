@@ -0,0 +1,215 @@
+from attest import Tests, assert_hook, raises
+from werkzeug.exceptions import MethodNotAllowed, NotFound
+from werkzeug.routing import Map, RequestRedirect, Rule
+from werkzeug.test import Client, EnvironBuilder
+from werkzeug.wrappers import Response
+
+from plastic.app import BaseApp
+from plastic.message import Request
+from plastic.routing import RadixTreeRouter, Router
+
+
+tests = Tests()
+
+App = BaseApp.clone()
+
+
+@App.route('/')
+def home(request):
+    return 'home'
+
+
+@App.route('/people/', methods=['GET'])
+def people(request):
+    return 'people'
+
+
+@App.route('/people/', methods=['POST'])
+def add_person(request):
+    return 'add_person'
+
+
+@App.route('/people/<name>')
+def person(request, name):
+    return 'person: ' + name
+
+
+@App.route('/about', redirect_to='/')
+def about(request):
+    return 'about'
+
+
+def match(app, path, method='GET'):
+    environ = EnvironBuilder(path=path, method=method).get_environ()
+    request = Request(environ, app=app)
+    return request.endpoint, request.endpoint_values
+
+
+@tests.test
+def static_rules():
+    static_rules = Router(App().routing_map).static_rules
+    assert set(static_rules) == set(['/', '/people/'])
+    assert len(static_rules['/people/']) == 2
+
+
+@tests.test
+def router_match():
+    app = App()
+    assert match(app, '/') == ('home', {})
+    assert match(app, '/people/') == ('people', {})
+    assert match(app, '/people/', 'HEAD') == ('people', {})
+    assert match(app, '/people/', 'POST') == ('add_person', {})
+    assert match(app, '/people/dahlia') == ('person', {'name': 'dahlia'})
+    with raises(MethodNotAllowed):
+        match(app, '/people/', 'DELETE')
+    with raises(RequestRedirect):
+        match(app, '/people')
+    with raises(RequestRedirect):
+        match(app, '/about')
+    with raises(NotFound):
+        match(app, '/not-exist')
+    client = Client(app, Response)
+    assert client.get('/people/').data == 'people'
+    assert client.post('/people/').data == 'add_person'
+    assert client.get('/people').status_code in (301, 308)
+
+
+@tests.test
+def host_matching():
+    routing_map = Map([Rule('/', endpoint='home', host='example.com')],
+                      host_matching=True)
+    assert not Router(routing_map).static_rules
+
+
+TreeApp = App.clone(router_class=RadixTreeRouter)
+
+
+@TreeApp.route('/people/<name>/posts/<int:post_id>')
+def post(request, name, post_id):
+    return 'post: {0} {1}'.format(name, post_id)
+
+
+@TreeApp.route('/people/<name>/posts/latest')
+def latest_post(request, name):
+    return 'latest_post: ' + name
+
+
+@TreeApp.route('/people/<name>/files/<path:path>')
+def person_file(request, name, path):
+    return 'file: {0} {1}'.format(name, path)
+
+
+@TreeApp.route('/people/<name>.json')
+def person_json(request, name):
+    return 'person_json: ' + name
+
+
+@TreeApp.route('/numbers/<int(min=10):n>')
+def big_number(request, n):
+    return 'big_number'
+
+
+@TreeApp.route('/numbers/<n>')
+def number(request, n):
+    return 'number'
+
+
+@tests.test
+def radix_tree_router():
+    app = TreeApp()
+    assert isinstance(app.router, RadixTreeRouter)
+    assert not isinstance(App().router, RadixTreeRouter)
+    assert match(app, '/') == ('home', {})
+    assert match(app, '/people/') == ('people', {})
+    assert match(app, '/people/', 'POST') == ('add_person', {})
+    assert match(app, '/people/dahlia') == ('person', {'name': 'dahlia'})
+    assert (match(app, '/people/dahlia/posts/12') ==
+            ('post', {'name': 'dahlia', 'post_id': 12}))
+    assert (match(app, '/people/dahlia/posts/latest') ==
+            ('latest_post', {'name': 'dahlia'}))
+    assert (match(app, '/people/dahlia/files/a/b.txt') ==
+            ('person_file', {'name': 'dahlia', 'path': 'a/b.txt'}))
+    assert (match(app, '/people/dahlia.json') ==
+            ('person_json', {'name': 'dahlia'}))
+    assert match(app, '/numbers/12') == ('big_number', {'n': 12})
+    assert match(app, '/numbers/3') == ('number', {'n': '3'})
+    with raises(MethodNotAllowed):
+        match(app, '/people/', 'DELETE')
+    with raises(RequestRedirect):
+        match(app, '/people')
+    with raises(RequestRedirect):
+        match(app, '/about')
+    with raises(NotFound):
+        match(app, '/people/dahlia/posts/abc')
+    client = Client(app, Response)
+    assert client.get('/people/dahlia/posts/12').data == 'post: dahlia 12'
+    response = client.get('/')
+    assert response.data == 'home'
+    request = Request(EnvironBuilder(path='/').get_environ(), app=app)
+    url = request.build_url('post', name='dahlia', post_id=3)
+    assert url == '/people/dahlia/posts/3'
+
+
+@tests.test
+def radix_tree_router_strict_slashes():
+    App = BaseApp.clone()
+    @App.route('/people/')
+    def people(request):
+        return 'people'
+    @App.route('/<name>')
+    def name(request, name):
+        return 'name: ' + name
+    @App.route('/groups/<group>/')
+    def group(request, group):
+        return 'group: ' + group
+    @App.route('/groups/<group>')
+    def group_file(request, group):
+        return 'group_file: ' + group
+    TreeApp = App.clone(router_class=RadixTreeRouter)
+    for path in '/people', '/dahlia', '/groups/a', '/groups/a/':
+        try:
+            expected = match(App(), path)
+        except RequestRedirect as e:
+            expected = e.new_url
+        try:
+            result = match(TreeApp(), path)
+        except RequestRedirect as e:
+            result = e.new_url
+        assert result == expected
+    with raises(RequestRedirect):
+        match(TreeApp(), '/people')
+    assert match(TreeApp(), '/dahlia') == ('name', {'name': 'dahlia'})
+
+
+@tests.test
+def radix_tree_router_precedence():
+    App = BaseApp.clone()
+    @App.route('/<any(about, help):page>')
+    def page(request, page):
+        return 'page: ' + page
+    @App.route('/<user>')
+    def user(request, user):
+        return 'user: ' + user
+    @App.route('/<user>/posts')
+    def posts(request, user):
+        return 'posts: ' + user
+    @App.route('/<user>/files')
+    def files(request, user):
+        return 'files: ' + user
+    @App.route('/about/<path:path>')
+    def about_file(request, path):
+        return 'about_file: ' + path
+    @App.route('/help/<int:n>')
+    def help_page(request, n):
+        return 'help_page: ' + str(n)
+    @App.route('/<int:n>/<name>')
+    def numbered(request, n, name):
+        return 'numbered: ' + name
+    TreeApp = App.clone(router_class=RadixTreeRouter)
+    for path in ('/about', '/help', '/bob', '/bob/posts', '/about/posts',
+                 '/about/files', '/help/1', '/help/posts', '/about/a/b',
+                 '/1/files', '/1/name'):
+        expected = match(App(), path)
+        result = match(TreeApp(), path)
+        assert result == expected
+    assert match(TreeApp(), '/about') == ('page', {'page': 'about'})
@@ -0,0 +1,159 @@
+import os
+import signal
+import threading
+import time
+import urllib2
+
+from attest import Tests, assert_hook, raises
+
+from plastic.app import BaseApp
+from plastic.server import PreforkServer
+
+
+ServerTestApp = BaseApp.clone()
+
+
+@ServerTestApp.route('/')
+def pid(request):
+    return str(os.getpid())
+
+
+@ServerTestApp.route('/slow')
+def slow(request):
+    time.sleep(1)
+    return 'done'
+
+
+tests = Tests()
+
+
+def wait_for(predicate, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        result = predicate()
+        if result:
+            return result
+        time.sleep(0.05)
+    return predicate()
+
+
+@tests.test
+def prefork_server():
+    app = ServerTestApp()
+    server = PreforkServer(app, port=0, workers=2)
+    server.poll_interval = 0.05
+    server.listen()
+    url = 'http://127.0.0.1:{0}/'.format(server.port)
+    parent = os.fork()
+    if parent == 0:
+        try:
+            server.serve_forever()
+        finally:
+            os._exit(0)
+    server.socket.close()
+    def get_pid():
+        try:
+            return int(urllib2.urlopen(url, timeout=5).read())
+        except Exception:
+            return None
+    try:
+        worker = wait_for(get_pid)
+        assert worker
+        assert worker != parent
+        assert worker != os.getpid()
+        workers = set()
+        wait_for(lambda: workers.add(get_pid()) or len(workers) >= 2)
+        assert len(workers) == 2
+        # crashed workers are restarted
+        os.kill(worker, signal.SIGKILL)
+        restarted = set()
+        wait_for(lambda: restarted.add(get_pid()) or
+                         len(restarted - workers) >= 1)
+        assert restarted - workers
+        # reloading replaces every worker
+        before = workers | restarted
+        os.kill(parent, signal.SIGHUP)
+        reloaded = set()
+        wait_for(lambda: reloaded.add(get_pid()) or
+                         len(reloaded - before) >= 2)
+        assert len(reloaded - before) >= 2
+    finally:
+        os.kill(parent, signal.SIGTERM)
+        _, status = os.waitpid(parent, 0)
+    assert os.WIFEXITED(status)
+    assert get_pid() is None
+
+
+@tests.test
+def prefork_server_threaded_graceful_stop():
+    app = ServerTestApp()
+    server = PreforkServer(app, port=0, workers=1, threaded=True)
+    server.poll_interval = 0.05
+    server.listen()
+    url = 'http://127.0.0.1:{0}/'.format(server.port)
+    parent = os.fork()
+    if parent == 0:
+        try:
+            server.serve_forever()
+        finally:
+            os._exit(0)
+    server.socket.close()
+    def get(path=''):
+        try:
+            return urllib2.urlopen(url + path, timeout=10).read()
+        except Exception as e:
+            return e
+    try:
+        ready = wait_for(lambda: isinstance(get(), str))
+        assert ready
+        results = []
+        thread = threading.Thread(target=lambda: results.append(get('slow')))
+        thread.start()
+        time.sleep(0.3)
+    finally:
+        os.kill(parent, signal.SIGTERM)
+    thread.join()
+    os.waitpid(parent, 0)
+    assert results == ['done']
+
+
+class CrashingServer(PreforkServer):
+
+    def run_worker(self):
+        os._exit(1)
+
+
+@tests.test
+def prefork_server_backoff():
+    server = CrashingServer(ServerTestApp(), port=0, workers=1)
+    server.poll_interval = 0.05
+    server.listen()
+    server.running = True
+    forks = []
+    spawn_workers = server.spawn_workers
+    try:
+        deadline = time.time() + 1
+        while time.time() < deadline:
+            server.reap_workers()
+            before = len(server.started_at)
+            spawn_workers()
+            if len(server.started_at) > before:
+                forks.append(time.time())
+            time.sleep(server.poll_interval)
+    finally:
+        server.running = False
+        server.stop_workers(server.children)
+        server.socket.close()
+    assert server.failures >= 2
+    assert 2 <= len(forks) <= 5
+
+
+@tests.test
+def prefork_server_options():
+    app = ServerTestApp()
+    with raises(ValueError):
+        PreforkServer(app, workers=0)
+    server = PreforkServer(app)
+    assert server.workers >= 1
+    with raises(ValueError):
+        app.run(workers=2, debug=True)
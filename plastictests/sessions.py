@@ -0,0 +1,191 @@
+import os.path
+import shutil
+import tempfile
+import time
+
+from attest import Tests, assert_hook, raises
+from werkzeug.test import Client
+from werkzeug.wrappers import Response
+
+from plastic.app import BaseApp
+from plastic.exceptions import SessionError
+from plastic.sessions import (MemorySessionStore, SignedCookieSessionStore,
+                              SQLiteSessionStore, WriteBehindSessionStore)
+
+
+tests = Tests()
+
+
+def check_store(store):
+    session = store.new()
+    assert session.new
+    session['a'] = [1, 2]
+    store.save(session)
+    session['a'].append(3)
+    loaded = store.get(session.sid)
+    assert not loaded.new
+    assert loaded['a'] == [1, 2]
+    loaded['b'] = 'c'
+    store.save(loaded)
+    loaded = store.get(session.sid)
+    assert dict(loaded) == {'a': [1, 2], 'b': 'c'}
+    store.delete(loaded)
+    loaded = store.get(session.sid)
+    assert loaded.new
+    assert not loaded
+    loaded = store.get('invalid key')
+    assert loaded.new
+
+
+@tests.test
+def memory_session_store():
+    check_store(MemorySessionStore())
+    store = MemorySessionStore(ttl=0.05)
+    session = store.new()
+    session['a'] = 1
+    store.save(session)
+    time.sleep(0.1)
+    loaded = store.get(session.sid)
+    assert loaded.new
+    assert 'a' not in loaded
+
+
+@tests.test
+def sqlite_session_store():
+    tmpdir = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(tmpdir, 'sessions.sqlite')
+        check_store(SQLiteSessionStore(filename))
+        store = SQLiteSessionStore(filename, ttl=0.05)
+        session = store.new()
+        session['a'] = 1
+        store.save(session)
+        time.sleep(0.1)
+        loaded = store.get(session.sid)
+        assert loaded.new
+        purged = store.purge()
+        assert purged == 1
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+SessionTestApp = BaseApp.clone()
+
+
+@SessionTestApp.route('/')
+def count(request):
+    request.session['count'] = request.session.get('count', 0) + 1
+    return str(request.session['count'])
+
+
+@tests.test
+def session_store_config():
+    app = SessionTestApp({
+        'session_store': 'plastic.sessions:MemorySessionStore(size=10)'
+    })
+    assert isinstance(app.session_store, MemorySessionStore)
+    client = Client(app, Response)
+    for i in xrange(1, 4):
+        response = client.get('/')
+        assert response.data == str(i)
+
+
+@tests.test
+def write_behind_session_store():
+    backend = MemorySessionStore()
+    store = WriteBehindSessionStore(backend, interval=60)
+    check_store(store)
+    session = store.new()
+    session['a'] = 1
+    store.save(session)
+    assert backend.get(session.sid).new
+    loaded = store.get(session.sid)
+    assert loaded['a'] == 1
+    flushed = store.flush()
+    assert flushed == 2
+    assert backend.get(session.sid)['a'] == 1
+    store = WriteBehindSessionStore(
+        'plastic.sessions:MemorySessionStore(size=10)', batch_size=1
+    )
+    assert isinstance(store.store, MemorySessionStore)
+    session = store.new()
+    session['a'] = 1
+    store.save(session)
+    for _ in xrange(100):
+        if not store.pending:
+            break
+        time.sleep(0.01)
+    assert not store.store.get(session.sid).new
+
+
+@tests.test
+def lazy_session():
+    class CountingStore(MemorySessionStore):
+        loads = 0
+        def new(self):
+            self.loads += 1
+            return super(CountingStore, self).new()
+        def get(self, sid):
+            self.loads += 1
+            return super(CountingStore, self).get(sid)
+    App = SessionTestApp.clone()
+    @App.route('/static')
+    def static(request):
+        return 'static'
+    store = CountingStore()
+    client = Client(App({'session_store': store}), Response)
+    response = client.get('/static')
+    assert response.data == 'static'
+    assert store.loads == 0
+    assert 'Set-Cookie' not in response.headers
+    client.get('/')
+    assert store.loads == 1
+
+
+@tests.test
+def signed_cookie_session_store():
+    store = SignedCookieSessionStore('secret')
+    session = store.new()
+    assert session.new
+    session['a'] = [1, 2]
+    store.save(session)
+    loaded = store.get(session.sid)
+    assert not loaded.new
+    assert loaded['a'] == [1, 2]
+    forged = session.sid.replace('.', 'x.', 1)
+    assert store.get(forged).new
+    assert store.get('garbage').new
+    other = SignedCookieSessionStore('other secret')
+    assert other.get(session.sid).new
+    rotated = SignedCookieSessionStore('new secret',
+                                       old_secret_keys='a,secret')
+    loaded = rotated.get(session.sid)
+    assert loaded['a'] == [1, 2]
+    assert loaded.should_save
+    session['b'] = 'x' * 1000
+    store.save(session)
+    assert len(session.sid) < 200
+    loaded = store.get(session.sid)
+    assert loaded['b'] == 'x' * 1000
+    small = SignedCookieSessionStore('secret', max_size=100)
+    session['b'] = os.urandom(200).encode('hex')
+    with raises(SessionError):
+        small.save(session)
+    expiring = SignedCookieSessionStore('secret', max_age=10)
+    value = expiring.dumps({'a': 1}, timestamp=time.time() - 20)
+    assert expiring.get(value).new
+    value = expiring.dumps({'a': 1})
+    assert expiring.get(value)['a'] == 1
+
+
+@tests.test
+def signed_cookie_session_store_config():
+    app = SessionTestApp({
+        'session_store': 'plastic.sessions:SignedCookieSessionStore('
+                         '"secret")'
+    })
+    assert isinstance(app.session_store, SignedCookieSessionStore)
+    client = Client(app, Response)
+    for i in xrange(1, 4):
+        response = client.get('/')
+        assert response.data == str(i)
@@ -0,0 +1,140 @@
+import gzip
+import os.path
+from StringIO import StringIO
+
+from attest import Tests, assert_hook
+from werkzeug.test import Client
+from werkzeug.wrappers import Response
+
+from plastic.app import BaseApp
+from plastic.static import StaticFiles
+
+
+# $ tree plastictests/assets/
+# plastictests/assets/
+# ├── app.js
+# ├── app.js.gz
+# └── css
+#     └── main.css
+#
+#     1 directory, 3 files
+
+
+StaticApp = BaseApp.clone()
+static_files = StaticApp.add_static_files('/static', 'assets/', max_age=60)
+
+
+@StaticApp.route('/')
+def home(request):
+    return request.build_url('static', path='css/main.css')
+
+
+tests = Tests()
+
+
+@tests.test
+def static_files_():
+    assert isinstance(static_files, StaticFiles)
+    client = Client(StaticApp(), Response)
+    url = client.get('/').data
+    assert url == '/static/css/main.css'
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.data == 'body { color: red; }\n'
+    assert response.mimetype == 'text/css'
+    assert response.content_length == len(response.data)
+    assert response.headers['Cache-Control'] == 'public, max-age=60'
+    assert response.headers['Accept-Ranges'] == 'bytes'
+    assert 'Vary' not in response.headers
+    assert response.headers['ETag']
+    assert response.headers['Last-Modified']
+    response = client.head(url)
+    assert response.status_code == 200
+    assert response.data == ''
+    assert response.content_length == 21
+    for path in ('/static/css', '/static/css/', '/static/../static.py',
+                 '/static/css/../app.js', '/static/missing.css'):
+        response = client.get(path)
+        assert response.status_code == 404
+
+
+@tests.test
+def static_files_conditional():
+    client = Client(StaticApp(), Response)
+    response = client.get('/static/css/main.css')
+    etag = response.headers['ETag']
+    last_modified = response.headers['Last-Modified']
+    response = client.get('/static/css/main.css',
+                          headers=[('If-None-Match', etag)])
+    assert response.status_code == 304
+    assert response.data == ''
+    assert response.headers['ETag'] == etag
+    response = client.get('/static/css/main.css',
+                          headers=[('If-Modified-Since', last_modified)])
+    assert response.status_code == 304
+    response = client.get('/static/css/main.css',
+                          headers=[('If-None-Match', '"other"')])
+    assert response.status_code == 200
+
+
+@tests.test
+def static_files_range():
+    client = Client(StaticApp(), Response)
+    response = client.get('/static/css/main.css',
+                          headers=[('Range', 'bytes=0-3')])
+    assert response.status_code == 206
+    assert response.data == 'body'
+    assert response.headers['Content-Range'] == 'bytes 0-3/21'
+    response = client.get('/static/css/main.css',
+                          headers=[('Range', 'bytes=-3')])
+    assert response.status_code == 206
+    assert response.data == ' }\n'
+    response = client.get('/static/css/main.css',
+                          headers=[('Range', 'bytes=100-')])
+    assert response.status_code == 416
+
+
+@tests.test
+def static_files_precompressed():
+    client = Client(StaticApp(), Response)
+    response = client.get('/static/app.js')
+    assert response.data == 'console.log("plain");\n'
+    assert 'Content-Encoding' not in response.headers
+    assert response.headers['Vary'] == 'Accept-Encoding'
+    plain_etag = response.headers['ETag']
+    response = client.get('/static/app.js',
+                          headers=[('Accept-Encoding', 'gzip, deflate')])
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.headers['Vary'] == 'Accept-Encoding'
+    assert response.headers['ETag'] != plain_etag
+    assert 'javascript' in response.mimetype
+    data = gzip.GzipFile(fileobj=StringIO(response.data)).read()
+    assert data == 'console.log("plain");\n'
+    for accept in 'gzip;q=0', '*;q=0, identity', 'gzip;q=0, *':
+        response = client.get('/static/app.js',
+                              headers=[('Accept-Encoding', accept)])
+        assert 'Content-Encoding' not in response.headers
+        assert response.data == 'console.log("plain");\n'
+    response = client.get('/static/app.js',
+                          headers=[('Accept-Encoding', 'gzip;q=0.5')])
+    assert response.headers['Content-Encoding'] == 'gzip'
+
+
+@tests.test
+def static_files_auto_reload():
+    directory = os.path.join(os.path.dirname(__file__), 'assets')
+    static_files = StaticFiles(__name__, 'assets/', auto_reload=True)
+    App = BaseApp.clone()
+    App.route('/<path:path>', endpoint='static')(static_files)
+    client = Client(App(), Response)
+    response = client.get('/new.txt')
+    assert response.status_code == 404
+    filename = os.path.join(directory, 'new.txt')
+    try:
+        with open(filename, 'w') as f:
+            f.write('new')
+        response = client.get('/new.txt')
+        assert response.status_code == 200
+        assert response.data == 'new'
+    finally:
+        os.remove(filename)